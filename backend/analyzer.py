@@ -1,14 +1,421 @@
-from collections import defaultdict
-from typing import List, Dict, Any, Optional
+import os
+import threading
+import time
+import importlib.util
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, List, Dict, Any, Optional, Sequence, Tuple
+from urllib.parse import urlparse
 
-# 催化剂检查：确保炼金试剂存在
-try:
+from rules import KeywordAutomaton, load_rulebook
+from scheduler import checkpoint
+from settings import home_path
+from signals import SignalTable
+from telemetry import instrumented, stage
+
+# 催化剂检查：只探测炼金试剂是否存在，真正的导入推迟到首次使用，
+# 这样不做聚类的工具 (CLI、规则校验等) 无需承担 sklearn / jieba 的导入开销
+DEPENDENCIES_INSTALLED = all(
+    importlib.util.find_spec(name) is not None for name in ("jieba", "numpy", "scipy", "sklearn")
+)
+
+# 长循环每处理这么多行经过一次调度检查点 (见 scheduler.checkpoint)
+CHECKPOINT_ROWS = 4096
+
+def _month_key(ts: str) -> Optional[str]:
+    return ts[:7] if ts and len(ts) >= 7 else None # YYYY-MM
+
+
+@lru_cache(maxsize=8192)
+def _iso_week(day: str) -> Optional[str]:
+    try:
+        year, week, _ = datetime.strptime(day, '%Y-%m-%d').isocalendar()
+    except ValueError:
+        return None
+    return f"{year}-W{week:02d}"
+
+
+def _week_key(ts: str) -> Optional[str]:
+    return _iso_week(ts[:10]) if ts and len(ts) >= 10 else None
+
+
+def _load_jieba():
+    """导入 jieba 并加载前缀词典 (从 ATHANOR_HOME/cache 下的序列化缓存加载，首次构建后持久保存)"""
+    import jieba
+    cache_dir = os.getenv("ATHANOR_CACHE_DIR", home_path("cache"))
+    os.makedirs(cache_dir, exist_ok=True)
+    jieba.dt.tmp_dir = cache_dir
+    jieba.initialize()
+    return jieba
+
+
+def segment_text(text: str, stop_words) -> Tuple[str, ...]:
+    """原子级分词：过滤长度为1的单字（通常是噪音）和停用词。串行与并行分词共用，保证结果一致"""
+    if not text: return ()
     import jieba
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.cluster import KMeans
-    DEPENDENCIES_INSTALLED = True
-except ImportError:
-    DEPENDENCIES_INSTALLED = False
+
+    # 使用 lcut 直接获取列表，减少生成器上下文开销
+    return tuple(w for w in jieba.lcut(text) if len(w) > 1 and w not in stop_words)
+
+
+# --- 分词进程：批量分词时由结晶器的进程池使用，每个进程在初始化时加载一次词典 ---
+_worker_stop_words: frozenset = frozenset()
+
+
+def _init_segmenter(stop_words: frozenset) -> None:
+    global _worker_stop_words
+    _load_jieba()
+    _worker_stop_words = stop_words
+
+
+def _segment_chunk(texts: List[str]) -> List[Tuple[str, ...]]:
+    return [segment_text(text, _worker_stop_words) for text in texts]
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class TokenMemo:
+    """
+    [炼金组件]: 分词记忆
+    带命中统计的 LRU (线程安全)，可以像函数一样调用 (未命中时就地分词)；
+    批量分词先用 lookup 查出命中的部分，其余交给分词进程，结果再由 store 回填。
+    """
+
+    def __init__(self, func, maxsize: int):
+        self.func = func
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, text: str) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            tokens = self._entries.get(text)
+            if tokens is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return tokens
+
+    def store(self, text: str, tokens: Tuple[str, ...]) -> None:
+        with self._lock:
+            self._entries[text] = tokens
+            self._entries.move_to_end(text)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __call__(self, text: str) -> Tuple[str, ...]:
+        tokens = self.lookup(text)
+        if tokens is None:
+            tokens = self.func(text)
+            self.store(text, tokens)
+        return tokens
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+def warm_up(crystallizer: Optional["KnowledgeCrystallizer"] = None) -> Dict[str, float]:
+    """
+    [预热]: 在服务就绪前完成全部冷启动开销，返回各步骤耗时 (秒)。
+    1. jieba 前缀词典：从 ATHANOR_HOME/cache 下的序列化缓存加载 (首次构建后持久保存)
+    2. 预导入 sklearn / scipy
+    3. 一次迷你聚类，触发 sklearn 内部的惰性初始化
+    4. 配置了分词进程时，拉起进程池并让每个进程加载词典
+    """
+    timings: Dict[str, float] = {}
+    if not DEPENDENCIES_INSTALLED:
+        return timings
+
+    start = time.perf_counter()
+    _load_jieba()
+    timings["jieba"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    import numpy, scipy.sparse  # noqa: F401
+    import sklearn.cluster, sklearn.feature_extraction.text, sklearn.metrics, sklearn.preprocessing  # noqa: F401
+    timings["sklearn"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    crystallizer = crystallizer or KnowledgeCrystallizer(n_clusters=2)
+    topics = ["python 编程 源码", "音乐 旅行 美食"]
+    probe = [{"title": topics[i % 2], "url": "", "tags": []} for i in range(8)]
+    crystallizer.crystallize(probe, engine="full", n_clusters=2)
+    timings["dummy_clustering"] = time.perf_counter() - start
+
+    if crystallizer.tokenize_workers > 0:
+        start = time.perf_counter()
+        list(crystallizer._segmenter_pool().map(_segment_chunk, [topics] * crystallizer.tokenize_workers))
+        timings["segmenters"] = time.perf_counter() - start
+    return timings
+
+
+class TokenizedCorpus:
+    """
+    [炼金中间态]: 分词语料
+    每个请求只分词一次：逐条书签的标题/标签词列表 + 全局词频，
+    由 crystallize、analyze_tags_cloud、generate_persona、analyze_theme_river 共享。
+    """
+
+    def __init__(self, bookmarks: List[Dict[str, Any]], title_tokens: List[List[str]], tag_tokens: List[List[str]]):
+        self.bookmarks = bookmarks
+        self.title_tokens = title_tokens
+        self.tag_tokens = tag_tokens
+
+        # 词频顺序与逐条累加一致 (先标题后标签)，保证并列词的排序稳定
+        word_counts: Counter = Counter()
+        for title_words, tag_words in zip(title_tokens, tag_tokens):
+            word_counts.update(title_words)
+            word_counts.update(tag_words)
+        self.word_counts: Counter = word_counts
+
+        self._title_matrix = None
+
+    def __len__(self) -> int:
+        return len(self.title_tokens)
+
+    def top_words(self, top_n: Optional[int]) -> List[Tuple[str, int]]:
+        return self.word_counts.most_common(top_n)
+
+    def title_matrix(self):
+        """
+        标题的二值文档-词矩阵 (CSR, 文档 × 词) 及其词表，首次调用时构建并缓存。
+        """
+        if self._title_matrix is None:
+            vocabulary: Dict[str, int] = {}
+            indptr = [0]
+            indices: List[int] = []
+            for words in self.title_tokens:
+                indices.extend({vocabulary.setdefault(w, len(vocabulary)) for w in words})
+                indptr.append(len(indices))
+            import numpy as np
+            from scipy import sparse
+
+            matrix = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int32), indices, indptr),
+                shape=(len(self.title_tokens), len(vocabulary)),
+            )
+            self._title_matrix = (matrix, vocabulary)
+        return self._title_matrix
+
+
+class SignalStatistics:
+    """
+    [炼金中间态]: 单遍统计账本
+    一次遍历填满月份、时段、域名、技能维度计数，每个 URL 只解析一次。
+    时间线 / 活跃时段 / 域名 / 雷达 / 画像都只是它的视图。
+    """
+
+    def __init__(self, radar_matcher: KeywordAutomaton):
+        self.radar_matcher = radar_matcher
+        self.total = 0
+        self.months: Counter = Counter()
+        self.hours: Counter = Counter()
+        self.domains: Counter = Counter()
+        self.radar: Counter = Counter()
+
+    def absorb(self, b: Dict[str, Any], weight: int = 1) -> None:
+        """吸收一条信号；weight=-1 时撤销 (用于增量修补)"""
+        self.total += weight
+
+        ts = b.get('timestamp', '') # YYYY-MM-DD HH:MM:SS
+        if ts and len(ts) >= 7:
+            self.months[ts[:7]] += weight # 统计 YYYY-MM
+            if len(ts) >= 13:
+                self.hours[ts[11:13]] += weight # Extract HH
+
+        url = b.get('url', '')
+        try:
+            domain = urlparse(url).netloc
+            if domain.startswith('www.'):
+                domain = domain[4:]
+            if domain:
+                self.domains[domain] += weight
+        except ValueError:
+            pass
+
+        # 一次扫描得到全部命中维度，一个书签在一个维度只算一次
+        content = (b.get('title', '') + " " + url).lower()
+        for dim in self.radar_matcher.scan(content):
+            self.radar[dim] += weight
+
+    def absorb_table(self, table: SignalTable) -> None:
+        """吸收整张信号表：月份 / 时段 / 域名由数组 bincount 得出，雷达仍逐条扫描文本"""
+        self.total += len(table)
+        self.months.update(table.period_histogram("month"))
+        self.hours.update(table.period_histogram("hour"))
+        self.domains.update(table.domain_histogram())
+        for title, url in zip(table.titles, table.urls):
+            for dim in self.radar_matcher.scan((title + " " + url).lower()):
+                self.radar[dim] += 1
+
+    def prune(self) -> None:
+        """移除撤销后归零的计数项，保证视图与全量统计一致"""
+        self.months = +self.months
+        self.hours = +self.hours
+        self.domains = +self.domains
+        self.radar = +self.radar
+
+    def align(self, table: SignalTable) -> None:
+        """
+        按全量统计 (absorb_table) 的插入顺序重排计数项：月份与时段升序，域名按在信号表中首次出现的顺序。
+        增量修补后的计数与全量一致，但新词条追加在末尾；重排后 most_common 的并列项顺序也一致。
+        """
+        self.months = Counter(dict(sorted(self.months.items())))
+        self.hours = Counter(dict(sorted(self.hours.items())))
+        self.domains = Counter({d: self.domains[d] for d in table.domains if d in self.domains})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "months": dict(self.months),
+            "hours": dict(self.hours),
+            "domains": dict(self.domains),
+            "radar": dict(self.radar),
+        }
+
+    @classmethod
+    def from_dict(cls, radar_matcher: KeywordAutomaton, data: Dict[str, Any]) -> "SignalStatistics":
+        stats = cls(radar_matcher)
+        stats.total = data["total"]
+        for field in ("months", "hours", "domains", "radar"):
+            setattr(stats, field, Counter(data[field]))
+        return stats
+
+    def persona_hits(self, persona_matcher: KeywordAutomaton) -> Counter:
+        """画像规则命中数：在唯一域名上做多模式匹配，按域名出现次数累加"""
+        hits: Counter = Counter()
+        for domain, n in self.domains.items():
+            if n <= 0:
+                continue
+            for tag in persona_matcher.scan(domain.lower()):
+                hits[tag] += n
+        return hits
+
+
+def stratified_sample(strata, size: int, seed: int = 42):
+    """
+    分层抽样：按层 (如每行 TF-IDF 权重最大的词) 排序、层内随机打乱后等距取样，
+    各层按规模成比例入样，小众主题同样有代表。返回升序的行号。
+    """
+    import numpy as np
+    n = len(strata)
+    if size >= n:
+        return np.arange(n)
+    order = np.lexsort((np.random.default_rng(seed).random(n), strata))
+    return np.sort(order[np.linspace(0, n - 1, size).astype(np.int64)])
+
+
+def row_argmax(X):
+    """CSR 矩阵每行最大值所在的列 (向量化实现，并列时取存储顺序中的第一个)；空行记为 -1"""
+    import numpy as np
+    lengths = np.diff(X.indptr)
+    filled = lengths > 0
+    strata = np.full(X.shape[0], -1, dtype=np.int64)
+    if not filled.any():
+        return strata
+    # 非空行的起点严格递增，reduceat 按行分段：先求每行最大值，再取等于最大值的第一个位置
+    starts = X.indptr[:-1][filled]
+    peaks = np.maximum.reduceat(X.data, starts)
+    positions = np.where(X.data == np.repeat(peaks, lengths[filled]), np.arange(len(X.data)), len(X.data))
+    strata[filled] = X.indices[np.minimum.reduceat(positions, starts)]
+    return strata
+
+
+def coarse_to_fine(low: int, high: int) -> List[int]:
+    """[low, high] 内的整数按由粗到细的顺序排列：先取中点，再逐层取各子区间的中点"""
+    order: List[int] = []
+    spans = deque([(low, high)])
+    while spans:
+        lo, hi = spans.popleft()
+        if lo > hi:
+            continue
+        mid = (lo + hi) // 2
+        order.append(mid)
+        spans.extend([(lo, mid - 1), (mid + 1, hi)])
+    return order
+
+
+def sampled_silhouette(distances, labels) -> float:
+    """
+    轮廓系数 (定义同 sklearn.metrics.silhouette_score)：distances 为评分行之间的距离矩阵，
+    在各候选 k 之间复用，每个候选只需一次矩阵乘法。单成员星群记 0，只有一个星群时记 -1。
+    """
+    import numpy as np
+    n = len(labels)
+    rows = np.arange(n)
+    onehot = np.zeros((n, int(labels.max()) + 1))
+    onehot[rows, labels] = 1
+    sizes = onehot.sum(axis=0)
+    if np.count_nonzero(sizes) < 2:
+        return -1.0
+    totals = distances @ onehot  # 每行到各星群成员的距离之和
+    own = sizes[labels]
+    inner = totals[rows, labels] / np.maximum(own - 1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = totals / sizes
+    means[:, sizes == 0] = np.inf
+    means[rows, labels] = np.inf
+    outer = means.min(axis=1)
+    spread = np.maximum(inner, outer)
+    scores = np.where((own > 1) & (spread > 0), (outer - inner) / np.where(spread > 0, spread, 1), 0.0)
+    return float(scores.mean())
+
+
+def inertia_elbow(ks: List[int], inertias: List[float]) -> int:
+    """惯性曲线的肘部 (kneedle)：归一化后离首尾连线最远的候选"""
+    if len(ks) < 3 or inertias[0] == inertias[-1]:
+        return ks[0]
+    span_k, span_i = ks[-1] - ks[0], inertias[0] - inertias[-1]
+    gaps = [(1 - (k - ks[0]) / span_k) - (inertia - inertias[-1]) / span_i for k, inertia in zip(ks, inertias)]
+    return ks[max(range(len(ks)), key=gaps.__getitem__)]
+
+
+class ClusterModel:
+    """
+    [炼金中间态]: 已拟合的星群模型
+    向量化器 + 聚类重心 (+ 哈希引擎的 IDF)，可持久化，并为新书签分配最近的星群。
+    """
+
+    def __init__(self, engine: str, vectorizer, kmeans, feature_names: Dict[int, str], idf=None):
+        self.engine = engine
+        self.vectorizer = vectorizer
+        self.kmeans = kmeans
+        self.feature_names = feature_names
+        self.selection: Optional[Dict[str, Any]] = None  # 自动选择星群数量时的扫描报告 (见 select_k)
+        self.idf = idf
+
+    @property
+    def n_clusters(self) -> int:
+        return self.kmeans.n_clusters
+
+    def transform(self, documents: List[str]):
+        """将文档映射到拟合时的特征空间"""
+        if self.idf is None:
+            return self.vectorizer.transform(documents)
+        from sklearn.preprocessing import normalize
+        return normalize(self.vectorizer.transform(documents).multiply(self.idf).tocsr())
+
+    def assign(self, documents: List[str], chunk_size: int = 4096):
+        """逐块为文档分配最近的星群重心"""
+        import numpy as np
+        if not documents:
+            return np.zeros(0, dtype=np.int32)
+        return np.concatenate([
+            self.kmeans.predict(self.transform(documents[start:start + chunk_size]))
+            for start in range(0, len(documents), chunk_size)
+        ])
+
+    def keywords(self, cluster_id: int, top_n: int = 3) -> List[str]:
+        """通过聚类重心 (Centroid) 逆向获取最重要的特征词"""
+        centroid = self.kmeans.cluster_centers_[cluster_id]
+        top_indices = centroid.argsort()[-top_n:][::-1]
+        return [self.feature_names[idx] for idx in top_indices if idx in self.feature_names]
+
 
 class KnowledgeCrystallizer:
     """
@@ -17,270 +424,669 @@ class KnowledgeCrystallizer:
     逻辑: TF-IDF 萃取 -> K-Means 聚合 -> 重心逆向标记
     """
 
-    def __init__(self, n_clusters: int = 8):
+    RIVER_GRANULARITIES = ("month", "week")
+    CLUSTER_ENGINES = ("auto", "full", "minibatch")
+
+    # token_pattern=r"(?u)\b\w+\b" 确保兼容中英混合
+    TOKEN_PATTERN = r"(?u)\b\w+\b"
+
+    def __init__(self, n_clusters: int = 8, token_cache_size: int = 100_000, rules_path: Optional[str] = None,
+                 large_corpus_threshold: int = 100_000, chunk_size: int = 4096, hash_features: int = 2 ** 18,
+                 tokenize_workers: int = 0, tokenize_threshold: int = 20_000,
+                 k_sample_size: int = 1000, k_search_fraction: float = 0.25):
         self.n_clusters = n_clusters
+        # 🏭 大库引擎：超过阈值后改用 哈希特征 + MiniBatchKMeans 分块拟合，内存占用与词表大小无关
+        self.large_corpus_threshold = large_corpus_threshold
+        self.chunk_size = chunk_size
+        self.hash_features = hash_features
+        # 🎯 自动选择星群数量：在分层样本 (不超过 k_sample_size 行，小库按规模缩小) 上扫描候选 k，
+        #    耗时不超过一次全量拟合 (估计值) 的 k_search_fraction；至少比较两个候选，
+        #    全量拟合只需十几毫秒的小库上这两个候选的固定开销可能超出该比例
+        self.k_sample_size = k_sample_size
+        self.k_search_fraction = k_search_fraction
+        # 📜 规则书：技能雷达维度与画像规则，启动时编译为多模式匹配器
+        self.rules = load_rulebook(rules_path)
+        # 🧠 跨请求分词记忆：重复上传时绝大多数标题都会命中
+        self._segment = TokenMemo(self._segment_text, token_cache_size)
+        # 🪓 批量分词：未命中记忆的文本不少于 tokenize_threshold 条时，分块交给 tokenize_workers 个分词进程
+        self.tokenize_workers = tokenize_workers
+        self.tokenize_threshold = tokenize_threshold
+        self._segmenters = None
+        self._segmenters_lock = threading.Lock()
         # 🛡️ 噪音屏蔽场 (Stop Words)
         self.stop_words = {
             '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这', '如何', '什么', '怎么', '教程', '指南', '2023', '2024', '2025', 'com', 'cn', 'net', 'org', 'github', '官网', '下载', '使用', '方法', '解决', '推荐', '工具', '平台'
         }
 
+    def _segment_text(self, text: str) -> Tuple[str, ...]:
+        """原子级分词 (无记忆版本)，结果由 self._segment 做 LRU 缓存"""
+        return segment_text(text, self.stop_words)
+
+    def _segmenter_pool(self):
+        """分词进程池 (spawn，首次使用时创建)：每个进程在初始化时加载 jieba 词典并持有停用词表"""
+        with self._segmenters_lock:
+            if self._segmenters is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                self._segmenters = ProcessPoolExecutor(
+                    max_workers=self.tokenize_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_segmenter,
+                    initargs=(frozenset(self.stop_words),),
+                )
+            return self._segmenters
+
+    def segment_batch(self, texts: Sequence[str]) -> List[Tuple[str, ...]]:
+        """
+        [批量分词]: 按输入顺序返回每段文本的词元，与逐条调用 self._segment 的结果完全一致。
+        先查分词记忆，未命中的文本去重后不少于 tokenize_threshold 条 (且配置了分词进程) 时，
+        分块并行分词 (停用词与长度过滤在分词进程中完成)，结果按块顺序取回并回填记忆；
+        否则在当前进程串行分词，小批量不承担进程间通信的开销。
+        串行分词每 CHECKPOINT_ROWS 条经过一次调度检查点 (超出预算被放弃时提前结束)。
+        """
+        if self.tokenize_workers < 1 or len(texts) < self.tokenize_threshold:
+            segments: List[Tuple[str, ...]] = []
+            for start in range(0, len(texts), CHECKPOINT_ROWS):
+                checkpoint()
+                segments.extend(self._segment(text) for text in texts[start:start + CHECKPOINT_ROWS])
+            return segments
+
+        known: Dict[str, Tuple[str, ...]] = {}
+        missing: List[str] = []
+        for text in dict.fromkeys(texts):
+            tokens = self._segment.lookup(text)
+            if tokens is None:
+                missing.append(text)
+            else:
+                known[text] = tokens
+        if len(missing) < self.tokenize_threshold:
+            for i, text in enumerate(missing):
+                if i % CHECKPOINT_ROWS == 0:
+                    checkpoint()
+                known[text] = self._segment_text(text)
+                self._segment.store(text, known[text])
+        else:
+            with stage("segment_pool", len(missing)) as record:
+                # 每个进程分到若干块，块不宜过小 (每块一次往返)
+                size = max(1024, -(-len(missing) // (self.tokenize_workers * 4)))
+                chunks = [missing[i:i + size] for i in range(0, len(missing), size)]
+                for chunk, results in zip(chunks, self._segmenter_pool().map(_segment_chunk, chunks)):
+                    for text, tokens in zip(chunk, results):
+                        self._segment.store(text, tokens)
+                        known[text] = tokens
+                record["输出"] = len(chunks)
+        return [known[text] for text in texts]
+
     def _tokenize(self, text: str) -> str:
         """原子级分词：将文本打散为语义粉末"""
-        if not text: return ""
-        # 使用 lcut 直接获取列表，减少生成器上下文开销
-        words = jieba.lcut(text)
-        # 过滤长度为1的单字（通常是噪音）和停用词
-        return " ".join([w for w in words if len(w) > 1 and w not in self.stop_words])
+        return " ".join(self._segment(text))
 
-    def crystallize(self, bookmarks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def token_cache_info(self):
+        """分词记忆的命中统计 (hits / misses / currsize)"""
+        return self._segment.cache_info()
+
+    @instrumented("tokenize")
+    def tokenize_corpus(self, bookmarks: List[Dict[str, Any]]) -> TokenizedCorpus:
+        """
+        [预处理]: 为一次请求构建共享的分词语料。
+        标题与标签分开分词，等价于旧版对 "标题 + 标签" 拼接串的分词。
+        """
+        if isinstance(bookmarks, SignalTable):
+            titles, tags = bookmarks.titles, bookmarks.tags
+        else:
+            titles = [b.get('title', '') for b in bookmarks]
+            tags = [b.get('tags', []) for b in bookmarks]
+
+        # 标题与标签拼成一批 (空标签不分词)，按原顺序拆回
+        tagged = [i for i, t in enumerate(tags) if t]
+        segments = self.segment_batch(list(titles) + [" ".join(tags[i]) for i in tagged])
+        title_tokens: List[List[str]] = [list(words) for words in segments[:len(titles)]]
+        tag_tokens: List[List[str]] = [[] for _ in titles]
+        for i, words in zip(tagged, segments[len(titles):]):
+            tag_tokens[i] = list(words)
+        return TokenizedCorpus(bookmarks, title_tokens, tag_tokens)
+
+    def _ensure_corpus(self, bookmarks: List[Dict[str, Any]], corpus: Optional[TokenizedCorpus]) -> TokenizedCorpus:
+        if corpus is None:
+            return self.tokenize_corpus(bookmarks)
+        if len(corpus) != len(bookmarks):
+            raise ValueError(f"分词语料与书签数量不一致: {len(corpus)} != {len(bookmarks)}")
+        return corpus
+
+    @instrumented("crystallize")
+    def crystallize(self, bookmarks: List[Dict[str, Any]], corpus: Optional[TokenizedCorpus] = None,
+                    engine: str = "auto", n_clusters: Optional[int] = None,
+                    preview: Optional[int] = 10, with_indices: bool = False) -> List[Dict[str, Any]]:
         """
         [熔炼流程]: 执行光谱聚类并析出星群结晶
+        engine: "full" 全量 TF-IDF + KMeans；"minibatch" 哈希特征 + MiniBatchKMeans；
+                "auto" 按 large_corpus_threshold 自动切换。
+        n_clusters: 本次结晶的星群数量，缺省时使用实例配置 (按请求传参，不修改共享状态)。
+        preview / with_indices: 见 build_crystals。
+        """
+        fitted = self.fit_clusters(bookmarks, corpus, engine, n_clusters)
+        if fitted is None:
+            return []
+        model, valid_indices, labels = fitted
+        return self.build_crystals(bookmarks, valid_indices, labels, model, preview, with_indices)
+
+    def crystallize_auto(self, bookmarks: List[Dict[str, Any]], corpus: Optional[TokenizedCorpus] = None,
+                         engine: str = "auto", max_clusters: Optional[int] = None, preview: Optional[int] = 10,
+                         with_indices: bool = False) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        [熔炼流程]: 自动选择星群数量后结晶 (候选 k = 2..max_clusters)，返回 (星群列表, 扫描报告)；
+        样本不足时返回 ([], None)。其余参数同 crystallize。
+        """
+        with stage("crystallize", len(bookmarks)) as record:
+            fitted = self.fit_clusters(bookmarks, corpus, engine, max_clusters, auto_k=True)
+            if fitted is None:
+                return [], None
+            model, valid_indices, labels = fitted
+            crystals = self.build_crystals(bookmarks, valid_indices, labels, model, preview, with_indices)
+            record["输出"] = len(crystals)
+        return crystals, model.selection
+
+    def select_documents(self, corpus: TokenizedCorpus) -> Tuple[List[int], List[str]]:
+        """原料筛选：至少保留2个语义特征的信号，返回其下标与拼接后的文档"""
+        valid_indices: List[int] = []
+        documents: List[str] = []
+        for i, words in enumerate(corpus.title_tokens):
+            if len(words) >= 2:
+                valid_indices.append(i)
+                documents.append(" ".join(words))
+        return valid_indices, documents
+
+    @instrumented("fit_clusters")
+    def fit_clusters(self, bookmarks: List[Dict[str, Any]], corpus: Optional[TokenizedCorpus] = None,
+                     engine: str = "auto", n_clusters: Optional[int] = None, auto_k: bool = False):
         """
+        [拟合]: 向量化 + 空间聚类，返回 (ClusterModel, 有效信号下标, 标签)；样本不足时返回 None。
+        auto_k: 自动选择星群数量 (见 select_k)，此时 n_clusters 是候选上界；扫描报告记在 model.selection。
+        """
+        n_clusters = n_clusters or self.n_clusters
         if not DEPENDENCIES_INSTALLED:
             print("❌ [Crystallizer] 缺少关键试剂: sklearn 或 jieba。")
-            return []
+            return None
+
+        corpus = self._ensure_corpus(bookmarks, corpus)
 
         # 1. 原料筛选
-        corpus = []
-        valid_items = []
-        for b in bookmarks:
-            tokenized = self._tokenize(b.get('title', ''))
-            if len(tokenized.split()) >= 2: # 至少保留2个语义特征的信号
-                corpus.append(tokenized)
-                valid_items.append(b)
-
-        # 🛡️ 样本保护：如果样本量太少，聚类会退化为噪音
-        min_samples = self.n_clusters * 2
-        if len(corpus) < min_samples:
-            print(f"⚠️ [Crystallizer] 样本量 ({len(corpus)}) 不足，星群无法析出。")
-            return []
+        valid_indices, documents = self.select_documents(corpus)
 
-        print(f"⚗️ [Crystallizer] 正在高维空间解析 {len(corpus)} 条知识路径...")
+        # 🛡️ 样本保护：如果样本量太少，聚类会退化为噪音 (自动选择时按最小的候选 k = 2 计)
+        min_samples = 4 if auto_k else n_clusters * 2
+        if len(documents) < min_samples:
+            print(f"⚠️ [Crystallizer] 样本量 ({len(documents)}) 不足，星群无法析出。")
+            return None
 
-        # 2. 向量化 (TF-IDF)
-        # token_pattern=r"(?u)\b\w+\b" 确保兼容中英混合
-        vectorizer = TfidfVectorizer(max_features=1000, token_pattern=r"(?u)\b\w+\b")
+        if engine not in self.CLUSTER_ENGINES:
+            raise ValueError(f"未知的聚类引擎: {engine}")
+        if engine == "auto":
+            engine = "minibatch" if len(documents) >= self.large_corpus_threshold else "full"
+
+        print(f"⚗️ [Crystallizer] 正在高维空间解析 {len(documents)} 条知识路径 (引擎: {engine})...")
+
+        # 2. 向量化 + 3. 空间聚类
         try:
-            X = vectorizer.fit_transform(corpus)
-        except Exception as e:
+            if engine == "full":
+                model, labels = self._fit_full(documents, n_clusters, auto_k)
+            else:
+                model, labels = self._fit_minibatch(documents, corpus, n_clusters, auto_k)
+        except ValueError as e:
             print(f"❌ [Crystallizer] 向量化失败: {e}")
-            return []
+            return None
+        return model, valid_indices, labels
 
-        # 3. 空间聚类 (K-Means)
-        # 使用 random_state=42 确保每次炼金的稳定性
-        kmeans = KMeans(n_clusters=self.n_clusters, random_state=42, n_init='auto')
-        kmeans.fit(X)
-
-        # 4. 逆向析出星群标签
-        feature_names = vectorizer.get_feature_names_out()
+    @instrumented("build_crystals")
+    def build_crystals(self, bookmarks: List[Dict[str, Any]], valid_indices: List[int], labels,
+                       model: "ClusterModel", preview: Optional[int] = 10,
+                       with_indices: bool = False) -> List[Dict[str, Any]]:
+        """
+        [析出]: 按标签归并信号，用重心特征词为每个星群命名
+        preview: nodes 只保留前 preview 个成员作为预览信号；None 时保留全部成员 (供分页明细使用)。
+        with_indices: 附带 indices 字段 (全部成员在输入中的下标)，供调用方还原逐条的星群标签。
+        """
         cluster_map = defaultdict(list)
-        for idx, label in enumerate(kmeans.labels_):
-            cluster_map[label].append(valid_items[idx])
+        for idx, label in zip(valid_indices, labels):
+            cluster_map[int(label)].append(idx)
+        # 信号表只为保留的节点还原信号字典；需要全部成员时一次性整表还原更快
+        if not isinstance(bookmarks, SignalTable):
+            record = bookmarks.__getitem__
+        elif preview is None:
+            record = bookmarks.to_records().__getitem__
+        else:
+            record = bookmarks.record
 
         crystals = []
-        for i in range(self.n_clusters):
+        for i in range(model.n_clusters):
             items = cluster_map[i]
             if not items: continue
 
             # 通过聚类重心 (Centroid) 逆向获取最重要的 3 个特征词
-            centroid = kmeans.cluster_centers_[i]
-            top_indices = centroid.argsort()[-3:][::-1]
-            keywords = [feature_names[idx] for idx in top_indices]
-            
+            keywords = model.keywords(i)
             cluster_name = " + ".join(keywords).upper()
 
-            crystals.append({
+            crystal = {
                 "cluster_id": i,
                 "topic": cluster_name,
                 "size": len(items),
-                "nodes": items[:10], # 只保留前10个样本作为预览信号
+                "nodes": [record(idx) for idx in items[:preview]],
                 "keywords": keywords
-            })
+            }
+            if with_indices:
+                crystal["indices"] = items
+            crystals.append(crystal)
 
         # 按星群引力（大小）降序排列
         return sorted(crystals, key=lambda x: x['size'], reverse=True)
 
-    def analyze_timeline(self, bookmarks: List[Dict[str, Any]]) -> Dict[str, int]:
-        """[Chronos]: 时间热力图析出"""
-        counts = defaultdict(int)
+    def select_k(self, Xs, max_clusters: int, search_start: float, fit_estimate: Callable[[float], float]):
+        """
+        [星群数量选择]: 在样本矩阵 Xs 上扫描候选 k ≤ max_clusters，返回 (选定的 k, 全维度的初始重心, 扫描报告)。
+        自上而下热启动：先在上界 k 冷启动拟合一次，其余候选由已扫描的、比它大的最近候选的重心
+        按 Ward 代价反复合并最近的一对得到初值，只需少量迭代即可收敛 (质量与逐个冷启动相当)。
+        评分取样本上的轮廓系数 (最多 300 行，距离矩阵只算一次)，并列时取较小的 k；若最高分出现在上界
+        (样本中没有明显的自然分群)，改取惯性曲线的肘部。
+        其余候选按由粗到细的顺序扫描 (先区间中点，再逐层细分)，预算紧张时仍能覆盖整个区间。
+        预算为一次全量拟合的 k_search_fraction，从 search_start (perf_counter 时刻，含抽样) 起算；
+        全量拟合的耗时由 fit_estimate 按样本上热启动拟合的平均耗时估计，每扫描一个候选更新一次。
+        比较两个候选之后，若再扫描一个 (按已扫描候选的最大耗时估计) 就会超出预算即停。
+        """
+        import numpy as np
+        from sklearn.cluster import KMeans, kmeans_plusplus
+        from sklearn.metrics import pairwise_distances
+
+        start = time.perf_counter()
+        # 只保留样本中出现过的列：哈希特征空间很宽，重心在紧凑空间中计算与保存
+        width = Xs.shape[1]
+        columns = np.unique(Xs.indices)
+        Xs = Xs.tocsc()[:, columns].tocsr()
+        rows = Xs.shape[0]
+        k_max = max(2, min(max_clusters, rows // 2))
+        scored = np.random.RandomState(42).permutation(rows)[:300]
+        distances = pairwise_distances(Xs[scored])
+
+        candidates: List[Dict[str, Any]] = []
+        fitted: Dict[int, Tuple[Any, Any]] = {}  # k -> (重心, 各星群样本数)
+        warm_fits: List[float] = []  # 热启动拟合的耗时 (秒)，用于估计全量拟合
+
+        def evaluate(k: int, kmeans, elapsed_from: float) -> None:
+            labels = kmeans.labels_
+            fitted[k] = (np.asarray(kmeans.cluster_centers_, dtype=np.float64),
+                         np.bincount(labels, minlength=k).astype(np.float64))
+            candidates.append({
+                "k": k,
+                "轮廓系数": round(sampled_silhouette(distances, labels[scored]), 4),
+                "惯性": round(float(kmeans.inertia_), 3),
+                "耗时ms": round((time.perf_counter() - elapsed_from) * 1000, 3),
+            })
+
+        # 上界 k 的初值用 k-means++ 在稠密的紧凑样本上求 (比在稀疏矩阵上快数倍)，之后的拟合仍用稀疏矩阵
+        seeds, _ = kmeans_plusplus(Xs.toarray(), k_max, random_state=42)
+        evaluate(k_max, KMeans(n_clusters=k_max, init=seeds, n_init=1).fit(Xs), start)
+        order = coarse_to_fine(2, k_max - 1)
+        for k in order:
+            checkpoint()
+            if len(candidates) >= 2:
+                deadline = search_start + self.k_search_fraction * fit_estimate(sum(warm_fits) / len(warm_fits))
+                step = max(c["耗时ms"] for c in candidates[1:]) / 1000
+                if time.perf_counter() + step > deadline:
+                    break
+            step_start = time.perf_counter()
+            # 从已扫描的、比 k 大的最近候选出发，按 Ward 代价 (合并后惯性的增量) 反复合并最近的一对重心
+            merged, sizes = fitted[min(f for f in fitted if f > k)]
+            while len(merged) > k:
+                gap = ((merged[:, None, :] - merged[None, :, :]) ** 2).sum(axis=-1)
+                cost = sizes[:, None] * sizes[None, :] / np.maximum(sizes[:, None] + sizes[None, :], 1) * gap
+                np.fill_diagonal(cost, np.inf)
+                i, j = np.unravel_index(int(np.argmin(cost)), cost.shape)
+                center = (merged[i] * sizes[i] + merged[j] * sizes[j]) / max(sizes[i] + sizes[j], 1)
+                keep = [x for x in range(len(merged)) if x not in (i, j)]
+                merged = np.vstack([merged[keep], center])
+                sizes = np.append(sizes[keep], sizes[i] + sizes[j])
+            fit_start = time.perf_counter()
+            kmeans = KMeans(n_clusters=k, init=merged, n_init=1).fit(Xs)
+            warm_fits.append(time.perf_counter() - fit_start)
+            evaluate(k, kmeans, step_start)
+        truncated = len(candidates) < len(order) + 1
+
+        candidates.sort(key=lambda c: c["k"])
+        ks = [c["k"] for c in candidates]
+        chosen, method = max(candidates, key=lambda c: c["轮廓系数"])["k"], "轮廓系数"
+        if chosen == k_max and len(ks) >= 3:
+            chosen, method = inertia_elbow(ks, [c["惯性"] for c in candidates]), "惯性肘部"
+
+        init = np.zeros((chosen, width))
+        init[:, columns] = fitted[chosen][0]
+        return chosen, init, {"方法": method, "选定": chosen, "抽样": rows, "候选": candidates, "截断": truncated}
+
+    def _sample_size(self, n: int, max_clusters: int) -> int:
+        """
+        选 k 的样本行数：不超过 k_sample_size；小库按规模缩小 (冷启动拟合一次样本约占全量拟合的
+        k_search_fraction / 2)，但至少 4 * max_clusters 行，保证上界 k 的每个星群都有样本
+        """
+        return min(self.k_sample_size, max(4 * max_clusters, int(n * self.k_search_fraction / 2)))
+
+    @staticmethod
+    def _settle_selection(selection: Dict[str, Any], search_seconds: float, fit_seconds: float) -> Dict[str, Any]:
+        """扫描报告补上耗时：搜索 (抽样 + 扫描) 与选定 k 之后的全量拟合 (向量化 + 聚类)，以及两者之比"""
+        return {
+            **selection,
+            "搜索耗时ms": round(search_seconds * 1000, 3),
+            "全量拟合耗时ms": round(fit_seconds * 1000, 3),
+            "搜索占比": round(search_seconds / fit_seconds, 4) if fit_seconds else None,
+        }
+
+    def _fit_full(self, documents: List[str], n_clusters: int, auto_k: bool = False):
+        """全量引擎：TF-IDF (1000 维词表) + 全批 K-Means；auto_k 时先在分层样本上选定 k，再以样本重心起步拟合"""
+        import numpy as np
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.cluster import KMeans
+
+        start = time.perf_counter()
+        with stage("tfidf", len(documents)):
+            vectorizer = TfidfVectorizer(max_features=1000, token_pattern=self.TOKEN_PATTERN)
+            X = vectorizer.fit_transform(documents)
+        vectorize_seconds = time.perf_counter() - start
+        checkpoint()
+
+        selection = None
+        if auto_k:
+            search_start = time.perf_counter()
+            with stage("select_k", X.shape[0]) as record:
+                # 以每行权重最大的词为层；K-Means 在稀疏 TF-IDF 上很快，全量拟合的耗时以向量化为主
+                sample = stratified_sample(row_argmax(X), self._sample_size(X.shape[0], n_clusters))
+                # 全量拟合 = 向量化 + 以选定重心起步的 K-Means，后者按样本上热启动拟合的耗时乘以行数之比估计
+                scale = X.shape[0] / len(sample)
+                n_clusters, init, selection = self.select_k(
+                    X[sample], n_clusters, search_start, lambda fit_seconds: vectorize_seconds + fit_seconds * scale
+                )
+                record["输出"] = n_clusters
+            search_seconds = time.perf_counter() - search_start
+
+        # 使用 random_state=42 确保每次炼金的稳定性
+        checkpoint()
+        with stage("kmeans", X.shape[0]):
+            fit_start = time.perf_counter()
+            if selection is None:
+                kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init='auto')
+            else:
+                kmeans = KMeans(n_clusters=n_clusters, init=init, n_init=1)
+            kmeans.fit(X)
+        feature_names = dict(enumerate(vectorizer.get_feature_names_out()))
+        model = ClusterModel("full", vectorizer, kmeans, feature_names)
+        if selection is not None:
+            model.selection = self._settle_selection(selection, search_seconds,
+                                                     vectorize_seconds + time.perf_counter() - fit_start)
+        return model, kmeans.labels_
+
+    def _fit_minibatch(self, documents: List[str], corpus: TokenizedCorpus, n_clusters: int, auto_k: bool = False):
+        """
+        大库引擎：定宽哈希特征空间 + MiniBatchKMeans 分块 partial_fit。
+        IDF 由分块累计的文档频率得到；哈希不可逆，特征词通过对语料词表做同样的哈希反查。
+        auto_k 时在累计文档频率的同一遍中记下分层依据，只对样本做 TF-IDF 来选定 k。
+        """
+        import numpy as np
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.cluster import MiniBatchKMeans
+
+        vectorizer = HashingVectorizer(
+            n_features=self.hash_features, token_pattern=self.TOKEN_PATTERN,
+            alternate_sign=False, norm=None
+        )
+        chunks = [(start, start + self.chunk_size) for start in range(0, len(documents), self.chunk_size)]
+
+        # 第一遍：累计文档频率，得到平滑 IDF (与 TfidfVectorizer 的公式一致)
+        #         自动选择 k 时顺带记下每行词频最大的哈希列作为分层依据 (此时 IDF 尚未求出)
+        idf_start = time.perf_counter()
+        strata = [] if auto_k else None
+        with stage("hashing_idf", len(documents)):
+            df = np.zeros(self.hash_features, dtype=np.int64)
+            for start, stop in chunks:
+                checkpoint()
+                X = vectorizer.transform(documents[start:stop])
+                df += np.bincount(X.indices, minlength=self.hash_features)
+                if strata is not None:
+                    strata.append(row_argmax(X))
+            idf = np.log((1 + len(documents)) / (1 + df)) + 1
+        vectorize_seconds = time.perf_counter() - idf_start
+
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=self.chunk_size, n_init=3)
+        model = ClusterModel("minibatch", vectorizer, kmeans, {}, idf=idf)
+        selection = None
+        if auto_k:
+            search_start = time.perf_counter()
+            with stage("select_k", len(documents)) as record:
+                sample = stratified_sample(np.concatenate(strata), self._sample_size(len(documents), n_clusters))
+                Xs = model.transform([documents[i] for i in sample])
+                # 全量拟合除第一遍外还要把语料再哈希三遍 (两轮 partial_fit + 分配)，以第一遍的耗时估计
+                n_clusters, init, selection = self.select_k(Xs, n_clusters, search_start,
+                                                            lambda fit_seconds: 4 * vectorize_seconds)
+                record["输出"] = n_clusters
+            search_seconds = time.perf_counter() - search_start
+            kmeans = model.kmeans = MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=1, random_state=42,
+                                                    batch_size=self.chunk_size)
+
+        # 第二遍：分块拟合 (两轮)，首块不足 k 个样本时与下一块合并
+        fit_start = time.perf_counter()
+        fit_chunks = chunks if chunks[0][1] - chunks[0][0] >= n_clusters else [(0, len(documents))]
+        with stage("minibatch_kmeans", len(documents)):
+            for _ in range(2):
+                for start, stop in fit_chunks:
+                    checkpoint()
+                    kmeans.partial_fit(model.transform(documents[start:stop]))
+
+        # 第三遍：逐块分配标签，峰值内存只与块大小有关
+        with stage("assign", len(documents)):
+            labels = model.assign(documents, self.chunk_size)
+        if selection is not None:
+            model.selection = self._settle_selection(selection, search_seconds,
+                                                     vectorize_seconds + time.perf_counter() - fit_start)
+
+        # 特征词反查：列号 -> 该列上出现最多的词
+        with stage("keyword_lookup", len(corpus.word_counts)) as record:
+            analyzer = vectorizer.build_analyzer()
+            term_counts: Counter = Counter()
+            for word, n in corpus.word_counts.items():
+                for term in analyzer(word):
+                    term_counts[term] += n
+            terms = [t for t, _ in term_counts.most_common()]
+            if terms:
+                columns = vectorizer.transform(terms).indices
+                for term, column in zip(terms, columns):
+                    model.feature_names.setdefault(int(column), term)
+            record["输出"] = len(model.feature_names)
+        return model, labels
+
+    @instrumented("statistics")
+    def compute_statistics(self, bookmarks: List[Dict[str, Any]]) -> SignalStatistics:
+        """[预处理]: 单遍扫描全部信号，一次性填满所有计数器"""
+        stats = SignalStatistics(self.rules.radar_matcher)
+        if isinstance(bookmarks, SignalTable):
+            stats.absorb_table(bookmarks)
+            return stats
         for b in bookmarks:
-            ts = b.get('timestamp', '')
-            if ts and len(ts) >= 7:
-                counts[ts[:7]] += 1 # 统计 YYYY-MM
-        return dict(sorted(counts.items()))
+            stats.absorb(b)
+        return stats
+
+    def _ensure_stats(self, bookmarks: List[Dict[str, Any]], stats: Optional[SignalStatistics]) -> SignalStatistics:
+        return stats if stats is not None else self.compute_statistics(bookmarks)
 
-    def analyze_domains(self, bookmarks: List[Dict[str, Any]], top_n: int = 10) -> List[Dict[str, Any]]:
+    @instrumented("timeline")
+    def analyze_timeline(self, bookmarks: List[Dict[str, Any]], stats: Optional[SignalStatistics] = None) -> Dict[str, int]:
+        """[Chronos]: 时间热力图析出"""
+        stats = self._ensure_stats(bookmarks, stats)
+        return dict(sorted(stats.months.items()))
+
+    @instrumented("domains")
+    def analyze_domains(self, bookmarks: List[Dict[str, Any]], top_n: Optional[int] = 10, stats: Optional[SignalStatistics] = None) -> List[Dict[str, Any]]:
         """[Territory]: 域名领地分析"""
-        from urllib.parse import urlparse
-        domain_counts = defaultdict(int)
-        
-        for b in bookmarks:
-            url = b.get('url', '')
-            try:
-                domain = urlparse(url).netloc
-                if domain.startswith('www.'):
-                    domain = domain[4:]
-                if domain:
-                    domain_counts[domain] += 1
-            except:
-                continue
-                
-        sorted_domains = sorted(domain_counts.items(), key=lambda x: x[1], reverse=True)[:top_n]
-        return [{"name": d, "value": c} for d, c in sorted_domains]
+        stats = self._ensure_stats(bookmarks, stats)
+        return [{"name": d, "value": c} for d, c in stats.domains.most_common(top_n)]
 
-    def analyze_activity_hours(self, bookmarks: List[Dict[str, Any]]) -> Dict[str, int]:
+    @instrumented("activity_hours")
+    def analyze_activity_hours(self, bookmarks: List[Dict[str, Any]], stats: Optional[SignalStatistics] = None) -> Dict[str, int]:
         """[Circadian]: 昼夜活跃节律"""
-        hours = defaultdict(int)
-        for b in bookmarks:
-            ts = b.get('timestamp', '') # YYYY-MM-DD HH:MM:SS
-            if ts and len(ts) >= 13:
-                hour = ts[11:13] # Extract HH
-                hours[hour] += 1
-        return dict(sorted(hours.items()))
+        stats = self._ensure_stats(bookmarks, stats)
+        return dict(sorted(stats.hours.items()))
 
-    def analyze_skill_radar(self, bookmarks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    @instrumented("skill_radar")
+    def analyze_skill_radar(self, bookmarks: List[Dict[str, Any]], stats: Optional[SignalStatistics] = None) -> List[Dict[str, Any]]:
         """[Skill Tree]: 技能六边形雷达数据"""
-        # 定义技能维度与关键词映射
-        dimensions = {
-            "Coding": ["github", "stackoverflow", "csdn", "juejin", "python", "java", "code", "git", "api", "dev"],
-            "AI/ML": ["arxiv", "huggingface", "openai", "gpt", "model", "deep", "learning", "ai", "bot"],
-            "Product": ["figma", "dribbble", "producthunt", "notion", "linear", "design", "ui", "ux"],
-            "Media": ["bilibili", "youtube", "netflix", "spotify", "music", "video", "douban", "movie"],
-            "Academic": ["scholar", "edu", "university", "paper", "research", "science", "wiki", "book"],
-            "Life": ["taobao", "jd", "amazon", "map", "food", "travel", "news", "blog"]
-        }
-        
-        scores = defaultdict(int)
-        
-        for b in bookmarks:
-            content = (b.get('title', '') + " " + b.get('url', '')).lower()
-            for dim, keywords in dimensions.items():
-                for kw in keywords:
-                    if kw in content:
-                        scores[dim] += 1
-                        break # 一个书签在一个维度只算一次
-        
-        # 归一化处理：找出最大值，将所有值映射到 0-100
+        stats = self._ensure_stats(bookmarks, stats)
+        scores = stats.radar
+
+        # 归一化处理：找出最大值，作为雷达图刻度的参照
         max_score = max(scores.values()) if scores else 1
         
         radar_data = []
-        for dim in dimensions.keys():
-            raw_score = scores[dim]
-            # 简单的线性映射，但也保留原始值
-            normalized = int((raw_score / max_score) * 100) if max_score > 0 else 0
+        for dim in self.rules.skill_dimensions:
             radar_data.append({
                 "name": dim,
-                "value": raw_score, 
+                "value": scores[dim], 
                 "max": max_score + 5 # 雷达图的最大刻度略大于实际最大值
             })
             
         return radar_data
 
-    def generate_persona(self, bookmarks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @instrumented("persona")
+    def generate_persona(self, bookmarks: List[Dict[str, Any]], corpus: Optional[TokenizedCorpus] = None, stats: Optional[SignalStatistics] = None) -> Dict[str, Any]:
         """[Persona]: 用户画像生成器 (V3 核心)"""
         if not bookmarks:
             return {"level": "Lv.0 萌新", "tags": [], "top_domain": "N/A", "top_cluster": "N/A"}
 
+        stats = self._ensure_stats(bookmarks, stats)
+
         # 1. 计算等级 (基于收藏量)
-        count = len(bookmarks)
+        count = stats.total
         if count < 100: level = "Lv.1 探索者"
         elif count < 500: level = "Lv.2 收藏家"
         elif count < 1000: level = "Lv.3 知识囤积者"
         elif count < 5000: level = "Lv.4 图书馆长"
         else: level = "Lv.5 赛博贤者"
 
-        # 2. 提取标签 (基于域名规则)
-        tags = set()
-        from urllib.parse import urlparse
-        domains = []
-        for b in bookmarks:
-            try:
-                d = urlparse(b.get('url', '')).netloc
-                domains.append(d)
-            except: pass
-        
-        domain_str = " ".join(domains).lower()
-        
-        # 规则引擎
-        if "github.com" in domain_str or "stackoverflow.com" in domain_str: tags.add("开源极客")
-        if "bilibili.com" in domain_str or "youtube.com" in domain_str: tags.add("视听学习者")
-        if "arxiv.org" in domain_str or "scholar.google" in domain_str: tags.add("学术研究")
-        if "zhihu.com" in domain_str or "medium.com" in domain_str: tags.add("深度阅读")
-        if "taobao.com" in domain_str or "jd.com" in domain_str: tags.add("数字生活")
-        if "figma.com" in domain_str or "dribbble.com" in domain_str: tags.add("设计美学")
+        # 2. 提取标签 (基于域名规则，逐个唯一域名匹配，无需拼接巨型字符串)
+        hits = stats.persona_hits(self.rules.persona_matcher)
+        tags = [tag for tag in self.rules.persona_rules if hits[tag]]
 
         # 3. 获取 Top 1 域名 (最爱来源)
-        domain_stats = self.analyze_domains(bookmarks, top_n=1)
+        domain_stats = self.analyze_domains(bookmarks, top_n=1, stats=stats)
         top_domain = domain_stats[0]['name'] if domain_stats else "N/A"
 
         # 4. 获取 Top 1 聚类 (专注领域)
         # 这里需要复用已经生成的结晶数据，为了解耦，我们简单用词频最高的词代替，或者由上层传入
         # 暂时用词频最高的非停用词作为"专注领域"
-        cloud = self.analyze_tags_cloud(bookmarks, top_n=1)
+        cloud = self.analyze_tags_cloud(bookmarks, top_n=1, corpus=corpus)
         top_cluster = cloud[0]['name'] if cloud else "杂学家"
 
         return {
             "level": level,
-            "tags": list(tags)[:3], # 最多展示3个标签
+            "tags": tags[:3], # 最多展示3个标签
             "top_domain": top_domain,
             "top_cluster": top_cluster
         }
 
 
-    def analyze_theme_river(self, bookmarks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """[River]: 兴趣河流图 (ThemeRiver) 数据"""
-        # 按月聚合，统计每个月的 Top 3 聚类词频
-        # 1. 先按月分组
-        monthly_data = defaultdict(list)
-        for b in bookmarks:
-            ts = b.get('timestamp', '')
-            if ts and len(ts) >= 7:
-                month = ts[:7] # YYYY-MM
-                monthly_data[month].append(b)
-        
-        # 2. 对每个月的数据提取关键词
+    @instrumented("theme_river")
+    def analyze_theme_river(self, bookmarks: List[Dict[str, Any]], corpus: Optional[TokenizedCorpus] = None,
+                            top_n: int = 5, granularity: str = "month") -> List[Dict[str, Any]]:
+        """
+        [River]: 兴趣河流图 (ThemeRiver) 数据
+        河流 = 周期指示矩阵 P (周期 × 文档) · 文档-词矩阵 D (文档 × 词) · 主题包含矩阵 C (词 × 主题)，
+        一次稀疏矩阵乘法得到每个周期内提及各主题的书签数。
+        """
+        if not DEPENDENCIES_INSTALLED: return []
+        if granularity not in self.RIVER_GRANULARITIES:
+            raise ValueError(f"未知的河流粒度: {granularity}")
+
+        import numpy as np
+        from scipy import sparse
+
+        corpus = self._ensure_corpus(bookmarks, corpus)
+
+        # 1. 周期索引向量 (月: YYYY-MM，周: ISO YYYY-Www)
+        if isinstance(bookmarks, SignalTable):
+            codes, labels = bookmarks.period_codes(granularity)
+            periods: Dict[str, int] = {label: j for j, label in enumerate(labels)}
+            docs = np.flatnonzero(codes >= 0)
+            rows = codes[docs]
+        else:
+            period_key = _month_key if granularity == "month" else _week_key
+            periods = {}
+            rows, docs = [], []
+            for i, b in enumerate(bookmarks):
+                key = period_key(b.get('timestamp', ''))
+                if key:
+                    rows.append(periods.setdefault(key, len(periods)))
+                    docs.append(i)
+
+        # 2. 为了保持河流的连贯性，我们选取全局最高频的 N 个词作为"河道"
+        top_themes = [w for w, _ in corpus.top_words(top_n)]
+        if not periods or not top_themes:
+            return []
+
+        # 3. 主题包含矩阵：词表中包含主题子串的词都计入该主题 (沿用旧版 `theme in title` 语义)
+        D, vocabulary = corpus.title_matrix()
+        theme_index = {theme: j for j, theme in enumerate(top_themes)}
+        matcher = KeywordAutomaton({theme: [theme] for theme in top_themes})
+        c_rows: List[int] = []
+        c_cols: List[int] = []
+        for word, col in vocabulary.items():
+            for theme in matcher.scan(word.lower()):
+                if theme in word: # 匹配器不区分大小写，这里还原大小写敏感的判断
+                    c_rows.append(col)
+                    c_cols.append(theme_index[theme])
+        C = sparse.csr_matrix(
+            (np.ones(len(c_rows), dtype=np.int32), (c_rows, c_cols)),
+            shape=(len(vocabulary), len(top_themes)),
+        )
+        P = sparse.csr_matrix(
+            (np.ones(len(docs), dtype=np.int32), (rows, docs)),
+            shape=(len(periods), len(bookmarks)),
+        )
+
+        # 一个书签对同一主题只计一次：先二值化 D·C，再按周期求和
+        mentions = (D @ C).tocsr()
+        mentions.data[:] = 1
+        river = (P @ mentions).toarray()
+
         river_data = []
-        months = sorted(monthly_data.keys())
-        
-        # 为了保持河流的连贯性，我们选取全局最高频的 5 个词作为"河道"
-        global_cloud = self.analyze_tags_cloud(bookmarks, top_n=5)
-        top_themes = [item['name'] for item in global_cloud]
-        
-        for month in months:
-            items = monthly_data[month]
-            # 统计该月内这5个主题词的频率
-            month_counts = defaultdict(int)
-            for b in items:
-                text = b.get('title', '')
-                for theme in top_themes:
-                    if theme in text:
-                        month_counts[theme] += 1
-            
-            for theme in top_themes:
+        for period in sorted(periods):
+            row = river[periods[period]]
+            for j, theme in enumerate(top_themes):
                 river_data.append({
-                    "date": month,
+                    "date": period,
                     "name": theme,
-                    "value": month_counts[theme]
+                    "value": int(row[j])
                 })
                 
         return river_data
 
-    def analyze_tags_cloud(self, bookmarks: List[Dict[str, Any]], top_n: int = 50) -> List[Dict[str, Any]]:
-        """[Nebula]: 语义星云（词云数据）"""
+    @instrumented("tags_cloud")
+    def analyze_tags_cloud(self, bookmarks: List[Dict[str, Any]], top_n: Optional[int] = 50, corpus: Optional[TokenizedCorpus] = None) -> List[Dict[str, Any]]:
+        """[Nebula]: 语义星云（词云数据）；top_n 为 None 时返回全部词频"""
         if not DEPENDENCIES_INSTALLED: return []
-        
-        word_counts = defaultdict(int)
-        for b in bookmarks:
-            # 结合标题和现有标签
-            text = b.get('title', '') + " " + " ".join(b.get('tags', []))
-            words = self._tokenize(text).split()
-            for w in words:
-                word_counts[w] += 1
-                
-        sorted_words = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)[:top_n]
-        return [{"name": w, "value": c} for w, c in sorted_words]
+
+        # 结合标题和现有标签的全局词频，直接取自共享语料
+        corpus = self._ensure_corpus(bookmarks, corpus)
+        return [{"name": w, "value": c} for w, c in corpus.top_words(top_n)]
 
 # --- 验证逻辑 ---
 if __name__ == "__main__":
+    from cleaner import AthanorPurifier
+    from synthetic import ExportSynthesizer
+
+    # 注入测试原料：合成书签导出 (规模可通过 ATHANOR_DEMO_SIZE 调整)
+    raw = ExportSynthesizer(size=int(os.getenv("ATHANOR_DEMO_SIZE", "300"))).generate().encode('utf-8')
+    signals = AthanorPurifier().smelt_table(raw)
+
     crystallizer = KnowledgeCrystallizer(n_clusters=3)
-    # 注入测试原料...
\ No newline at end of file
+    corpus = crystallizer.tokenize_corpus(signals)
+    stats = crystallizer.compute_statistics(signals)
+
+    for crystal in crystallizer.crystallize(signals, corpus):
+        print(f"💎 [{crystal['size']:>4}] {crystal['topic']}")
+    print(f"🧭 画像: {crystallizer.generate_persona(signals, corpus, stats)}")
+    print(f"📡 雷达: {crystallizer.analyze_skill_radar(signals, stats)}")
+    print(f"🌐 领地: {crystallizer.analyze_domains(signals, top_n=5, stats=stats)}")
+    print(f"☁️ 星云: {crystallizer.analyze_tags_cloud(signals, top_n=10, corpus=corpus)}")
\ No newline at end of file
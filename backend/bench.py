@@ -0,0 +1,259 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from functools import partial
+from typing import List, Dict, Any, Callable, Optional
+
+from synthetic import ExportSynthesizer
+
+# 端到端基准默认在主进程线程池中执行，tracemalloc 才能观测到分析阶段的内存
+os.environ.setdefault("ATHANOR_WORKERS", "0")
+
+# 回归判定的噪音下限：差值低于该值的变化不视为回归
+MIN_SECONDS_DELTA = 0.005
+MIN_PEAK_KB_DELTA = 1024
+
+# 端到端基准等待服务预热就绪的上限 (秒)：worker 未能启动时报错退出，而不是无限等待
+WARM_UP_TIMEOUT = float(os.getenv("ATHANOR_BENCH_WARM_UP_TIMEOUT", "60"))
+
+
+def _quiet(fn: Callable[[], Any]) -> Any:
+    """屏蔽各组件的炼金日志输出，避免干扰计时"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+
+def measure(prepare: Callable[[], Callable[[], Any]], repeat: int) -> Dict[str, Any]:
+    """
+    预跑一次后计时 repeat 次 (取中位数与最小值)，再在 tracemalloc 下单独运行一次记录峰值内存，
+    避免内存追踪的开销污染计时。prepare 在每次运行前调用，返回待测的无参函数。
+    """
+    _quiet(prepare())  # 预跑一次：排除首次调用的惰性初始化
+    times: List[float] = []
+    for _ in range(repeat):
+        run = prepare()
+        start = time.perf_counter()
+        _quiet(run)
+        times.append(time.perf_counter() - start)
+
+    run = prepare()
+    tracemalloc.start()
+    try:
+        _quiet(run)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": round(statistics.median(times), 6),
+        "best": round(min(times), 6),
+        "runs": repeat,
+        "peak_kb": peak // 1024,
+    }
+
+
+def build_cases(raw: bytes, endpoint: bool) -> Dict[str, Callable[[], Callable[[], Any]]]:
+    """构建一个规模下的全部基准用例：名称 -> prepare()"""
+    from cleaner import AthanorPurifier
+    from ingest import SignalStream
+    from analyzer import KnowledgeCrystallizer
+    from dedup import SignalDeduplicator
+
+    purifier = AthanorPurifier()
+    signals = _quiet(lambda: purifier.smelt_table(raw))
+    crystallizer = KnowledgeCrystallizer()
+    corpus = crystallizer.tokenize_corpus(signals)
+    stats = crystallizer.compute_statistics(signals)
+    n_clusters = max(2, min(8, len(signals) // 10))
+
+    def ingest():
+        stream = SignalStream(purifier, len(raw) + 1)
+        for start in range(0, len(raw), 256 * 1024):
+            stream.feed(raw[start:start + 256 * 1024])
+        return stream.close()
+
+    cases: Dict[str, Callable[[], Callable[[], Any]]] = {
+        "smelt": lambda: lambda: purifier.smelt(raw),
+        "smelt_table": lambda: lambda: purifier.smelt_table(raw),
+        "ingest_stream": lambda: ingest,
+        "dedup": lambda: partial(SignalDeduplicator().deduplicate, signals),
+        "signal_records": lambda: signals.to_records,
+        # 冷缓存：每次使用新的结晶器 (分词记忆为空)
+        "tokenize_corpus": lambda: partial(KnowledgeCrystallizer().tokenize_corpus, signals),
+        "tokenize_corpus_warm": lambda: lambda: crystallizer.tokenize_corpus(signals),
+        "compute_statistics": lambda: lambda: crystallizer.compute_statistics(signals),
+        "crystallize_full": lambda: lambda: crystallizer.crystallize(signals, corpus, "full", n_clusters),
+        "crystallize_minibatch": lambda: lambda: crystallizer.crystallize(signals, corpus, "minibatch", n_clusters),
+        "analyze_timeline": lambda: lambda: crystallizer.analyze_timeline(signals, stats),
+        "analyze_domains": lambda: lambda: crystallizer.analyze_domains(signals, stats=stats),
+        "analyze_activity_hours": lambda: lambda: crystallizer.analyze_activity_hours(signals, stats),
+        "analyze_skill_radar": lambda: lambda: crystallizer.analyze_skill_radar(signals, stats),
+        "generate_persona": lambda: lambda: crystallizer.generate_persona(signals, corpus, stats),
+        "analyze_theme_river_month": lambda: lambda: crystallizer.analyze_theme_river(signals, corpus, 5, "month"),
+        "analyze_theme_river_week": lambda: lambda: crystallizer.analyze_theme_river(signals, corpus, 5, "week"),
+        "analyze_tags_cloud": lambda: lambda: crystallizer.analyze_tags_cloud(signals, corpus=corpus),
+    }
+    if endpoint:
+        cases["endpoint_transmute"] = _endpoint_case(raw)
+    return cases
+
+
+_client = None
+
+
+def _endpoint_case(raw: bytes) -> Callable[[], Callable[[], Any]]:
+    """端到端：经 TestClient 调用 POST /transmute，每次运行前清空结果缓存"""
+    global _client
+    import main
+    if _client is None:
+        from fastapi.testclient import TestClient
+        client = TestClient(main.app)
+        client.__enter__()
+        deadline = time.monotonic() + WARM_UP_TIMEOUT
+        while (health := client.get("/health")).status_code != 200:
+            if time.monotonic() > deadline:
+                client.__exit__(None, None, None)
+                raise RuntimeError(f"服务在 {WARM_UP_TIMEOUT:g}s 内未能预热就绪: {health.json()['预热']}")
+            time.sleep(0.1)
+        _client = client
+
+    def prepare():
+        main.result_cache.purge()
+
+        def run():
+            response = _client.post("/transmute", files={"file": ("bench.html", raw, "text/html")})
+            response.raise_for_status()
+            return response
+        return run
+    return prepare
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(sizes: List[int], repeat: int, endpoint: bool, only: Optional[List[str]],
+              synth_options: Dict[str, Any]) -> Dict[str, Any]:
+    from analyzer import warm_up
+    _quiet(warm_up)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "revision": _git_revision(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+            "generator": synth_options,
+        },
+        "results": {},
+    }
+    for size in sizes:
+        raw = ExportSynthesizer(size=size, **synth_options).generate().encode('utf-8')
+        print(f"🧪 [Bench] 规模 {size} ({len(raw) // 1024} KB)")
+        cases = build_cases(raw, endpoint)
+        results = {}
+        for name, prepare in cases.items():
+            if only and name not in only:
+                continue
+            results[name] = measure(prepare, repeat)
+            print(f"    {name:<28} {results[name]['seconds'] * 1000:>10.1f} ms   峰值 {results[name]['peak_kb']:>9} KB")
+        report["results"][str(size)] = results
+
+    global _client
+    if _client is not None:
+        _client.__exit__(None, None, None)
+        _client = None
+    return report
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """逐项对比两份结果，打印对照表，返回回归条目 (耗时或峰值内存超出 tolerance 比例且超过噪音下限)"""
+    regressions = []
+    for size, cases in current["results"].items():
+        base_cases = baseline["results"].get(size, {})
+        for name, cur in cases.items():
+            base = base_cases.get(name)
+            if base is None:
+                continue
+            time_ratio = cur["seconds"] / base["seconds"] if base["seconds"] else 1.0
+            mem_ratio = cur["peak_kb"] / base["peak_kb"] if base["peak_kb"] else 1.0
+            slower = time_ratio > 1 + tolerance and cur["seconds"] - base["seconds"] > MIN_SECONDS_DELTA
+            heavier = mem_ratio > 1 + tolerance and cur["peak_kb"] - base["peak_kb"] > MIN_PEAK_KB_DELTA
+            flag = "❌" if slower or heavier else ("✅" if time_ratio < 1 - tolerance else "  ")
+            print(f"{flag} {size:>7} {name:<28} 耗时 x{time_ratio:5.2f} ({base['seconds'] * 1000:.1f} -> {cur['seconds'] * 1000:.1f} ms)"
+                  f"   内存 x{mem_ratio:5.2f}")
+            if slower or heavier:
+                regressions.append({"size": size, "case": name, "time_ratio": round(time_ratio, 3),
+                                    "memory_ratio": round(mem_ratio, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Athanor 基准测试：合成书签导出 + 各阶段耗时与峰值内存")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="运行基准并写出 JSON 结果")
+    run.add_argument("--sizes", default="1000,10000", help="逗号分隔的链接数量 (1000 ~ 500000)")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--out", default="bench_results.json")
+    run.add_argument("--cases", default="", help="只运行指定用例 (逗号分隔)")
+    run.add_argument("--no-endpoint", action="store_true", help="跳过端到端 /transmute 基准")
+    run.add_argument("--compare", help="运行结束后与该基线对比，出现回归时以非零状态退出")
+    run.add_argument("--tolerance", type=float, default=0.15)
+    run.add_argument("--max-depth", type=int, default=4)
+    run.add_argument("--zh-ratio", type=float, default=0.5)
+    run.add_argument("--duplicate-rate", type=float, default=0.05)
+    run.add_argument("--webkit-ratio", type=float, default=0.3)
+    run.add_argument("--malformed-rate", type=float, default=0.01)
+    run.add_argument("--seed", type=int, default=42)
+
+    cmp = sub.add_parser("compare", help="对比两份 JSON 结果")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--tolerance", type=float, default=0.15)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, 'r', encoding='utf-8') as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        print(f"📊 [Bench] 回归: {len(regressions)}")
+        sys.exit(1 if regressions else 0)
+
+    synth_options = {
+        "max_depth": args.max_depth, "zh_ratio": args.zh_ratio, "duplicate_rate": args.duplicate_rate,
+        "webkit_ratio": args.webkit_ratio, "malformed_rate": args.malformed_rate, "seed": args.seed,
+    }
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    only = [c for c in args.cases.split(",") if c] or None
+    report = run_suite(sizes, args.repeat, not args.no_endpoint, only, synth_options)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 [Bench] 结果已写入 {args.out}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        print(f"📊 [Bench] 回归: {len(regressions)}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import codec
+
+
+class ResultCache:
+    """
+    [炼金组件]: 结果缓存 (内容寻址)
+    键 = 原料字节摘要 + 流水线版本 + 参数；值 = 序列化后的响应 JSON。
+    - 内存层：LRU，按序列化字节数淘汰
+    - 磁盘层 (可选)：本地目录，重启后仍然有效，同样按总字节数淘汰最旧条目
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._disk_index: Dict[str, int] = {}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            # 按修改时间排序重建磁盘索引，最旧的最先淘汰
+            files = [f for f in os.listdir(disk_dir) if f.endswith('.json')]
+            files.sort(key=lambda f: os.path.getmtime(os.path.join(disk_dir, f)))
+            for name in files:
+                self._disk_index[name[:-5]] = os.path.getsize(os.path.join(disk_dir, name))
+
+    @staticmethod
+    def make_key(content_digest: str, version: str, params: Dict[str, Any]) -> str:
+        """由原料摘要、流水线版本与参数派生缓存键"""
+        material = json.dumps([content_digest, version, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _remember(self, key: str, blob: bytes) -> None:
+        """写入内存层 (调用方持有锁)"""
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        if len(blob) > self.max_bytes:
+            return
+        self._entries[key] = blob
+        self._size += len(blob)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self._stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return codec.loads(blob)
+
+            if self.disk_dir and key in self._disk_index:
+                try:
+                    with open(self._disk_path(key), 'rb') as f:
+                        blob = f.read()
+                except OSError:
+                    self._disk_index.pop(key, None)
+                else:
+                    self._stats["disk_hits"] += 1
+                    self._remember(key, blob)
+                    return codec.loads(blob)
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, payload: Dict[str, Any]) -> None:
+        blob = codec.dumps(payload)
+        with self._lock:
+            self._remember(key, blob)
+            if self.disk_dir:
+                self._write_disk(key, blob)
+
+    def _write_disk(self, key: str, blob: bytes) -> None:
+        """原子写入磁盘层，并按总字节数淘汰最旧条目 (调用方持有锁)"""
+        if len(blob) > self.disk_max_bytes:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            return
+        self._disk_index.pop(key, None)
+        self._disk_index[key] = len(blob)
+
+        while sum(self._disk_index.values()) > self.disk_max_bytes:
+            oldest = next(iter(self._disk_index))
+            self._disk_index.pop(oldest)
+            try:
+                os.remove(self._disk_path(oldest))
+            except OSError:
+                pass
+
+    def purge(self) -> Dict[str, int]:
+        """清空两层缓存，返回清除的条目数"""
+        with self._lock:
+            removed = {"memory": len(self._entries), "disk": len(self._disk_index)}
+            self._entries.clear()
+            self._size = 0
+            for key in list(self._disk_index):
+                try:
+                    os.remove(self._disk_path(key))
+                except OSError:
+                    pass
+            self._disk_index.clear()
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            return {
+                "memory": {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes},
+                "disk": {
+                    "enabled": bool(self.disk_dir),
+                    "dir": self.disk_dir,
+                    "entries": len(self._disk_index),
+                    "bytes": sum(self._disk_index.values()),
+                    "max_bytes": self.disk_max_bytes,
+                },
+                **self._stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -1,17 +1,144 @@
+import codecs
 import os
+import re
 import sys
-from datetime import datetime
-from bs4 import BeautifulSoup, Tag
-from typing import List, Dict, Optional, Any
+from html.parser import HTMLParser
+from typing import List, Dict, Optional, Any, Callable, Tuple, TYPE_CHECKING
+
+from signals import SignalTable, SignalTableBuilder, parse_epoch, format_epoch
+from telemetry import instrumented
+
+if TYPE_CHECKING:
+    # BeautifulSoup 只在旧熔炼路径 (engine="soup") 中使用，运行时按需导入
+    from bs4 import Tag
+
+# 编码声明探针：Netscape 导出文件通常在头部携带 <META ... charset=UTF-8>
+_CHARSET_PATTERN = re.compile(rb'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+_BOMS = (
+    (b'\xef\xbb\xbf', 'utf-8'),
+    (b'\xff\xfe', 'utf-16-le'),
+    (b'\xfe\xff', 'utf-16-be'),
+)
+
+
+def sniff_encoding(head: bytes) -> str:
+    """
+    光谱预判 (Encoding Sniffing)
+    只检视文件头部：BOM 优先，其次是 META 声明，最后降级为 UTF-8。
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    match = _CHARSET_PATTERN.search(head[:4096])
+    if match:
+        candidate = match.group(1).decode('ascii', 'ignore')
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+class NetscapeStreamParser(HTMLParser):
+    """
+    [炼金组件]: 流式书签解析器
+    单遍事件驱动：H3/H1 记录待定标题，DL 入栈、/DL 出栈，
+    因此每个 A 标签出现时语境路径已经就绪，无需回溯 DOM 树。
+    语境路径以元组保存，同一文件夹下的链接共享同一个对象；forge 决定析出物的形态 (信号字典或信号行)。
+    """
+
+    # 遇到这些标签时，仍未闭合的 A 标签视为已结束 (容错恢复)
+    _LINK_BREAKERS = {'a', 'dt', 'dd', 'dl', 'h1', 'h3'}
+
+    def __init__(self, noise_roots: set, forge: Callable[[Dict[str, Optional[str]], str, Tuple[str, ...]], Any]):
+        super().__init__(convert_charrefs=True)
+        self.noise_roots = noise_roots
+        self.forge = forge
+        self.signals: List[Any] = []
+
+        self._folders: List[Optional[str]] = []
+        self._context: Tuple[str, ...] = ()
+        self._pending_header: Optional[str] = None
+        self._header_parts: Optional[List[str]] = None
+        self._link_attrs: Optional[Dict[str, Optional[str]]] = None
+        self._link_parts: List[str] = []
+
+    def _refresh_context(self) -> None:
+        self._context = tuple(name for name in self._folders if name and name not in self.noise_roots)
+
+    def _close_header(self) -> None:
+        if self._header_parts is not None:
+            self._pending_header = "".join(self._header_parts).strip()
+            self._header_parts = None
+
+    def _close_link(self) -> None:
+        if self._link_attrs is None:
+            return
+        signal = self.forge(self._link_attrs, "".join(self._link_parts), self._context)
+        if signal is not None:
+            self.signals.append(signal)
+        self._link_attrs = None
+        self._link_parts = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in self._LINK_BREAKERS:
+            self._close_link()
+
+        if tag == 'a':
+            self._link_attrs = dict(attrs)
+        elif tag in ('h3', 'h1'):
+            self._header_parts = []
+        elif tag == 'dl':
+            self._close_header()
+            self._folders.append(self._pending_header)
+            self._pending_header = None
+            self._refresh_context()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == 'a':
+            self._close_link()
+        elif tag in ('h3', 'h1'):
+            self._close_header()
+        elif tag == 'dl':
+            self._close_link()
+            # 多余的 </DL> 直接忽略，避免语境栈下溢
+            if self._folders:
+                self._folders.pop()
+                self._refresh_context()
+
+    def handle_data(self, data: str) -> None:
+        if self._link_attrs is not None:
+            self._link_parts.append(data)
+        elif self._header_parts is not None:
+            self._header_parts.append(data)
+
+    def pop_signals(self) -> List[Any]:
+        """取走已析出的信号 (增量消费)"""
+        ready, self.signals = self.signals, []
+        return ready
+
+    def close(self) -> None:
+        super().close()
+        # 文件末尾仍未闭合的 A 标签同样析出
+        self._close_link()
 
 class AthanorPurifier:
     """
     [炼金组件]: 物质净化器 (V3 终极版)
-    驱动引擎: lxml (High-Performance Parser)
+    驱动引擎: 标准库 html.parser 事件流 (NetscapeStreamParser)；BeautifulSoup 只在对照路径中按需导入
     使命: 零重排、零噪音、全自动编码感应，实现书签信号的绝对萃取。
+
+    engine:
+      - "stream": 单遍流式解析 (默认)，语境路径随解析实时维护
+      - "soup":   BeautifulSoup 全树解析 + 父节点攀爬 (旧路径，用于对照)
     """
 
-    def __init__(self):
+    ENGINES = ("stream", "soup")
+
+    def __init__(self, engine: str = "stream"):
+        if engine not in self.ENGINES:
+            raise ValueError(f"未知的熔炼引擎: {engine}")
+        self.engine = engine
         # 排除无意义的根节点 (Noise Reduction)
         self.noise_roots = {
             'Bookmarks', '书签', '书签栏', '收藏夹', 'Bookmarks Bar', 
@@ -24,19 +151,12 @@ class AthanorPurifier:
         时间戳定标 (Temporal Calibration)
         阈值定位于 10^12，完美兼容 Webkit (微秒) 与 Unix (秒)。
         """
-        if not ts_str:
-            return ""
-        try:
-            ts = int(ts_str)
-            # 修正逻辑：Webkit 时间戳通常为 17 位，Unix 为 10 位
-            if ts > 10**12:
-                ts = ts / 1_000_000
-            return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
-        except (ValueError, TypeError, OverflowError):
-            return ""
-
-    def _extract_context(self, link: Tag) -> List[str]:
+        return format_epoch(parse_epoch(ts_str))
+
+    def _extract_context(self, link: "Tag") -> List[str]:
         """逆流而上：从 A 标签攀爬 DOM 树，提取知识语境"""
+        from bs4 import Tag
+
         context: List[str] = []
         if not isinstance(link, Tag):
             return context
@@ -51,10 +171,77 @@ class AthanorPurifier:
                         context.insert(0, name)
         return context
 
-    def smelt(self, raw_content: bytes) -> List[Dict[str, Any]]:
+    def _forge_row(self, attrs: Dict[str, Any], text: str, context) -> Optional[Tuple]:
+        """将一个 A 标签的属性与文本锻造为信号行 (标题, URL, 语境, Unix 秒, 标签)，无效链接返回 None"""
+        url = attrs.get('href', '')
+        # 过滤干扰协议与空物质
+        if not isinstance(url, str) or not url or url.startswith(('javascript:', 'place:', 'data:')):
+            return None
+
+        # 提取浏览器原生标签 (如果存在)
+        # 兼容 TAGS (大写) 和 tags (小写)
+        raw_tags = attrs.get('tags') or attrs.get('TAGS')
+        tags = [t.strip() for t in raw_tags.split(',')] if isinstance(raw_tags, str) else []
+        return text.strip() or "Untitled Signal", url, context, parse_epoch(str(attrs.get('add_date') or '')), tags
+
+    def _forge_signal(self, attrs: Dict[str, Any], text: str, context) -> Optional[Dict[str, Any]]:
+        """将一个 A 标签的属性与文本锻造为信号切片，无效链接返回 None"""
+        row = self._forge_row(attrs, text, context)
+        if row is None:
+            return None
+        title, url, context, epoch, tags = row
+        return {
+            "title": title,
+            "url": url,
+            "context": list(context),
+            "timestamp": format_epoch(epoch),
+            "tags": tags
+        }
+
+    def open_stream(self, columnar: bool = False) -> NetscapeStreamParser:
+        """
+        创建一个流式解析器，调用方自行 feed 文本片段。
+        columnar=True 时析出信号行元组 (供 SignalTableBuilder 追加)，否则析出信号字典。
+        """
+        return NetscapeStreamParser(self.noise_roots, self._forge_row if columnar else self._forge_signal)
+
+    @instrumented("smelt")
+    def smelt(self, raw_content: bytes, engine: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         核心熔炼逻辑：高性能字节流处理。
         """
+        engine = engine or self.engine
+        if engine == "soup":
+            return self._smelt_soup(raw_content)
+        if engine != "stream":
+            raise ValueError(f"未知的熔炼引擎: {engine}")
+
+        return self._smelt_stream(raw_content, columnar=False)
+
+    @instrumented("smelt")
+    def smelt_table(self, raw_content: bytes) -> SignalTable:
+        """
+        列式熔炼：单遍流式解析，直接产出信号表 (数值时间戳 + 驻留的语境与域名)。
+        分析流水线使用该入口；信号字典只在 API 边界按需还原。
+        """
+        builder = SignalTableBuilder()
+        for row in self._smelt_stream(raw_content, columnar=True):
+            builder.append(*row)
+        return builder.build()
+
+    def _smelt_stream(self, raw_content: bytes, columnar: bool) -> List[Any]:
+        encoding = sniff_encoding(raw_content[:4096])
+        print(f"📡  [Spectral Analysis] 探测到物质编码: {encoding}")
+
+        parser = self.open_stream(columnar)
+        parser.feed(raw_content.decode(encoding, errors='replace'))
+        parser.close()
+        return parser.pop_signals()
+
+    def _smelt_soup(self, raw_content: bytes) -> List[Dict[str, Any]]:
+        """旧熔炼路径：BeautifulSoup 全树解析，保留用于输出对照"""
+        from bs4 import BeautifulSoup, Tag
+
         # ⚡ 引擎切换：使用 'html.parser' 替代 'lxml'
         # 书签文件 (Netscape 格式) 往往嵌套极深且不规范，lxml 过于严格会导致数据截断。
         # html.parser 虽然慢一点，但容错性极强，能保证数据的完整性 (High Recall)。
@@ -71,32 +258,43 @@ class AthanorPurifier:
             if not isinstance(link, Tag):
                 continue
 
-            url = link.get('href', '')
-            # 过滤干扰协议与空物质
-            if not isinstance(url, str) or not url or url.startswith(('javascript:', 'place:', 'data:')):
-                continue
-
-            title = link.get_text().strip() or "Untitled Signal"
-            
             # 萃取核心信号切片
-            signal = {
-                "title": title,
-                "url": url,
-                "context": self._extract_context(link),
-                "timestamp": self._normalize_timestamp(str(link.get('add_date', ''))),
-                "tags": []
-            }
-            
-            # 提取浏览器原生标签 (如果存在)
-            # 兼容 TAGS (大写) 和 tags (小写)
-            raw_tags = link.get('tags') or link.get('TAGS')
-            if isinstance(raw_tags, str):
-                signal["tags"] = [t.strip() for t in raw_tags.split(',')]
-
-            purified_data.append(signal)
+            signal = self._forge_signal(link.attrs, link.get_text(), self._extract_context(link))
+            if signal is not None:
+                purified_data.append(signal)
 
         return purified_data
 
+    def diff_engines(self, raw_content: bytes) -> Dict[str, Any]:
+        """
+        [对照实验]: 用两种引擎分别熔炼同一份原料，列出信号差异。
+        以 URL 为键比较 title / context / timestamp / tags。
+        """
+        stream = self.smelt(raw_content, engine="stream")
+        soup = self.smelt(raw_content, engine="soup")
+
+        def keyed(signals: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+            table: Dict[str, List[Dict[str, Any]]] = {}
+            for s in signals:
+                table.setdefault(s['url'], []).append(s)
+            return table
+
+        stream_map, soup_map = keyed(stream), keyed(soup)
+        mismatches = []
+        for url in stream_map.keys() & soup_map.keys():
+            for a, b in zip(stream_map[url], soup_map[url]):
+                fields = [f for f in ('title', 'context', 'timestamp', 'tags') if a[f] != b[f]]
+                if fields:
+                    mismatches.append({"url": url, "fields": fields, "stream": a, "soup": b})
+
+        return {
+            "stream_count": len(stream),
+            "soup_count": len(soup),
+            "only_stream": sorted(stream_map.keys() - soup_map.keys()),
+            "only_soup": sorted(soup_map.keys() - stream_map.keys()),
+            "mismatches": mismatches,
+        }
+
     def process_file(self, input_path: str) -> List[Dict[str, Any]]:
         """
         [真理入口]: 验证载体并执行二进制熔炼。
@@ -118,8 +316,21 @@ class AthanorPurifier:
 def main():
     # 环境感知路径：支持环境变量注入，否则降级至默认测试路径
     target_path = os.getenv("ATHANOR_INPUT", "data/bookmarks_raw.html")
-    
-    purifier = AthanorPurifier()
+    # ATHANOR_ENGINE=stream|soup 选择引擎；=diff 时对照两种引擎的输出
+    engine = os.getenv("ATHANOR_ENGINE", "stream")
+
+    if engine == "diff":
+        purifier = AthanorPurifier()
+        with open(target_path, 'rb') as f:
+            report = purifier.diff_engines(f.read())
+        print(f"🔬  [Diff] stream={report['stream_count']} soup={report['soup_count']} "
+              f"仅stream={len(report['only_stream'])} 仅soup={len(report['only_soup'])} "
+              f"字段差异={len(report['mismatches'])}")
+        for m in report['mismatches'][:10]:
+            print(f"    {m['url'][:60]} -> {', '.join(m['fields'])}")
+        return
+
+    purifier = AthanorPurifier(engine=engine)
     
     try:
         results = purifier.process_file(target_path)
@@ -0,0 +1,20 @@
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # 可选组件：缺少 orjson 时退回标准库 json (输出一致，只是更慢)
+    orjson = None
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """序列化为 UTF-8 JSON 字节 (非 ASCII 字符不转义)；default 处理无法直接序列化的对象"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default).encode('utf-8')
+
+
+def loads(blob: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(blob)
+    return json.loads(blob)
@@ -0,0 +1,373 @@
+import os
+import sqlite3
+import tempfile
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import codec
+from analyzer import KnowledgeCrystallizer, TokenizedCorpus, SignalStatistics
+from signals import SignalTable, NO_TIMESTAMP, format_epoch
+from settings import home_path
+from telemetry import instrumented
+
+try:
+    import fcntl
+except ImportError:  # Windows：以 msvcrt 的字节锁代替 flock
+    fcntl = None
+    import msvcrt
+
+# 状态格式版本：结构变化时递增，旧状态自动作废并触发全量重建
+STATE_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    epoch INTEGER,
+    tags TEXT NOT NULL,
+    context TEXT NOT NULL,
+    title_tokens TEXT NOT NULL,
+    tag_tokens TEXT NOT NULL,
+    label INTEGER NOT NULL
+);
+"""
+
+# 内容键：(URL, 标题, Unix 秒, 标签)；只有语境不同的两条信号视为同一条被"移动"
+ContentKey = Tuple[str, str, Optional[int], Tuple[str, ...]]
+
+
+def profile_dir(profile: str) -> str:
+    """增量档案的本地目录 (ATHANOR_HOME/incremental/<profile>)"""
+    return home_path("incremental", profile)
+
+
+@contextmanager
+def profile_lock(path: str):
+    """
+    档案的独占文件锁 (跨进程)：同一档案的 读取 -> 修补 -> 写回 整体串行，
+    并发请求或多个 worker 不会读到同一版状态后互相覆盖。
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK 重试约 10 秒后放弃，继续等待
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def diff_signals(previous: Sequence[ContentKey], current: Sequence[ContentKey]) -> Tuple[List[Optional[int]], List[int]]:
+    """
+    按 URL 对齐两次导出 (参数为各条信号的内容键，URL 在首位)。同一 URL 多次收藏时，
+    先配对内容完全一致的条目，剩余的再按出现顺序一一配对。
+    返回: current 中每条信号对应的旧下标 (新增为 None)，以及被移除的旧下标。
+    """
+    exact: Dict[ContentKey, deque] = defaultdict(deque)
+    for i, key in enumerate(previous):
+        exact[key].append(i)
+
+    # 第一轮：内容完全一致
+    taken = set()
+    matches: List[Optional[int]] = []
+    for key in current:
+        queue = exact.get(key)
+        if queue:
+            i = queue.popleft()
+            taken.add(i)
+            matches.append(i)
+        else:
+            matches.append(None)
+
+    # 第二轮：同一 URL 的剩余条目按顺序配对 (内容有改动)
+    by_url: Dict[str, deque] = defaultdict(deque)
+    for i, key in enumerate(previous):
+        if i not in taken:
+            by_url[key[0]].append(i)
+    for j, key in enumerate(current):
+        if matches[j] is None:
+            queue = by_url.get(key[0])
+            if queue:
+                matches[j] = queue.popleft()
+
+    removed = [i for queue in by_url.values() for i in queue]
+    return matches, sorted(removed)
+
+
+def _stats_record(key: ContentKey) -> Dict[str, Any]:
+    """统计账本吸收/撤销一条信号所需的字段"""
+    url, title, epoch, _ = key
+    return {"title": title, "url": url, "timestamp": format_epoch(epoch)}
+
+
+def _json(value: Any) -> str:
+    return codec.dumps(value).decode('utf-8')
+
+
+class IncrementalLedger:
+    """
+    [炼金组件]: 增量账本 (仅限本地)
+    持久化上一次的信号集、分词结果、统计计数、星群标签与已拟合的模型 (词表/IDF + 重心)。
+    新导出到来时按 URL 求差集：只为新增/改动的标题分词，把它们分配到既有星群，
+    并就地修补计数器；累计漂移超过阈值 (或星群数量变化) 时才全量重新拟合。
+    信号逐行存放在档案目录的 SQLite 文件中，写回时只增删改变化的行：导出未变时不写任何信号行，
+    模型也只在重新拟合后落盘。整个对齐过程持有档案的文件锁。
+    """
+
+    def __init__(self, state_dir: str, drift_threshold: Optional[float] = None):
+        self.state_dir = state_dir
+        self.drift_threshold = drift_threshold if drift_threshold is not None else float(
+            os.getenv("ATHANOR_DRIFT_THRESHOLD", "0.2")
+        )
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.state_dir, "state.sqlite3")
+
+    @property
+    def _model_path(self) -> str:
+        return os.path.join(self.state_dir, "model.joblib")
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.state_dir, ".lock")
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.state_dir, exist_ok=True)
+        conn = sqlite3.connect(self._state_path)
+        try:
+            conn.executescript(_SCHEMA)
+        except sqlite3.DatabaseError:
+            # 状态文件损坏时丢弃，随后全量重建
+            conn.close()
+            os.remove(self._state_path)
+            conn = sqlite3.connect(self._state_path)
+            conn.executescript(_SCHEMA)
+        return conn
+
+    def load(self, conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+        """读取上一次的状态；不存在、版本过旧或损坏时返回 None (随后全量重建)"""
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+        if meta.get("version") != str(STATE_VERSION):
+            return None
+        ids: List[int] = []
+        keys: List[ContentKey] = []
+        contexts: List[Tuple[str, ...]] = []
+        title_tokens: List[List[str]] = []
+        tag_tokens: List[List[str]] = []
+        labels: List[int] = []
+        rows = conn.execute(
+            "SELECT id, url, title, epoch, tags, context, title_tokens, tag_tokens, label FROM signals ORDER BY id"
+        )
+        for row_id, url, title, epoch, tags, context, title_words, tag_words, label in rows:
+            ids.append(row_id)
+            keys.append((url, title, epoch, tuple(codec.loads(tags))))
+            contexts.append(tuple(codec.loads(context)))
+            title_tokens.append(codec.loads(title_words))
+            tag_tokens.append(codec.loads(tag_words))
+            labels.append(label)
+
+        state = {
+            "ids": ids, "keys": keys, "contexts": contexts, "title_tokens": title_tokens, "tag_tokens": tag_tokens,
+            "labels": labels, "stats": codec.loads(meta["stats"]), "drift": float(meta["drift"]), "model": None,
+        }
+        if os.path.isfile(self._model_path):
+            import joblib
+            try:
+                state["model"] = joblib.load(self._model_path)
+            except Exception:
+                # 模型损坏时丢弃，下一步会触发全量拟合
+                state["model"] = None
+        return state
+
+    def _atomic_write(self, path: str, writer) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save_model(self, model) -> None:
+        if model is not None:
+            import joblib
+            self._atomic_write(self._model_path, lambda f: joblib.dump(model, f))
+        elif os.path.exists(self._model_path):
+            os.remove(self._model_path)
+
+    @instrumented("incremental_reconcile")
+    def reconcile(self, signals: SignalTable, crystallizer: KnowledgeCrystallizer,
+                  n_clusters: int, engine: str = "auto", preview: Optional[int] = 10, with_indices: bool = False):
+        """
+        [增量熔炼]: 将新导出与上一次状态对齐，产出与全量流水线等价的中间结果。
+        返回 (corpus, stats, crystals, report)；preview / with_indices 同 build_crystals。
+        """
+        signals = SignalTable.coerce(signals)
+        with profile_lock(self._lock_path):
+            conn = self._connect()
+            try:
+                return self._reconcile(conn, signals, crystallizer, n_clusters, engine, preview, with_indices)
+            finally:
+                conn.close()
+
+    def _reconcile(self, conn: sqlite3.Connection, signals: SignalTable, crystallizer: KnowledgeCrystallizer,
+                   n_clusters: int, engine: str, preview: Optional[int], with_indices: bool):
+        state = self.load(conn)
+        previous: List[ContentKey] = state["keys"] if state else []
+        epochs = [None if e == NO_TIMESTAMP else e for e in signals.epochs.tolist()]
+        keys: List[ContentKey] = list(zip(signals.urls, signals.titles, epochs, signals.tags))
+        contexts = [signals.contexts[c] for c in signals.context_ids.tolist()]
+        matches, removed = diff_signals(previous, keys)
+
+        # 1. 分类：未变 / 移动 (仅语境变化) / 改动 / 新增
+        title_tokens: List[List[str]] = []
+        tag_tokens: List[List[str]] = []
+        fresh: List[int] = []  # 需要重新分词与分配星群的信号下标
+        changed: List[int] = []  # 改动过内容的旧下标 (需从计数中撤销)
+        moved = 0
+        for j, i in enumerate(matches):
+            if i is not None and previous[i] == keys[j]:
+                if state["contexts"][i] != contexts[j]:
+                    moved += 1
+                title_tokens.append(state["title_tokens"][i])
+                tag_tokens.append(state["tag_tokens"][i])
+                continue
+
+            if i is not None:
+                changed.append(i)
+            fresh.append(j)
+            title_tokens.append(None)
+            tag_tokens.append(None)
+
+        # 新增/改动的信号整批分词 (量大时由分词进程并行完成)
+        fresh_tags = [signals.tags[j] for j in fresh]
+        segments = crystallizer.segment_batch([signals.titles[j] for j in fresh] +
+                                              [" ".join(tags) for tags in fresh_tags if tags])
+        tag_segments = iter(segments[len(fresh):])
+        for j, words, tags in zip(fresh, segments, fresh_tags):
+            title_tokens[j] = list(words)
+            tag_tokens[j] = list(next(tag_segments)) if tags else []
+
+        added = len(fresh) - len(changed)
+        delta = added + len(removed) + len(changed)
+        drift = (state["drift"] if state else 0.0) + delta / max(len(previous), 1)
+
+        # 2. 修补统计账本：先撤销被移除/改动的旧信号，再吸收新内容，最后按全量统计的顺序重排
+        if state:
+            stats = SignalStatistics.from_dict(crystallizer.rules.radar_matcher, state["stats"])
+        else:
+            stats = SignalStatistics(crystallizer.rules.radar_matcher)
+        for i in removed + changed:
+            stats.absorb(_stats_record(previous[i]), weight=-1)
+        for j in fresh:
+            stats.absorb(_stats_record(keys[j]))
+        stats.prune()
+        stats.align(signals)
+        # 词频按全量路径的方式重新累加 (C 层计数，不涉及分词)，并列词的顺序与全量结果一致
+        corpus = TokenizedCorpus(signals, title_tokens, tag_tokens)
+
+        # 3. 星群：漂移未超阈值时沿用既有模型，只为新信号分配最近重心
+        model = state["model"] if state else None
+        refit = (
+            model is None
+            or model.n_clusters != n_clusters
+            or drift > self.drift_threshold
+        )
+        valid_indices, documents = crystallizer.select_documents(corpus)
+        if refit:
+            mode = "initial" if state is None else "refit"
+            fitted = crystallizer.fit_clusters(signals, corpus, engine, n_clusters)
+            if fitted is None:
+                model, labels = None, {}
+            else:
+                model, indices, fitted_labels = fitted
+                labels = {i: int(label) for i, label in zip(indices, fitted_labels)}
+            drift = 0.0
+        else:
+            mode = "patch"
+            labels = {}
+            fresh_lookup = set(fresh)
+            for j, i in enumerate(matches):
+                if i is not None and j not in fresh_lookup and state["labels"][i] >= 0:
+                    labels[j] = state["labels"][i]
+            pending = [j for j in valid_indices if j not in labels]
+            position = {j: k for k, j in enumerate(valid_indices)}
+            assigned = model.assign([documents[position[j]] for j in pending], crystallizer.chunk_size)
+            for j, label in zip(pending, assigned):
+                labels[j] = int(label)
+
+        crystals = []
+        if model is not None:
+            clustered = [j for j in valid_indices if j in labels]
+            crystals = crystallizer.build_crystals(signals, clustered, [labels[j] for j in clustered], model, preview,
+                                                   with_indices)
+
+        self._save(conn, state, signals, keys, contexts, matches, removed, fresh, title_tokens, tag_tokens, labels,
+                   stats if delta or state is None else None, drift)
+        if refit:
+            self.save_model(model)
+
+        report = {
+            "模式": mode,
+            "新增": added,
+            "移除": len(removed),
+            "改动": len(changed),
+            "移动": moved,
+            "重新分词": len(fresh),
+            "累计漂移": round(drift, 4),
+        }
+        return corpus, stats, crystals, report
+
+    def _save(self, conn: sqlite3.Connection, state: Optional[Dict[str, Any]], signals: SignalTable,
+              keys: List[ContentKey], contexts: List[Tuple[str, ...]], matches: List[Optional[int]],
+              removed: List[int], fresh: List[int], title_tokens: List[List[str]], tag_tokens: List[List[str]],
+              labels: Dict[int, int], stats: Optional[SignalStatistics], drift: float) -> None:
+        """
+        在一个事务内写回变化：删除移除的行，改动/新增的行整行写入，
+        未改动的行只在语境或星群标签变化时更新这两列；stats 为 None 表示计数未变，不重写 (漂移同理)。
+        """
+        fresh_lookup = set(fresh)
+        removed_ids = [(state["ids"][i],) for i in removed] if state else []
+        upserts, updates = [], []
+        for j, i in enumerate(matches):
+            label = labels.get(j, -1)
+            if j in fresh_lookup:
+                url, title, epoch, tags = keys[j]
+                upserts.append((state["ids"][i] if i is not None else None, url, title, epoch, _json(list(tags)),
+                                _json(list(contexts[j])), _json(title_tokens[j]), _json(tag_tokens[j]), label))
+            elif state["contexts"][i] != contexts[j] or state["labels"][i] != label:
+                updates.append((_json(list(contexts[j])), label, state["ids"][i]))
+
+        with conn:
+            if state is None:
+                conn.execute("DELETE FROM signals")
+            conn.executemany("DELETE FROM signals WHERE id = ?", removed_ids)
+            conn.executemany("UPDATE signals SET context = ?, label = ? WHERE id = ?", updates)
+            conn.executemany(
+                "INSERT OR REPLACE INTO signals (id, url, title, epoch, tags, context, title_tokens, tag_tokens, label)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", upserts,
+            )
+            meta = {}
+            if state is None or drift != state["drift"]:
+                meta.update(version=str(STATE_VERSION), drift=repr(drift))
+            if stats is not None:
+                meta["stats"] = _json(stats.to_dict())
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
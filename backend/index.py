@@ -0,0 +1,287 @@
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import date
+from typing import List, Dict, Any, Tuple, Callable, Sequence
+
+import codec
+from signals import SignalTable, SignalTableBuilder, NO_TIMESTAMP, format_epoch
+from settings import home_path
+from telemetry import stage
+
+# 索引格式版本：表结构变化时递增，旧索引需重新熔炼生成
+INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE bookmarks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    context TEXT NOT NULL,
+    contexts TEXT,
+    epoch INTEGER,
+    tags TEXT NOT NULL,
+    title_tokens TEXT NOT NULL,
+    tag_tokens TEXT NOT NULL,
+    cluster INTEGER NOT NULL
+);
+CREATE TABLE folders (path TEXT NOT NULL, bookmark_id INTEGER NOT NULL);
+CREATE TABLE clusters (id INTEGER PRIMARY KEY, topic TEXT NOT NULL, keywords TEXT NOT NULL, size INTEGER NOT NULL);
+CREATE VIRTUAL TABLE bookmark_fts USING fts5(title_tokens, tag_tokens, content='bookmarks', content_rowid='id');
+"""
+
+# 数据写完后再建二级索引，比逐行维护快得多
+_INDEXES = """
+CREATE INDEX idx_bookmarks_domain ON bookmarks(domain);
+CREATE INDEX idx_bookmarks_epoch ON bookmarks(epoch);
+CREATE INDEX idx_bookmarks_cluster ON bookmarks(cluster);
+CREATE INDEX idx_folders_path ON folders(path, bookmark_id);
+"""
+
+_COLUMNS = "id, title, url, domain, context, contexts, epoch, tags, cluster"
+
+
+class IndexMissing(LookupError):
+    """索引不存在或版本过旧 (需要带 index 参数重新熔炼)"""
+
+
+def index_path(name: str) -> str:
+    """本地索引文件 (ATHANOR_HOME/index/<name>.sqlite3)"""
+    return home_path("index", f"{name}.sqlite3")
+
+
+def folder_path(context: Sequence[str]) -> str:
+    """语境 (文件夹层级) -> 以 / 连接的路径，文件夹前缀查询在该字符串上做范围匹配"""
+    return "/".join(context)
+
+
+def parse_time_bound(text: str, upper: bool = False) -> int:
+    """
+    时间范围的端点 (本地时间) -> Unix 秒：支持 YYYY / YYYY-MM / YYYY-MM-DD，无法识别或越界时抛出 ValueError。
+    upper=True 时返回下一个周期的起点，使 until=2023 包含 2023 年全年。
+    """
+    parts = [int(p) for p in text.split("-")]
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"无法识别的日期: {text}")
+    year, month, day = (parts + [1, 1])[:3]
+    date(year, month, day)  # 月份与日期越界 (如 2023-13、2023-02-30) 时抛出 ValueError，不交给 mktime 规范化
+    if upper:
+        if len(parts) == 1:
+            year += 1
+        elif len(parts) == 2:
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        else:
+            day += 1  # mktime 会把溢出的日期规范化到下个月
+    return int(time.mktime((year, month, day, 0, 0, 0, 0, 0, -1)))
+
+
+def match_expression(keyword: str, segment: Callable[[str], Sequence[str]]) -> str:
+    """
+    关键词 -> FTS5 查询式：按空白拆成多个词，每个词用建索引时的分词器切分，所有词元以前缀匹配并取交集。
+    例如 "rust 异步编程" -> "rust"* AND "异步"* AND "编程"*；切分后为空 (如停用词) 时按原词匹配。
+    """
+    terms = [t for word in keyword.split() for t in (list(segment(word)) or [word])]
+    return " AND ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+
+class BookmarkIndex:
+    """
+    [炼金组件]: 本地书签索引 (可选，仅限本地)
+    一次熔炼的信号 (去重之后)、分词结果与星群标签落盘为单个 SQLite 文件：
+    - bookmark_fts：标题/标签词元的 FTS5 全文索引 (外部内容表，不重复存储)
+    - folders：每条书签的全部文件夹路径，前缀查询走 (path, bookmark_id) 索引的范围扫描
+    - domain / epoch / cluster 上各有一个 B 树索引
+    查询只读打开，不经过 HTML 解析与分词；子集分析直接复用已存的词元。
+    索引整体重建后原子替换，查询方始终看到完整的一版。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    # --- 构建 ---
+    def build(self, signals: SignalTable, title_tokens: List[List[str]], tag_tokens: List[List[str]],
+              labels: Sequence[int], crystals: List[Dict[str, Any]]) -> None:
+        """以本次熔炼的结果重建索引；labels 为每条信号的星群 id (未参与聚类为 -1)"""
+        with stage("index_build", len(signals)):
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            os.close(fd)
+            try:
+                conn = sqlite3.connect(tmp_path)
+                try:
+                    self._populate(conn, signals, title_tokens, tag_tokens, labels, crystals)
+                finally:
+                    conn.close()
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def _populate(self, conn: sqlite3.Connection, signals: SignalTable, title_tokens: List[List[str]],
+                  tag_tokens: List[List[str]], labels: Sequence[int], crystals: List[Dict[str, Any]]) -> None:
+        # 新文件写完才对外可见，不需要日志与逐次落盘
+        conn.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + _SCHEMA)
+
+        contexts = [codec.dumps(list(c)).decode('utf-8') for c in signals.contexts]
+        paths = [folder_path(c) for c in signals.contexts]
+        context_ids = signals.context_ids.tolist()
+        epochs = signals.epochs.tolist()
+        rows = []
+        folders = []
+        for i, (title, url, tags) in enumerate(zip(signals.titles, signals.urls, signals.tags)):
+            own = signals.context_sets[i] if signals.context_sets is not None else (context_ids[i],)
+            rows.append((
+                i, title, url, signals.domains[signals.domain_ids[i]], contexts[context_ids[i]],
+                codec.dumps([list(signals.contexts[c]) for c in own]).decode('utf-8')
+                if signals.context_sets is not None else None,
+                None if epochs[i] == NO_TIMESTAMP else epochs[i],
+                codec.dumps(list(tags)).decode('utf-8'),
+                codec.dumps(title_tokens[i]).decode('utf-8'),
+                codec.dumps(tag_tokens[i]).decode('utf-8'),
+                int(labels[i]),
+            ))
+            folders.extend((paths[c], i) for c in own)
+
+        conn.executemany("INSERT INTO bookmarks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO folders VALUES (?, ?)", folders)
+        conn.executemany("INSERT INTO clusters VALUES (?, ?, ?, ?)", [
+            (c["cluster_id"], c["topic"], codec.dumps(c["keywords"]).decode('utf-8'), c["size"]) for c in crystals
+        ])
+        conn.execute("INSERT INTO bookmark_fts(bookmark_fts) VALUES ('rebuild')")
+        conn.executescript(_INDEXES)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("version", str(INDEX_VERSION)),
+            ("built_at", time.strftime('%Y-%m-%d %H:%M:%S')),
+            ("count", str(len(rows))),
+        ])
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+
+    # --- 查询 ---
+    def _connect(self) -> sqlite3.Connection:
+        if not os.path.isfile(self.path):
+            raise IndexMissing("索引不存在，请先带 index 参数熔炼一次。")
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or int(version[0]) != INDEX_VERSION:
+            conn.close()
+            raise IndexMissing("索引格式已过期，请重新熔炼。")
+        return conn
+
+    @staticmethod
+    def _where(filters: Dict[str, Any], segment: Callable[[str], Sequence[str]]) -> Tuple[str, list]:
+        """
+        查询条件 -> (WHERE 子句, 参数)。
+        q: 关键词 (全文)；domain: 域名；folder: 文件夹路径前缀 (按层级匹配，"A/B" 不匹配 "A/BC")；
+        since / until: Unix 秒 [since, until)；cluster: 星群 id。
+        """
+        clauses, args = [], []
+        if filters.get("q"):
+            clauses.append("id IN (SELECT rowid FROM bookmark_fts WHERE bookmark_fts MATCH ?)")
+            args.append(match_expression(filters["q"], segment))
+        if filters.get("domain"):
+            clauses.append("domain = ?")
+            args.append(filters["domain"])
+        if filters.get("folder"):
+            folder = filters["folder"].strip("/")
+            # "/" 之后的下一个字符是 "0"：[folder/, folder0) 恰好覆盖全部子文件夹
+            clauses.append("id IN (SELECT bookmark_id FROM folders WHERE path = ? OR (path >= ? AND path < ?))")
+            args.extend([folder, folder + "/", folder + "0"])
+        if filters.get("since") is not None:
+            clauses.append("epoch >= ?")
+            args.append(filters["since"])
+        if filters.get("until") is not None:
+            clauses.append("epoch < ?")
+            args.append(filters["until"])
+        if filters.get("cluster") is not None:
+            clauses.append("cluster = ?")
+            args.append(filters["cluster"])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    @staticmethod
+    def _record(row: tuple) -> Dict[str, Any]:
+        record = {
+            "id": row[0],
+            "title": row[1],
+            "url": row[2],
+            "domain": row[3],
+            "context": codec.loads(row[4]),
+            "timestamp": format_epoch(row[6]),
+            "tags": codec.loads(row[7]),
+            "cluster": row[8],
+        }
+        if row[5] is not None:
+            record["contexts"] = codec.loads(row[5])
+        return record
+
+    def search(self, filters: Dict[str, Any], segment: Callable[[str], Sequence[str]],
+               offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """按条件分页查询书签 (按原始顺序)，返回 {总数, 偏移, 条目}；segment 为建索引时使用的分词器"""
+        where, args = self._where(filters, segment)
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM bookmarks{where}", args).fetchone()[0]
+            rows = conn.execute(f"SELECT {_COLUMNS} FROM bookmarks{where} ORDER BY id LIMIT ? OFFSET ?",
+                                args + [limit, offset]).fetchall()
+        except sqlite3.OperationalError as e:
+            # FTS 查询式无法解析 (如只含标点)
+            raise ValueError(f"查询条件无效: {e}")
+        finally:
+            conn.close()
+        return {"总数": total, "偏移": offset, "条目": [self._record(r) for r in rows]}
+
+    def load(self, filters: Dict[str, Any], segment: Callable[[str], Sequence[str]]
+             ) -> Tuple[SignalTable, List[List[str]], List[List[str]]]:
+        """按条件取出子集：返回 (信号表, 标题词元, 标签词元)，供子集分析直接复用，不再解析与分词"""
+        where, args = self._where(filters, segment)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT title, url, context, epoch, tags, title_tokens, tag_tokens FROM bookmarks{where} ORDER BY id",
+                args,
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"查询条件无效: {e}")
+        finally:
+            conn.close()
+
+        builder = SignalTableBuilder()
+        title_tokens: List[List[str]] = []
+        tag_tokens: List[List[str]] = []
+        for title, url, context, epoch, tags, title_words, tag_words in rows:
+            builder.append(title, url, codec.loads(context), epoch, codec.loads(tags))
+            title_tokens.append(codec.loads(title_words))
+            tag_tokens.append(codec.loads(tag_words))
+        return builder.build(), title_tokens, tag_tokens
+
+    def summary(self) -> Dict[str, Any]:
+        """索引概况：构建时间、书签数量与星群列表"""
+        conn = self._connect()
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            clusters = [
+                {"cluster_id": cid, "topic": topic, "keywords": codec.loads(keywords), "size": size}
+                for cid, topic, keywords, size in conn.execute("SELECT id, topic, keywords, size FROM clusters ORDER BY size DESC")
+            ]
+        finally:
+            conn.close()
+        return {
+            "版本": int(meta["version"]),
+            "构建时间": meta["built_at"],
+            "书签数量": int(meta["count"]),
+            "文件字节": os.path.getsize(self.path),
+            "星群": clusters,
+        }
+
+    def remove(self) -> bool:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            return False
+        return True
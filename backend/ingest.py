@@ -0,0 +1,273 @@
+import codecs
+import hashlib
+import time
+import zlib
+from typing import Dict, Any, Optional, Union
+
+from cleaner import AthanorPurifier, sniff_encoding
+from signals import SignalTable, SignalTableBuilder
+
+# 原料支持的文件后缀 (未压缩 / gzip / zstd)
+ACCEPTED_SUFFIXES = (".html", ".htm", ".html.gz", ".htm.gz", ".html.zst", ".htm.zst", ".html.zstd")
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# 编码探测所需的头部字节数 (META 声明通常在前几百字节内)
+_SNIFF_BYTES = 4096
+
+
+class IngestError(ValueError):
+    """原料注入失败：超出尺寸上限、压缩流损坏或缺少解压组件"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+    def __reduce__(self):
+        # 从 worker 进程回传时保留状态码
+        return IngestError, (str(self), self.status_code)
+
+
+def accepts(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(ACCEPTED_SUFFIXES)
+
+
+class _GzipStream:
+    """
+    gzip 增量解压，单次输出受 max_length 约束，防止解压炸弹一次性撑爆内存。
+    多成员文件 (如 cat a.gz b.gz) 按成员依次解压；成员之后不是 gzip 数据、或结束时最后一个成员不完整，都视为损坏。
+    """
+
+    def __init__(self):
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data: bytes, budget: int) -> bytes:
+        out = []
+        produced = 0
+        while data:
+            if self._inflater.eof:
+                self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                piece = self._inflater.decompress(data, budget - produced + 1)
+            except zlib.error as e:
+                raise IngestError(f"gzip 数据损坏: {e}")
+            out.append(piece)
+            produced += len(piece)
+            if produced > budget:
+                break
+            data = self._inflater.unconsumed_tail or self._inflater.unused_data
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        if not self._inflater.eof:
+            raise IngestError("gzip 数据不完整 (文件可能被截断)。")
+        return self._inflater.flush()
+
+
+class _BudgetExceeded(Exception):
+    """解压输出已超出本次预算 (内部信号，由 _ZstdStream 捕获)"""
+
+
+class _BoundedSink:
+    """zstd 流式解压的输出端：累计输出字节，超出预算时抛出 _BudgetExceeded 打断解压"""
+
+    def __init__(self):
+        self.pieces = []
+        self.produced = 0
+        self.budget = 0
+
+    def write(self, data: bytes) -> int:
+        self.pieces.append(bytes(data))
+        self.produced += len(data)
+        if self.produced > self.budget:
+            raise _BudgetExceeded()
+        return len(data)
+
+    def drain(self) -> bytes:
+        out, self.pieces, self.produced = b"".join(self.pieces), [], 0
+        return out
+
+
+class _ZstdStream:
+    """
+    zstd 增量解压 (依赖可选的 zstandard 包)
+    经 stream_writer 以 _WRITE_SIZE 为单位向输出端写出，超出预算即中止，与 gzip 一样不会一次性展开解压炸弹。
+    """
+
+    _WRITE_SIZE = 64 * 1024
+
+    def __init__(self):
+        try:
+            import zstandard
+        except ImportError:
+            raise IngestError("解压 .zst 原料需要安装 zstandard (pip install zstandard)。", status_code=415)
+        self._sink = _BoundedSink()
+        self._writer = zstandard.ZstdDecompressor().stream_writer(
+            self._sink, write_size=self._WRITE_SIZE, closefd=False
+        )
+
+    def decompress(self, data: bytes, budget: int) -> bytes:
+        self._sink.budget = budget
+        try:
+            self._writer.write(data)
+        except _BudgetExceeded:
+            pass  # 返回的输出超出预算，由调用方按尺寸上限拒绝
+        except Exception as e:
+            raise IngestError(f"zstd 数据损坏: {e}")
+        return self._sink.drain()
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class SignalStream:
+    """
+    [炼金组件]: 流式注入器
+    上传分块 -> (gzip / zstd 解压) -> 增量解码 -> 流式解析器，边接收边析出信号。
+    尺寸上限在流入时即时检查 (压缩前与解压后各一次)，不会先缓冲整个文件。
+    同时对解压后的字节计算 sha256，供结果缓存按内容寻址。
+    """
+
+    def __init__(self, purifier: AthanorPurifier, max_bytes: int, filename: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.filename = filename or ""
+        self.received_bytes = 0
+        self.decoded_bytes = 0
+        self.encoding: Optional[str] = None
+
+        self._parser = purifier.open_stream(columnar=True)
+        self._hasher = hashlib.sha256()
+        self._inflater = None
+        self._compression_checked = False
+        self._head = b""
+        self._decoder = None
+        self._builder = SignalTableBuilder()
+        self._signals: Optional[SignalTable] = None
+        self._digest: Optional[str] = None
+        # 注入阶段的累计耗时 (分块分散在多次 feed 调用中)
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    @property
+    def signals(self) -> SignalTable:
+        """全部信号 (列式信号表)；注入结束前调用时先行关闭"""
+        return self.close()
+
+    @property
+    def signal_count(self) -> int:
+        return len(self._signals) if self._signals is not None else len(self._builder)
+
+    def hexdigest(self) -> str:
+        return self._digest if self._digest is not None else self._hasher.hexdigest()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """已结束的注入器可在进程间传递：只保留信号表、摘要与计数，丢弃解析器等中间状态"""
+        if self._signals is None:
+            raise ValueError("注入尚未结束，不能跨进程传递")
+        state = self.__dict__.copy()
+        for key in ("_parser", "_hasher", "_inflater", "_decoder", "_builder"):
+            state[key] = None
+        return state
+
+    def _detect_compression(self, data: bytes) -> None:
+        """按魔数 (其次按后缀) 判断压缩格式"""
+        name = self.filename.lower()
+        if data.startswith(_GZIP_MAGIC) or name.endswith(".gz"):
+            self._inflater = _GzipStream()
+        elif data.startswith(_ZSTD_MAGIC) or name.endswith((".zst", ".zstd")):
+            self._inflater = _ZstdStream()
+        self._compression_checked = True
+
+    def feed(self, chunk: bytes) -> int:
+        """注入一个上传分块，返回本次新析出的信号数量"""
+        if not chunk:
+            return 0
+        self.received_bytes += len(chunk)
+        if self.received_bytes > self.max_bytes:
+            raise IngestError(f"原料超过尺寸上限 ({self.max_bytes // (1024 * 1024)} MB)。", status_code=413)
+
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            if not self._compression_checked:
+                self._detect_compression(chunk)
+            if self._inflater is not None:
+                chunk = self._inflater.decompress(chunk, self.max_bytes - self.decoded_bytes)
+            return self._absorb(chunk)
+        finally:
+            self.wall_seconds += time.perf_counter() - wall_start
+            self.cpu_seconds += time.thread_time() - cpu_start
+
+    def _absorb(self, data: bytes, final: bool = False) -> int:
+        """解压后的字节：计数、摘要、解码并送入解析器"""
+        self.decoded_bytes += len(data)
+        if self.decoded_bytes > self.max_bytes:
+            raise IngestError(f"解压后的原料超过尺寸上限 ({self.max_bytes // (1024 * 1024)} MB)。", status_code=413)
+        self._hasher.update(data)
+
+        if self._decoder is None:
+            # 攒够头部字节后再探测编码
+            self._head += data
+            if len(self._head) < _SNIFF_BYTES and not final:
+                return 0
+            self.encoding = sniff_encoding(self._head)
+            self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+            data, self._head = self._head, b""
+
+        self._parser.feed(self._decoder.decode(data, final))
+        return self._collect()
+
+    def _collect(self) -> int:
+        fresh = self._parser.pop_signals()
+        for row in fresh:
+            self._builder.append(*row)
+        return len(fresh)
+
+    def close(self) -> SignalTable:
+        """结束注入：冲刷解压器、解码器与解析器，返回信号表 (可重复调用)"""
+        if self._signals is not None:
+            return self._signals
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        tail = self._inflater.flush() if self._inflater is not None else b""
+        self._absorb(tail, final=True)
+        self._parser.close()
+        self._collect()
+        self._signals = self._builder.build()
+        self._digest = self._hasher.hexdigest()
+        self.wall_seconds += time.perf_counter() - wall_start
+        self.cpu_seconds += time.thread_time() - cpu_start
+        return self._signals
+
+    def stage_record(self) -> Dict[str, Any]:
+        """注入阶段的性能记录 (格式同 telemetry.StageRecorder)；不含网络等待时间"""
+        return {
+            "阶段": "ingest",
+            "输入": self.decoded_bytes,
+            "输出": self.signal_count,
+            "墙钟ms": round(self.wall_seconds * 1000, 3),
+            "CPUms": round(self.cpu_seconds * 1000, 3),
+            "峰值内存增量KB": None,
+        }
+
+
+def read_export(purifier: AthanorPurifier, source: Union[str, bytes], max_bytes: int,
+                filename: Optional[str] = None, chunk_size: int = 256 * 1024) -> SignalStream:
+    """
+    一次性注入一份完整导出：source 为本地文件路径或已接收的字节。
+    与上传共用同一条流式管线 (压缩识别、尺寸上限、内容摘要)，返回已结束的注入器。
+    """
+    if isinstance(source, str):
+        stream = SignalStream(purifier, max_bytes, filename or source)
+        with open(source, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                stream.feed(chunk)
+    else:
+        stream = SignalStream(purifier, max_bytes, filename)
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            stream.feed(bytes(view[start:start + chunk_size]))
+    stream.close()
+    return stream
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+import codec
+
+# 任务状态
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "排队", "运行中", "完成", "失败", "已取消"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# SSE 心跳间隔：长时间没有新事件时发送注释行，防止代理断开空闲连接
+HEARTBEAT_SECONDS = 15.0
+
+
+class Job:
+    """
+    [炼金中间态]: 一次异步熔炼任务
+    保存进度事件流、已完成阶段的部分结果与最终结果；
+    channel / cancel_event 随任务投递给执行单元，用于回传进度与协作式取消。
+    """
+
+    def __init__(self, job_id: str, params: Dict[str, Any], channel, cancel_event):
+        self.id = job_id
+        self.params = params
+        self.channel = channel
+        self.cancel_event = cancel_event
+
+        self.state = QUEUED
+        self.events: List[Dict[str, Any]] = []
+        self.partial: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.nbytes = 0
+
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        """记录一条阶段事件；事件携带的部分结果并入 partial，供轮询与后来的订阅者读取"""
+        if self.state == QUEUED:
+            self.state = RUNNING
+        self.partial.update(event.get("结果", {}))
+        self.events.append(event)
+        await self._notify()
+
+    async def finish(self, state: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        self.state = state
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        # 估算驻留体积 (序列化字节数)，用于注册表的内存上限
+        self.nbytes = len(codec.dumps([result, self.events], default=str))
+        if result is not None:
+            # 最终结果已包含全部部分结果，不再重复保存
+            self.partial = {}
+        await self._notify()
+
+    def cancel(self) -> bool:
+        """请求取消：执行单元在下一个阶段边界检查该标记并中止"""
+        if self.done:
+            return False
+        self.cancel_event.set()
+        return True
+
+    async def follow(self) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        依次产出全部事件 (先回放已有事件，再等待新事件)，任务结束后停止。
+        超过心跳间隔仍无新事件时产出 None，由调用方转为心跳。
+        """
+        cursor = 0
+        while True:
+            while cursor < len(self.events):
+                yield self.events[cursor]
+                cursor += 1
+            if self.done:
+                return
+            idle = False
+            async with self._changed:
+                if cursor == len(self.events) and not self.done:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        idle = True
+            if idle:
+                yield None
+
+    def summary(self) -> Dict[str, Any]:
+        body = {
+            "任务": self.id,
+            "状态": self.state,
+            "参数": self.params,
+            "创建时间": self.created,
+            "进度": self.events[-1] if self.events else None,
+        }
+        if self.finished is not None:
+            body["结束时间"] = self.finished
+        if self.error:
+            body["信息"] = self.error
+        return body
+
+
+class JobRegistry:
+    """
+    [炼金组件]: 任务注册表
+    进行中的任务始终保留；已结束的任务在 ttl 秒后过期，
+    且全部已结束任务的驻留体积超过 max_bytes 时，从最早结束的开始淘汰。
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("ATHANOR_JOB_TTL", "900"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("ATHANOR_JOB_MAX_MB", "256")) * 1024 * 1024
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def create(self, params: Dict[str, Any], channel, cancel_event) -> Job:
+        self.sweep()
+        job = Job(uuid.uuid4().hex, params, channel, cancel_event)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.sweep()
+        return self._jobs.get(job_id)
+
+    def remove(self, job_id: str) -> Optional[Job]:
+        return self._jobs.pop(job_id, None)
+
+    def sweep(self) -> int:
+        """淘汰过期或超出体积上限的已结束任务，返回淘汰数量"""
+        now = time.time()
+        finished = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.finished)
+        evicted = 0
+        total = sum(j.nbytes for j in finished)
+        for job in finished:
+            if now - job.finished > self.ttl or total > self.max_bytes:
+                self._jobs.pop(job.id, None)
+                total -= job.nbytes
+                evicted += 1
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        self.sweep()
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "任务数": len(self._jobs),
+            "状态分布": states,
+            "驻留字节": sum(j.nbytes for j in self._jobs.values() if j.done),
+            "上限字节": self.max_bytes,
+            "过期秒数": self.ttl,
+        }
@@ -1,13 +1,34 @@
+import os
+import tempfile
 import time
+import uuid
+import hashlib
+import asyncio
+import queue
+import threading
 import logging
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from functools import partial
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Query, Path, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.concurrency import run_in_threadpool
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
 
 # 导入 Athanor 核心组件
-from cleaner import AthanorPurifier
+import codec
+import pipeline
+from cache import ResultCache
+from rules import rulebook_digest
 from analyzer import KnowledgeCrystallizer
+from dedup import merge_exports
+from index import BookmarkIndex, IndexMissing, index_path, parse_time_bound
+from ingest import SignalStream, IngestError, accepts
+from jobs import JobRegistry, Job, DONE, FAILED, CANCELLED
+from telemetry import MetricsRegistry, recording
 
 # --- 日志系统：监控熔炉状态 ---
 logging.basicConfig(
@@ -16,11 +37,480 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --- 组件配置：每个执行单元 (worker 进程或主进程) 各自构建一套组件 ---
+CRYSTALLIZER_CONFIG = {
+    "n_clusters": 8,
+    "large_corpus_threshold": int(os.getenv("ATHANOR_LARGE_CORPUS", "100000")),
+    "chunk_size": int(os.getenv("ATHANOR_CHUNK_SIZE", "4096")),
+    # 每个执行单元各自的分词进程数：默认 0 (串行)，进程池模式下请求本已分散在多个 worker 中
+    "tokenize_workers": int(os.getenv("ATHANOR_TOKENIZE_WORKERS", "0")),
+    "tokenize_threshold": int(os.getenv("ATHANOR_TOKENIZE_THRESHOLD", "20000")),
+}
+
+# --- 执行后端：ATHANOR_WORKERS > 0 时使用进程池，0 表示在主进程线程池中执行 ---
+WORKER_COUNT = int(os.getenv("ATHANOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+executor = None
+
+# --- 结果缓存：内存 LRU + 可选磁盘层 (设置 ATHANOR_RESULT_CACHE_DIR 启用) ---
+result_cache = ResultCache(
+    max_bytes=int(os.getenv("ATHANOR_RESULT_CACHE_MB", "256")) * 1024 * 1024,
+    disk_dir=os.getenv("ATHANOR_RESULT_CACHE_DIR") or None,
+    disk_max_bytes=int(os.getenv("ATHANOR_RESULT_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+)
+CACHE_VERSION = f"{pipeline.PIPELINE_VERSION}+rules-{rulebook_digest()}"
+
+# --- 注入：上传边接收边转存为临时文件 (尺寸上限在接收过程中即时检查)，解析在执行后端中进行 ---
+MAX_UPLOAD_BYTES = int(os.getenv("ATHANOR_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+INGEST_CHUNK_BYTES = 256 * 1024
+MAX_MERGE_FILES = int(os.getenv("ATHANOR_MAX_MERGE_FILES", "16"))
+
+# --- 性能指标：各阶段记录汇总为直方图，由 /metrics 以 Prometheus 文本格式导出 ---
+metrics = MetricsRegistry()
+
+# --- 异步任务：进度事件经 channel 回传，已结束任务按 ATHANOR_JOB_TTL / ATHANOR_JOB_MAX_MB 过期 ---
+job_registry = JobRegistry()
+job_manager = None  # 进程池模式下的 multiprocessing.Manager，提供跨进程的进度队列与取消标记
+job_tasks = set()
+
+# --- 响应压缩：超过该字节数且客户端声明 Accept-Encoding: gzip 时压缩 (SSE 事件流不压缩) ---
+GZIP_MINIMUM_BYTES = int(os.getenv("ATHANOR_GZIP_MIN_BYTES", "1024"))
+
+# --- 明细分页：单页条目上限 ---
+PAGE_LIMIT_MAX = 1000
+
+# --- 本地索引查询：关键词按建索引时的分词器切分 (主进程惰性构建一份，只用于分词) ---
+query_crystallizer: Optional[KnowledgeCrystallizer] = None
+
+# --- 预热状态：/health 只在每个执行单元都报告就绪后才报告就绪 ---
+warm_up_state = {"就绪": False, "耗时": None, "熔炉": []}
+# 就绪探针在屏障处等待其余 worker 的上限 (秒)，超时的探针记为未就绪
+WARM_UP_TIMEOUT = float(os.getenv("ATHANOR_WARM_UP_TIMEOUT", "300"))
+
+
+async def warm_up_backend() -> None:
+    """
+    预热全部执行单元：进程池模式下同时投递与 worker 数量相同的就绪探针，探针共享一个跨进程屏障，
+    回答完的 worker 在屏障处等待，其余探针只能由其他 worker 接手，迫使每个 worker 启动并跑完
+    initializer (jieba 词典 + sklearn + 迷你聚类)。只有各 worker (进程号互不相同) 都回报就绪时才算就绪。
+    """
+    start = time.perf_counter()
+    try:
+        if executor is None:
+            await run_in_threadpool(pipeline.init_worker, CRYSTALLIZER_CONFIG)
+            reports = [await run_in_threadpool(pipeline.report_ready)]
+        else:
+            loop = asyncio.get_running_loop()
+            barrier = job_manager.Barrier(WORKER_COUNT)
+            reports = await asyncio.gather(*[
+                loop.run_in_executor(executor, pipeline.report_ready, barrier, WARM_UP_TIMEOUT)
+                for _ in range(WORKER_COUNT)
+            ])
+    except Exception as e:
+        logger.error(f"❌ 预热失败: {str(e)}", exc_info=True)
+        return
+
+    expected = WORKER_COUNT if executor is not None else 1
+    ready = all(r["就绪"] for r in reports) and len({r["pid"] for r in reports}) == expected
+    warm_up_state.update({
+        "就绪": ready,
+        "耗时": f"{time.perf_counter() - start:.2f}s",
+        "熔炉": reports,
+    })
+    if ready:
+        logger.info(f"♨️ 预热完成 | 耗时: {warm_up_state['耗时']} | 熔炉: {expected}")
+    else:
+        logger.error(f"❌ 预热未完成: {sum(r['就绪'] for r in reports)}/{expected} 个熔炉就绪")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global executor, job_manager
+    if WORKER_COUNT > 0:
+        # spawn 上下文：避免 fork 带走事件循环与线程状态
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(
+            max_workers=WORKER_COUNT,
+            mp_context=context,
+            initializer=pipeline.init_worker,
+            initargs=(CRYSTALLIZER_CONFIG,),
+        )
+        job_manager = context.Manager()
+        logger.info(f"🔥 进程池点火: {WORKER_COUNT} 个熔炉")
+    else:
+        logger.info("🔥 单进程模式: 在线程池中熔炼")
+
+    # 预热在后台进行，服务先行启动，/health 在完成前返回 503
+    warm_up_task = asyncio.create_task(warm_up_backend())
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        for task in list(job_tasks):
+            task.cancel()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+            executor = None
+        if job_manager is not None:
+            job_manager.shutdown()
+            job_manager = None
+
+
+async def run_job(func, *args, **kwargs):
+    """将一次熔炼任务投递到当前执行后端"""
+    if executor is None:
+        return await run_in_threadpool(func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+def reject_upload(status_code: int, detail: str) -> HTTPException:
+    """原料被拒 (超出尺寸上限、压缩流损坏或缺少解压组件)：按状态码计入 athanor_ingest_rejected_total"""
+    metrics.count("athanor_ingest_rejected_total", f'status="{status_code}"')
+    return HTTPException(status_code=status_code, detail=detail)
+
+
+async def ingest(chunks, filename: Optional[str] = None) -> SignalStream:
+    """
+    [注入]: 上传分块边接收边转存为临时文件 (内存占用与文件大小无关)，再作为一个任务投递给执行后端解析。
+    HTML 解析是 CPU 密集的纯 Python 代码：进程池模式下在 worker 中进行，不占用 API 进程的 GIL；
+    原料字节不经进程间序列化，回传的只有信号表。解压后的尺寸上限与压缩流校验由 worker 中的注入器负责。
+    """
+    path = await spool(chunks, filename)
+    try:
+        return await run_job(pipeline.ingest_export, path, filename, MAX_UPLOAD_BYTES)
+    finally:
+        os.remove(path)
+
+
+async def read_upload(file: UploadFile):
+    """按块读取 UploadFile，不把整个文件读入内存"""
+    while True:
+        chunk = await file.read(INGEST_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def spool(chunks, filename: Optional[str] = None) -> str:
+    """
+    把上传分块写入临时文件 (不整体读入内存)，返回路径，由调用方删除。
+    worker 按路径流式解析，原料字节不经进程间序列化；超过尺寸上限时即停 (413)。
+    """
+    fd, path = tempfile.mkstemp(prefix="athanor-upload-")
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            received = 0
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > MAX_UPLOAD_BYTES:
+                    raise reject_upload(413, f"原料超过尺寸上限 ({MAX_UPLOAD_BYTES // (1024 * 1024)} MB): {filename or '(数据流)'}")
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+class CompactJSONResponse(JSONResponse):
+    """紧凑 JSON 响应：经 codec (orjson) 序列化，无缩进、无多余空白，非 ASCII 字符不转义"""
+
+    def render(self, content) -> bytes:
+        return codec.dumps(content)
+
+
+def detail_sections(details: dict) -> Dict[str, list]:
+    """明细 -> 分区名到完整列表的映射 (分区名即分页地址中的段名)"""
+    sections = {f"clusters-{cluster_id}": members for cluster_id, members in details["clusters"].items()}
+    sections["domains"] = details["domains"]
+    sections["cloud"] = details["cloud"]
+    return sections
+
+
+def publish_details(payload: dict, result_id: str) -> Optional[dict]:
+    """
+    取出执行单元回传的完整列表 (明细)，按分区存入结果缓存，响应体中换成分页句柄：
+    每个星群附带 members (全部成员的分页地址)，域名领地与语义星云的地址放在 句柄 中。
+    返回取出的明细：可缓存的结果把它随主条目一起写入缓存，分区被淘汰后由 fetch_page 从主条目重建。
+    """
+    details = payload.pop("明细", None)
+    if details is None:
+        return None
+    for crystal in payload["结果"]["星群结晶"] or []:  # 因延迟预算未完成时为 null
+        cluster_id = str(crystal["cluster_id"])
+        details["clusters"].setdefault(cluster_id, [])
+        crystal["members"] = f"/results/{result_id}/clusters/{cluster_id}"
+    for section, items in detail_sections(details).items():
+        result_cache.put(f"{result_id}.{section}", {"条目": items})
+    payload["句柄"] = {
+        "域名领地": f"/results/{result_id}/domains",
+        "语义星云": f"/results/{result_id}/cloud",
+    }
+    return details
+
+
+class AnalysisOptions:
+    """
+    分析参数 (各熔炼端点共用的查询参数，以 Depends 注入)。
+    params 是随任务传入流水线、同时参与结果缓存键的部分；instrument / profile 只影响本次响应。
+    """
+
+    def __init__(
+        self,
+        river_top_n: int = Query(5, ge=1, le=100, description="兴趣河流的主题 (河道) 数量"),
+        river_granularity: str = Query("month", pattern="^(month|week)$", description="兴趣河流的时间粒度: month / week"),
+        cluster_engine: str = Query("auto", pattern="^(auto|full|minibatch)$", description="聚类引擎: auto 按规模自动切换 / full / minibatch"),
+        auto_k: bool = Query(False, description="自动选择星群数量：在分层抽样的 TF-IDF 上扫描候选 k (轮廓系数/惯性肘部)，只对选定的 k 做全量拟合，扫描报告见 元数据.星群数量选择"),
+        instrument: bool = Query(False, description="在元数据中返回各阶段的耗时、CPU、内存与缓存命中 (性能)"),
+        profile: bool = Query(False, description="对本次熔炼做采样剖析，落盘 folded 文件并在性能中返回路径"),
+    ):
+        self.params = {
+            "river_top_n": river_top_n,
+            "river_granularity": river_granularity,
+            "cluster_engine": cluster_engine,
+            "auto_k": auto_k,
+        }
+        self.instrument = instrument
+        self.profile = profile
+
+
+class TransmuteOptions:
+    """
+    上传类熔炼端点的参数：分析参数 + 增量档案、去重与本地索引。
+    增量模式沿用档案中的星群数量，与自动选择星群数量互斥，在注入之前即拒绝 (400)。
+    """
+
+    def __init__(
+        self,
+        analysis: AnalysisOptions = Depends(),
+        incremental: Optional[str] = Query(None, pattern="^[A-Za-z0-9_-]{1,64}$", description="增量档案名：与该档案上次的导出求差，只分析变化部分 (状态仅保存在本地)"),
+        dedup: bool = Query(False, description="近似去重 (默认关闭)：规范化 URL (只剥离已知的追踪参数) 并按标题 MinHash/LSH 合并重复收藏，结果附带重复分组"),
+        index: Optional[str] = Query(None, pattern="^[A-Za-z0-9_-]{1,64}$", description="本地索引名：把本次熔炼的书签、分词与星群写入本地 SQLite 索引，供 /index 查询端点使用"),
+    ):
+        if incremental and analysis.params["auto_k"]:
+            raise HTTPException(status_code=400, detail="增量模式沿用档案中的星群数量，不能与 auto_k 同时使用。")
+        self.params = {**analysis.params, "dedup": dedup}
+        self.instrument = analysis.instrument
+        self.profile = analysis.profile
+        self.incremental = incremental
+        self.index = index
+
+
+BUDGET = Query(None, gt=0, le=600, description="延迟预算 (秒，从分析开始起算，不含上传与解析)：统计类分析总会完成，到期仍未完成的其余分析 (通常是聚类) 返回 null，状态与原因见 元数据.调度")
+
+
+def detach_schedule(payload: dict) -> Optional[dict]:
+    """
+    取下 元数据.调度 (与请求的预算有关，不随结果缓存)。
+    未设预算时返回 None；其中 未完成 非空表示结果不完整，不能写入缓存。
+    """
+    return payload["元数据"].pop("调度", None)
+
+
+def settle_telemetry(payload: dict, ingest_records: List[dict], cache_hit: bool) -> dict:
+    """
+    取出执行单元回传的性能记录 (不进入结果缓存)，并入注入阶段与结果缓存命中后计入指标。
+    返回合并后的记录，由调用方决定是否附加到响应元数据。
+    """
+    telemetry = payload["元数据"].pop("性能", None) or {"阶段": [], "缓存": {}}
+    telemetry["阶段"] = ingest_records + telemetry["阶段"]
+    telemetry["缓存"] = {**telemetry["缓存"], "result": {"hits": int(cache_hit), "misses": int(not cache_hit)}}
+    metrics.observe(telemetry["阶段"], telemetry["缓存"])
+    return telemetry
+
+
+async def transmute_stream(chunks, filename: Optional[str], params: dict, incremental: Optional[str],
+                           instrument: bool = False, profile: bool = False, index: Optional[str] = None,
+                           budget: Optional[float] = None):
+    """两个上传入口共用：流式注入 -> 查询结果缓存 -> 投递分析任务"""
+    start_time = time.perf_counter()
+    logger.info(f"📥 接收原料: {filename or '(数据流)'}")
+
+    try:
+        stream = await ingest(chunks, filename)
+    except IngestError as e:
+        raise reject_upload(e.status_code, str(e))
+
+    return await transmute_ingested(
+        stream.signals, stream.hexdigest(), [stream.stage_record()], params, incremental, start_time,
+        f"{stream.received_bytes} -> {stream.decoded_bytes} 字节", instrument, profile, index=index, budget=budget,
+    )
+
+
+async def transmute_ingested(signals, digest: str, ingest_records: List[dict], params: dict,
+                             incremental: Optional[str], start_time: float, origin: str,
+                             instrument: bool = False, profile: bool = False, extra_metadata: Optional[dict] = None,
+                             index: Optional[str] = None, budget: Optional[float] = None):
+    """
+    注入完成之后的公共部分：查询结果缓存 -> 投递分析任务 -> 发布明细；extra_metadata 随结果一并缓存。
+    budget 从分析开始起算 (不含注入)；因预算不足而不完整的结果不写入缓存。
+    """
+    try:
+        # 按 (解压后) 内容摘要查询结果缓存
+        cache_key = ResultCache.make_key(digest, CACHE_VERSION, params)
+        # 增量模式依赖本地档案状态、索引模式需要写入本地索引，都不走结果缓存
+        cacheable = not incremental and not index
+        payload = result_cache.get(cache_key) if cacheable else None
+        cache_hit = payload is not None
+
+        if not cache_hit:
+            # 信号已在注入时析出，分析部分作为一个任务投递给执行后端
+            payload = await run_job(pipeline.transmute_signals, signals, incremental=incremental,
+                                    index=index, profile=profile, budget=budget,
+                                    **params)
+            if not payload["成功"]:
+                return payload
+            if extra_metadata:
+                payload["元数据"].update(extra_metadata)
+        schedule = detach_schedule(payload)
+        telemetry = settle_telemetry(payload, ingest_records, cache_hit)
+        if cache_hit:
+            payload.pop("明细", None)
+        else:
+            details = publish_details(payload, cache_key if cacheable else uuid.uuid4().hex)
+            if cacheable and not (schedule and schedule["未完成"]):
+                result_cache.put(cache_key, {**payload, "明细": details})
+
+        elapsed_time = time.perf_counter() - start_time
+        logger.info(
+            f"✨ 熔炼完成 | 耗时: {elapsed_time:.2f}s | 信号数量: {payload['元数据']['信号数量']} "
+            f"| 原料: {origin} | 缓存命中: {cache_hit}"
+        )
+
+        payload["元数据"] = {"耗时": f"{elapsed_time:.2f}s", **payload["元数据"], "缓存命中": cache_hit}
+        if schedule is not None:
+            payload["元数据"]["调度"] = schedule
+        if instrument:
+            payload["元数据"]["性能"] = telemetry
+        return payload
+
+    except Exception as e:
+        logger.error(f"❌ 熔炼事故: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"反应堆熔毁: {str(e)}")
+
+
+def merge_streams(streams: List[SignalStream]):
+    """多份导出的信号表按规范 URL 归并 (语境取并集)，返回 (合并后的信号表, 报告, 性能记录)"""
+    with recording() as recorder:
+        merged, report = merge_exports([s.signals for s in streams])
+    return merged, report, recorder.records
+
+
+async def transmute_files(files: List[UploadFile], params: dict, incremental: Optional[str],
+                          instrument: bool = False, profile: bool = False, index: Optional[str] = None,
+                          budget: Optional[float] = None):
+    """
+    多文件熔炼：每份导出作为一个注入任务投递给执行后端，多个 worker 并行解析；
+    全部结束后合并为一张信号表，再做一次整体分析。墙钟时间取决于最大的那份导出。
+    """
+    start_time = time.perf_counter()
+    logger.info(f"📥 接收原料 ({len(files)} 份): {', '.join(f.filename or '?' for f in files)}")
+    # multipart 上传在进入端点前已由框架接收完毕；逐份转存为临时文件，只把路径交给 worker
+    paths: List[str] = []
+    try:
+        for f in files:
+            paths.append(await spool(read_upload(f), f.filename))
+        streams = await asyncio.gather(*[
+            run_job(pipeline.ingest_export, path, f.filename, MAX_UPLOAD_BYTES) for path, f in zip(paths, files)
+        ])
+    except IngestError as e:
+        raise reject_upload(e.status_code, str(e))
+    finally:
+        for path in paths:
+            os.remove(path)
+
+    signals, report, merge_records = await run_in_threadpool(merge_streams, streams)
+    report["文件"] = [{"文件名": f.filename, "信号数量": s.signal_count} for f, s in zip(files, streams)]
+    # 组合摘要：各份导出的内容摘要按上传顺序拼接 (顺序决定归并时的代表信号)
+    digest = hashlib.sha256("\n".join(s.hexdigest() for s in streams).encode('ascii')).hexdigest()
+    return await transmute_ingested(
+        signals, digest, [s.stage_record() for s in streams] + merge_records, params, incremental, start_time,
+        f"{len(streams)} 份, {sum(s.decoded_bytes for s in streams)} 字节", instrument, profile,
+        extra_metadata={"合并": report}, index=index, budget=budget,
+    )
+
+
+def open_job_channel():
+    """为任务创建进度队列与取消标记：进程池模式下为 Manager 代理，线程模式下为普通对象"""
+    if job_manager is not None:
+        return job_manager.Queue(), job_manager.Event()
+    return queue.Queue(), threading.Event()
+
+
+async def pump_progress(job: Job, stopped: asyncio.Event) -> None:
+    """把执行单元推送的进度事件搬运到任务的事件流；stopped 置位后排空剩余事件再退出"""
+    while True:
+        try:
+            event = await run_in_threadpool(job.channel.get, True, 0.2)
+        except queue.Empty:
+            if stopped.is_set():
+                break
+            continue
+        await job.publish(event)
+    while True:
+        try:
+            event = job.channel.get_nowait()
+        except queue.Empty:
+            return
+        await job.publish(event)
+
+
+async def run_transmute_job(job: Job, stream: SignalStream, incremental: Optional[str], start_time: float,
+                            instrument: bool = False, profile: bool = False, index: Optional[str] = None) -> None:
+    """在后台执行一次熔炼任务，结束时写入最终状态"""
+    cache_key = ResultCache.make_key(stream.hexdigest(), CACHE_VERSION, job.params)
+    cacheable = not incremental and not index
+    payload = result_cache.get(cache_key) if cacheable else None
+    cache_hit = payload is not None
+
+    stopped = asyncio.Event()
+    pump = asyncio.create_task(pump_progress(job, stopped))
+    try:
+        if not cache_hit:
+            payload = await run_job(
+                pipeline.transmute_signals, stream.signals, incremental=incremental, index=index,
+                progress=job.channel, cancel=job.cancel_event, profile=profile, **job.params
+            )
+    except pipeline.JobCancelled:
+        stopped.set()
+        await pump
+        await job.finish(CANCELLED)
+        logger.info(f"🛑 任务已取消: {job.id}")
+        return
+    except Exception as e:
+        stopped.set()
+        await pump
+        logger.error(f"❌ 任务熔毁: {job.id} | {str(e)}", exc_info=True)
+        await job.finish(FAILED, error=f"反应堆熔毁: {str(e)}")
+        return
+    stopped.set()
+    await pump
+
+    if not payload["成功"]:
+        await job.finish(FAILED, result=payload, error=payload.get("信息"))
+        return
+    telemetry = settle_telemetry(payload, [stream.stage_record()], cache_hit)
+    if cache_hit:
+        payload.pop("明细", None)
+    else:
+        details = publish_details(payload, cache_key if cacheable else uuid.uuid4().hex)
+        if cacheable:
+            result_cache.put(cache_key, {**payload, "明细": details})
+
+    elapsed_time = time.perf_counter() - start_time
+    payload["元数据"] = {"耗时": f"{elapsed_time:.2f}s", **payload["元数据"], "缓存命中": cache_hit}
+    if instrument:
+        payload["元数据"]["性能"] = telemetry
+    await job.finish(DONE, result=payload)
+    logger.info(f"✨ 任务完成: {job.id} | 耗时: {elapsed_time:.2f}s | 信号数量: {payload['元数据']['信号数量']} | 缓存命中: {cache_hit}")
+
+
 # --- API 实例：汉化元数据 ---
 app = FastAPI(
     title="Athanor 炼金反应堆",
     description="信号高于噪音：原子级知识转化引擎。将混乱的书签 HTML 转化为有序的知识星群。",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=CompactJSONResponse,
 )
 
 # --- 跨域配置：允许前端访问 ---
@@ -31,10 +521,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# --- 组件初始化 ---
-purifier = AthanorPurifier()
-crystallizer = KnowledgeCrystallizer(n_clusters=8)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_BYTES, compresslevel=6)
 
 @app.get("/", include_in_schema=False)
 async def home_redirect():
@@ -43,84 +530,360 @@ async def home_redirect():
 
 @app.get("/health", summary="系统状态检测", tags=["系统监控"])
 async def health_check():
-    """查看反应堆是否在线"""
-    return {
-        "状态": "在线",
+    """查看反应堆是否在线 (预热完成前返回 503)"""
+    ready = warm_up_state["就绪"]
+    body = {
+        "状态": "在线" if ready else "预热中",
         "核心": "稳定",
+        "就绪": ready,
+        "预热": warm_up_state,
         "运行时间": f"{time.process_time():.2f}s"
     }
+    return JSONResponse(body, status_code=200 if ready else 503)
 
 @app.post("/transmute", summary="执行熔炼", tags=["核心流程"])
 async def execute_transmutation(
-    file: UploadFile = File(..., description="请上传从浏览器导出的 HTML 书签文件")
+    file: UploadFile = File(..., description="请上传从浏览器导出的 HTML 书签文件"),
+    options: TransmuteOptions = Depends(),
+    budget: Optional[float] = BUDGET,
 ):
     """
     ### 炼金流程说明：
-    1. **注入**: 接收原始 HTML 文件
+    1. **注入**: 分块接收 HTML 书签文件 (支持 .html.gz / .html.zst 压缩导出)，转存后由执行单元流式解析
     2. **净化**: 提取有效书签信号
     3. **结晶**: 进行聚类分析和时间线生成
     """
-    if not file.filename.endswith(".html"):
-        raise HTTPException(status_code=400, detail="文件格式错误。必须是 .html 结尾的书签文件。")
+    if not accepts(file.filename):
+        raise HTTPException(status_code=400, detail="文件格式错误。必须是 .html 结尾的书签文件 (可为 .html.gz / .html.zst)。")
+    try:
+        return CompactJSONResponse(
+            await transmute_stream(read_upload(file), file.filename, options.params, options.incremental,
+                                   options.instrument, options.profile, options.index, budget)
+        )
+    finally:
+        await file.close()
 
-    start_time = time.perf_counter()
-    logger.info(f"📥 接收原料: {file.filename}")
+@app.post("/transmute/stream", summary="流式熔炼", tags=["核心流程"])
+async def execute_stream_transmutation(
+    request: Request,
+    filename: Optional[str] = Query(None, description="原料文件名 (可选，用于判断压缩格式；也会按魔数自动识别)"),
+    options: TransmuteOptions = Depends(),
+    budget: Optional[float] = BUDGET,
+):
+    """
+    以原始请求体 (非 multipart) 上传书签文件：请求体的网络分块到达时即写入临时文件，不在内存中缓冲，
+    接收完成后由执行单元解析。适合超大导出，例如 `curl --data-binary @bookmarks.html.gz`。
+    """
+    return CompactJSONResponse(
+        await transmute_stream(request.stream(), filename, options.params, options.incremental, options.instrument,
+                               options.profile, options.index, budget)
+    )
 
+@app.post("/transmute/merge", summary="多文件合并熔炼", tags=["核心流程"])
+async def execute_merge_transmutation(
+    files: List[UploadFile] = File(..., description="多份浏览器导出 (如 Chrome / Edge / Firefox 各一份)"),
+    options: TransmuteOptions = Depends(),
+    budget: Optional[float] = BUDGET,
+):
+    """
+    一次上传多份书签导出，合并后整体分析：
+    1. **注入**: 每份导出作为独立任务在多个 worker 中并行解析
+    2. **合并**: 规范 URL 相同的书签归并为一条，文件夹语境取各浏览器的并集 (元数据.合并)
+    3. **结晶**: 与 `/transmute` 相同的分析流程与响应结构
+    """
     try:
-        # 1. 读取并解析
-        raw_content = await file.read()
-        signal_list = await run_in_threadpool(purifier.smelt, raw_content)
-        
-        if not signal_list:
-            return {"成功": False, "信息": "未能在该物质中提取到任何有效信号。"}
-
-        count = len(signal_list)
-        if count < 2:
-             return {"成功": False, "信息": "样本过少，无法进行聚类分析。"}
-
-        # 2. 动态调整密度
-        n_clusters = max(2, min(8, count // 10))
-        crystallizer.n_clusters = n_clusters
-        
-        # 3. 结晶
-        cluster_crystals = await run_in_threadpool(crystallizer.crystallize, signal_list)
-        timeline_heatmap = await run_in_threadpool(crystallizer.analyze_timeline, signal_list)
-        
-        # 4. 深度挖掘 (新增维度)
-        domain_territory = await run_in_threadpool(crystallizer.analyze_domains, signal_list)
-        activity_hours = await run_in_threadpool(crystallizer.analyze_activity_hours, signal_list)
-        semantic_nebula = await run_in_threadpool(crystallizer.analyze_tags_cloud, signal_list)
-        persona_data = await run_in_threadpool(crystallizer.generate_persona, signal_list)
-        theme_river = await run_in_threadpool(crystallizer.analyze_theme_river, signal_list)
-        skill_radar = await run_in_threadpool(crystallizer.analyze_skill_radar, signal_list)
+        if len(files) > MAX_MERGE_FILES:
+            raise HTTPException(status_code=400, detail=f"一次最多合并 {MAX_MERGE_FILES} 份导出。")
+        for file in files:
+            if not accepts(file.filename):
+                raise HTTPException(status_code=400, detail=f"文件格式错误: {file.filename}。必须是 .html 结尾的书签文件 (可为 .html.gz / .html.zst)。")
+            if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+                raise reject_upload(413, f"原料超过尺寸上限 ({MAX_UPLOAD_BYTES // (1024 * 1024)} MB): {file.filename}")
 
-        elapsed_time = time.perf_counter() - start_time
-        logger.info(f"✨ 熔炼完成 | 耗时: {elapsed_time:.2f}s | 信号数量: {count}")
+        return CompactJSONResponse(await transmute_files(files, options.params, options.incremental, options.instrument,
+                                                         options.profile, options.index, budget))
+    finally:
+        for file in files:
+            await file.close()
+
+@app.post("/jobs", summary="提交熔炼任务", tags=["异步任务"], status_code=202)
+async def submit_job(
+    file: UploadFile = File(..., description="请上传从浏览器导出的 HTML 书签文件"),
+    options: TransmuteOptions = Depends()
+):
+    """
+    上传完成并解析后立即返回任务号，分析在后台进行。
+    通过 `/jobs/{id}/events` 订阅进度 (SSE)，廉价分析的结果随进度事件先行交付；
+    `/jobs/{id}/result` 获取与 `/transmute` 相同结构的最终结果。
+    """
+    if not accepts(file.filename):
+        raise HTTPException(status_code=400, detail="文件格式错误。必须是 .html 结尾的书签文件 (可为 .html.gz / .html.zst)。")
+    start_time = time.perf_counter()
+    logger.info(f"📥 接收原料 (异步任务): {file.filename}")
+    try:
+        stream = await ingest(read_upload(file), file.filename)
+    except IngestError as e:
+        raise reject_upload(e.status_code, str(e))
+    finally:
+        await file.close()
+
+    job = job_registry.create(options.params, *open_job_channel())
+    await job.publish({
+        "阶段": "注入",
+        "已处理": stream.signal_count,
+        "耗时": round(time.perf_counter() - start_time, 3),
+        "结果": {},
+    })
+    task = asyncio.create_task(run_transmute_job(job, stream, options.incremental, start_time, options.instrument,
+                                                 options.profile, options.index))
+    job_tasks.add(task)
+    task.add_done_callback(job_tasks.discard)
+
+    return {**job.summary(), "事件": f"/jobs/{job.id}/events", "结果": f"/jobs/{job.id}/result"}
 
+def find_job(job_id: str) -> Job:
+    job = job_registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期。")
+    return job
+
+@app.get("/jobs", summary="任务注册表状态", tags=["异步任务"])
+async def inspect_jobs():
+    """查看任务数量、状态分布与已结束任务的驻留体积"""
+    return job_registry.stats()
+
+@app.get("/jobs/{job_id}", summary="查询任务", tags=["异步任务"])
+async def inspect_job(job_id: str):
+    """任务状态、最近一次进度与已先行完成的部分结果"""
+    job = find_job(job_id)
+    return {**job.summary(), "部分结果": job.partial}
+
+@app.get("/jobs/{job_id}/events", summary="订阅任务进度 (SSE)", tags=["异步任务"])
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events：先回放已有事件，再实时推送。
+    事件类型 progress (阶段、已处理条数、耗时、该阶段结果)；任务结束时发送 done / failed / cancelled。
+    """
+    job = find_job(job_id)
+
+    async def event_source():
+        async for event in job.follow():
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield b"event: progress\ndata: " + codec.dumps(event) + b"\n\n"
+        terminal = {DONE: "done", FAILED: "failed", CANCELLED: "cancelled"}[job.state]
+        yield f"event: {terminal}\ndata: ".encode('utf-8') + codec.dumps(job.summary()) + b"\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/jobs/{job_id}/result", summary="获取任务结果", tags=["异步任务"])
+async def fetch_job_result(job_id: str):
+    """任务完成后返回与 /transmute 相同结构的响应体；未完成或已取消时返回 409，熔毁时返回 500"""
+    job = find_job(job_id)
+    if job.result is None:
+        return CompactJSONResponse(job.summary(), status_code=500 if job.state == FAILED else 409)
+    return CompactJSONResponse(job.result)
+
+@app.delete("/jobs/{job_id}", summary="取消任务", tags=["异步任务"])
+async def cancel_job(job_id: str):
+    """进行中的任务在下一个阶段边界中止；已结束的任务直接从注册表移除"""
+    job = find_job(job_id)
+    if job.cancel():
+        return {**job.summary(), "信息": "已请求取消，将在当前阶段结束后中止。"}
+    job_registry.remove(job_id)
+    return {**job.summary(), "信息": "任务已结束，已从注册表移除。"}
+
+def fetch_page(result_id: str, section: str, offset: int, limit: int, path: str) -> CompactJSONResponse:
+    """
+    从结果缓存读取一个明细分区并切出一页。分区已被淘汰而主条目仍在时，从主条目携带的明细重建全部分区；
+    主条目也已淘汰 (或结果本就不缓存) 时返回 404 (重新熔炼即可再生)。
+    """
+    detail = result_cache.get(f"{result_id}.{section}")
+    if detail is not None:
+        items = detail["条目"]
+    else:
+        entry = result_cache.get(result_id)
+        sections = detail_sections(entry["明细"]) if entry and entry.get("明细") else {}
+        if section not in sections:
+            raise HTTPException(status_code=404, detail="明细已过期，请重新熔炼。")
+        for name, entries in sections.items():
+            result_cache.put(f"{result_id}.{name}", {"条目": entries})
+        items = sections[section]
+    end = offset + limit
+    return CompactJSONResponse({
+        "总数": len(items),
+        "偏移": offset,
+        "条目": items[offset:end],
+        "下一页": f"{path}?offset={end}&limit={limit}" if end < len(items) else None,
+    })
+
+@app.get("/results/{result_id}/clusters/{cluster_id}", summary="星群成员分页", tags=["结果明细"])
+async def page_cluster_members(
+    result_id: str,
+    cluster_id: int,
+    offset: int = Query(0, ge=0, description="起始位置"),
+    limit: int = Query(100, ge=1, le=PAGE_LIMIT_MAX, description="每页条目数"),
+):
+    """星群的全部成员 (结果中的 nodes 只是前 10 个预览)，地址见每个星群的 members 字段"""
+    path = f"/results/{result_id}/clusters/{cluster_id}"
+    return fetch_page(result_id, f"clusters-{cluster_id}", offset, limit, path)
+
+@app.get("/results/{result_id}/domains", summary="域名领地分页", tags=["结果明细"])
+async def page_domains(
+    result_id: str,
+    offset: int = Query(0, ge=0, description="起始位置"),
+    limit: int = Query(100, ge=1, le=PAGE_LIMIT_MAX, description="每页条目数"),
+):
+    """按收藏数降序的全部域名 (结果中只内联前 10 个)"""
+    return fetch_page(result_id, "domains", offset, limit, f"/results/{result_id}/domains")
+
+@app.get("/results/{result_id}/cloud", summary="语义星云分页", tags=["结果明细"])
+async def page_cloud(
+    result_id: str,
+    offset: int = Query(0, ge=0, description="起始位置"),
+    limit: int = Query(100, ge=1, le=PAGE_LIMIT_MAX, description="每页条目数"),
+):
+    """按词频降序的全部词语 (结果中只内联前 50 个)"""
+    return fetch_page(result_id, "cloud", offset, limit, f"/results/{result_id}/cloud")
+
+def segment_query(text: str):
+    global query_crystallizer
+    if query_crystallizer is None:
+        query_crystallizer = KnowledgeCrystallizer(**CRYSTALLIZER_CONFIG)
+    return query_crystallizer._segment(text)
+
+def index_filters(q: Optional[str], domain: Optional[str], folder: Optional[str], since: Optional[str],
+                  until: Optional[str], cluster: Optional[int]) -> dict:
+    """查询参数 -> 索引查询条件 (日期换算为 Unix 秒)"""
+    try:
         return {
-            "成功": True,
-            "元数据": {
-                "耗时": f"{elapsed_time:.2f}s",
-                "信号数量": count,
-                "结晶密度": n_clusters
-            },
-            "结果": {
-                "用户画像": persona_data,
-                "技能雷达": skill_radar,
-                "时间线": timeline_heatmap,
-                "星群结晶": cluster_crystals,
-                "域名领地": domain_territory,
-                "活跃时段": activity_hours,
-                "语义星云": semantic_nebula,
-                "兴趣河流": theme_river
-            }
+            "q": q,
+            "domain": domain,
+            "folder": folder,
+            "since": parse_time_bound(since) if since else None,
+            "until": parse_time_bound(until, upper=True) if until else None,
+            "cluster": cluster,
         }
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"日期格式错误 (应为 YYYY / YYYY-MM / YYYY-MM-DD): {e}")
 
-    except Exception as e:
-        logger.error(f"❌ 熔炼事故: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"反应堆熔毁: {str(e)}")
-    finally:
-        await file.close()
+INDEX_NAME = Path(..., pattern="^[A-Za-z0-9_-]{1,64}$", description="本地索引名 (熔炼时的 index 参数)")
+FILTER_DESCRIPTIONS = {
+    "q": "关键词 (标题与标签的全文检索，多个词以空格分隔，取交集)",
+    "domain": "域名 (如 github.com)",
+    "folder": "文件夹路径前缀，以 / 分隔 (如 技术/Rust，包含其全部子文件夹)",
+    "since": "起始日期 (含)：YYYY / YYYY-MM / YYYY-MM-DD",
+    "until": "截止日期 (含)：YYYY / YYYY-MM / YYYY-MM-DD",
+    "cluster": "星群 id (熔炼结果中的 cluster_id)",
+}
+
+@app.get("/index/{name}", summary="本地索引概况", tags=["本地索引"])
+async def inspect_index(name: str = INDEX_NAME):
+    """构建时间、书签数量与星群列表"""
+    try:
+        return BookmarkIndex(index_path(name)).summary()
+    except IndexMissing as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/index/{name}/bookmarks", summary="查询本地索引", tags=["本地索引"])
+async def search_index(
+    request: Request,
+    name: str = INDEX_NAME,
+    q: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["q"]),
+    domain: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["domain"]),
+    folder: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["folder"]),
+    since: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["since"]),
+    until: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["until"]),
+    cluster: Optional[int] = Query(None, description=FILTER_DESCRIPTIONS["cluster"]),
+    offset: int = Query(0, ge=0, description="起始位置"),
+    limit: int = Query(100, ge=1, le=PAGE_LIMIT_MAX, description="每页条目数"),
+):
+    """
+    按关键词、域名、文件夹前缀、时间范围与星群组合筛选 (条件取交集)，按导出中的原始顺序分页返回。
+    例如 `?q=rust&since=2023&until=2023&folder=技术` —— 2023 年收藏在"技术"文件夹下的 Rust 相关书签。
+    """
+    filters = index_filters(q, domain, folder, since, until, cluster)
+    try:
+        page = await run_in_threadpool(BookmarkIndex(index_path(name)).search, filters, segment_query, offset, limit)
+    except IndexMissing as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    end = offset + limit
+    next_url = request.url.include_query_params(offset=end, limit=limit) if end < page["总数"] else None
+    return CompactJSONResponse({**page, "下一页": f"{next_url.path}?{next_url.query}" if next_url else None})
+
+@app.post("/index/{name}/transmute", summary="子集熔炼", tags=["本地索引"])
+async def execute_index_transmutation(
+    name: str = INDEX_NAME,
+    q: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["q"]),
+    domain: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["domain"]),
+    folder: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["folder"]),
+    since: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["since"]),
+    until: Optional[str] = Query(None, description=FILTER_DESCRIPTIONS["until"]),
+    cluster: Optional[int] = Query(None, description=FILTER_DESCRIPTIONS["cluster"]),
+    options: AnalysisOptions = Depends(),
+    budget: Optional[float] = BUDGET,
+):
+    """
+    对索引中满足条件的书签做一次完整分析 (响应结构同 `/transmute`)：
+    信号与词元直接取自本地索引，不重新上传、解析 HTML 或分词。索引保持建立时的去重状态，这里不再做去重。
+    """
+    start_time = time.perf_counter()
+    filters = index_filters(q, domain, folder, since, until, cluster)
+    try:
+        payload = await run_job(pipeline.transmute_index, name, filters, profile=options.profile,
+                                budget=budget, **options.params)
+    except IndexMissing as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not payload["成功"]:
+        return CompactJSONResponse(payload)
+
+    schedule = detach_schedule(payload)
+    telemetry = settle_telemetry(payload, [], False)
+    publish_details(payload, uuid.uuid4().hex)
+    conditions = {"q": q, "domain": domain, "folder": folder, "since": since, "until": until, "cluster": cluster}
+    payload["元数据"] = {"耗时": f"{time.perf_counter() - start_time:.2f}s", **payload["元数据"],
+                       "筛选": {k: v for k, v in conditions.items() if v is not None}}
+    if schedule is not None:
+        payload["元数据"]["调度"] = schedule
+    if options.instrument:
+        payload["元数据"]["性能"] = telemetry
+    return CompactJSONResponse(payload)
+
+@app.delete("/index/{name}", summary="删除本地索引", tags=["本地索引"])
+async def remove_index(name: str = INDEX_NAME):
+    """删除索引文件 (不影响结果缓存与增量档案)"""
+    return {"已删除": BookmarkIndex(index_path(name)).remove()}
+
+@app.get("/metrics", summary="Prometheus 指标", tags=["系统监控"], response_class=PlainTextResponse)
+async def export_metrics():
+    """各阶段耗时 / CPU / 内存 / 输入规模直方图、缓存命中计数与结果缓存、任务注册表的当前状态"""
+    cache_stats = result_cache.stats()
+    job_stats = job_registry.stats()
+    gauges = {
+        "athanor_result_cache_memory_bytes": cache_stats["memory"]["bytes"],
+        "athanor_result_cache_memory_entries": cache_stats["memory"]["entries"],
+        "athanor_result_cache_disk_bytes": cache_stats["disk"]["bytes"],
+        "athanor_jobs_retained": job_stats["任务数"],
+        "athanor_jobs_retained_bytes": job_stats["驻留字节"],
+        "athanor_ready": int(warm_up_state["就绪"]),
+    }
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache", summary="结果缓存状态", tags=["结果缓存"])
+async def inspect_cache():
+    """查看结果缓存的容量、命中率与磁盘层状态"""
+    return {"版本": CACHE_VERSION, **result_cache.stats()}
+
+@app.delete("/cache", summary="清空结果缓存", tags=["结果缓存"])
+async def purge_cache():
+    """清空内存层与磁盘层的全部缓存结果"""
+    return {"已清除": result_cache.purge()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,443 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from cleaner import AthanorPurifier
+from signals import SignalTable
+from ingest import SignalStream, read_export, accepts
+from analyzer import KnowledgeCrystallizer, TokenizedCorpus, warm_up
+from dedup import SignalDeduplicator, describe_groups, merge_exports
+from incremental import IncrementalLedger, profile_dir
+from index import BookmarkIndex, index_path
+from scheduler import StageScheduler
+from telemetry import recording, SamplingProfiler, PROFILE_SLOW_MS
+
+# 流水线版本：输出结构或算法变化时递增，旧的缓存结果随之失效
+PIPELINE_VERSION = "0.1.0-r4"
+
+# 结果 只内联各列表的前若干项，完整列表随 明细 交回调用方：服务端转存为分页句柄 (main.publish_details)，
+# 命令行没有分页端点，写出前把它们折回 结果 (inline_details)
+CLUSTER_PREVIEW = 10
+DOMAIN_PREVIEW = 10
+CLOUD_PREVIEW = 50
+
+# 自动选择星群数量时的候选上界 (仍受 信号数量 // 10 限制)
+AUTO_K_MAX = int(os.getenv("ATHANOR_AUTO_K_MAX", "16"))
+
+# 结果随进度事件先行交付的阶段 (列表只交付预览)
+DELIVERED_STAGES = ("时间线", "域名领地", "活跃时段", "技能雷达", "语义星云", "用户画像", "兴趣河流")
+PREVIEWS = {"域名领地": DOMAIN_PREVIEW, "语义星云": CLOUD_PREVIEW}
+
+# --- 熔炉组件：每个进程各自持有一套 (进程池 worker 或主进程) ---
+_components: Optional[Tuple[AthanorPurifier, KnowledgeCrystallizer]] = None
+_warm_up_timings: Dict[str, float] = {}
+
+
+def init_worker(crystallizer_config: Dict[str, Any]) -> None:
+    """
+    [进程初始化]: 为当前进程构建专属的净化器与结晶器，并完成预热 (jieba 词典、sklearn、迷你聚类)。
+    作为 ProcessPoolExecutor 的 initializer 运行；线程模式下由主进程在启动时调用。
+    """
+    global _components, _warm_up_timings
+    crystallizer = KnowledgeCrystallizer(**crystallizer_config)
+    _warm_up_timings = warm_up(crystallizer)
+    _components = (AthanorPurifier(), crystallizer)
+
+
+def report_ready(barrier=None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    就绪探针：在 worker 中执行，返回进程号、是否就绪与预热耗时。
+    给定 barrier (跨进程屏障，参与方数 = worker 数) 时，预热完成后在屏障处等待其余探针：
+    已回答探针的 worker 被占住，下一个探针只能由另一个 worker 接手，因此每个 worker 恰好回答一次。
+    等待超时 (有 worker 迟迟未能启动) 时照常返回，但记为未就绪。
+    """
+    _get_components()
+    ready = True
+    if barrier is not None:
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            ready = False
+    return {"pid": os.getpid(), "就绪": ready, "预热": {k: round(v, 3) for k, v in _warm_up_timings.items()}}
+
+
+def _get_components() -> Tuple[AthanorPurifier, KnowledgeCrystallizer]:
+    if _components is None:
+        init_worker({})
+    return _components
+
+
+def transmute(raw_content: bytes, **options) -> Dict[str, Any]:
+    """
+    [炼金流水线]: 从原始字节开始的一次完整熔炼 (解析 + 分析)。
+    参数同 transmute_signals。
+    """
+    purifier, _ = _get_components()
+    return transmute_signals(purifier.smelt_table(raw_content), **options)
+
+
+def ingest_export(source, filename: Optional[str], max_bytes: int) -> SignalStream:
+    """
+    [并行注入]: 在当前执行单元中解析一份导出 (文件路径或字节)，返回已结束的注入器。
+    每份上传都作为一个任务投递 (多文件熔炼时多份导出在多个 worker 中并行解析)，API 进程只负责转存。
+    只需要净化器：未初始化的进程 (如命令行的解析池) 不为此构建结晶器。
+    """
+    purifier = _components[0] if _components is not None else AthanorPurifier()
+    return read_export(purifier, source, max_bytes, filename)
+
+
+class JobCancelled(Exception):
+    """任务在阶段边界被取消"""
+
+
+class StageReporter:
+    """
+    [炼金组件]: 阶段汇报器
+    每个阶段结束时向 channel 推送一条进度事件 (阶段名、处理条数、累计耗时、该阶段的结果)，
+    并在阶段边界检查取消标记。channel / cancel 可以是进程间代理，也可以是线程内的 Queue / Event。
+    """
+
+    def __init__(self, channel=None, cancel=None):
+        self.channel = channel
+        self.cancel = cancel
+        self.start = time.perf_counter()
+
+    def checkpoint(self) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise JobCancelled("任务已取消")
+
+    def __call__(self, stage: str, processed: int, results: Optional[Dict[str, Any]] = None) -> None:
+        if self.channel is not None:
+            self.channel.put({
+                "阶段": stage,
+                "已处理": processed,
+                "耗时": round(time.perf_counter() - self.start, 3),
+                "结果": results or {},
+            })
+        self.checkpoint()
+
+
+def transmute_signals(signal_list: SignalTable, profile: bool = False, **options) -> Dict[str, Any]:
+    """
+    [炼金流水线]: 带性能记录的分析入口，参数同 _analyze。
+    成功时在 元数据.性能 中附带各阶段记录与本次的分词缓存命中 (由调用方决定是否对外返回)。
+    profile: 对本次熔炼做采样剖析并落盘；设置 ATHANOR_PROFILE_SLOW_MS 时，超过阈值的熔炼同样落盘。
+    """
+    profiler = SamplingProfiler().start() if profile or PROFILE_SLOW_MS > 0 else None
+    _, crystallizer = _get_components()
+    cache_before = crystallizer.token_cache_info()
+    start = time.perf_counter()
+    try:
+        with recording() as recorder:
+            payload = _analyze(signal_list, **options)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if not payload["成功"]:
+        return payload
+
+    cache_after = crystallizer.token_cache_info()
+    telemetry = {
+        "阶段": recorder.records,
+        "缓存": {"token": _cache_delta(cache_before, cache_after)},
+    }
+    if profiler is not None and (profile or elapsed_ms > PROFILE_SLOW_MS):
+        telemetry["剖析"] = profiler.dump()
+    payload["元数据"]["性能"] = telemetry
+    return payload
+
+
+def _cache_delta(before, after) -> Dict[str, Any]:
+    hits, misses = after.hits - before.hits, after.misses - before.misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+
+
+def transmute_index(name: str, filters: Dict[str, Any], profile: bool = False, **options) -> Dict[str, Any]:
+    """
+    [子集熔炼]: 从本地索引取出满足条件的书签，直接复用已存的词元做一次完整分析 (不解析 HTML、不分词)。
+    索引保持建立时的去重状态 (建立时是否 dedup)，因此这里不再做去重。参数同 transmute_signals。
+    """
+    _, crystallizer = _get_components()
+    signals, title_tokens, tag_tokens = BookmarkIndex(index_path(name)).load(filters, crystallizer._segment)
+    corpus = TokenizedCorpus(signals, title_tokens, tag_tokens)
+    return transmute_signals(signals, profile=profile, corpus=corpus, dedup=False, **options)
+
+
+def strip_indices(crystal: Dict[str, Any]) -> Dict[str, Any]:
+    """星群的浅拷贝 (去掉成员下标)：索引阶段可能仍在后台读取原对象，因此不原地修改"""
+    return {k: v for k, v in crystal.items() if k != "indices"}
+
+
+def _analyze(signal_list: SignalTable, river_top_n: int = 5, river_granularity: str = "month",
+             cluster_engine: str = "auto", incremental: Optional[str] = None, dedup: bool = False,
+             index: Optional[str] = None, corpus: Optional[TokenizedCorpus] = None,
+             budget: Optional[float] = None, auto_k: bool = False, progress=None, cancel=None) -> Dict[str, Any]:
+    """
+    [炼金流水线]: 对已解析的信号执行分析，返回 /transmute 的响应体 (耗时由调用方补充)。
+    上传已在注入任务中解析 (ingest_export)，因此这里只接收列式信号表 (旧版信号字典列表同样可用)。
+    所有参数随任务传入，不修改任何共享状态，可安全地并发执行。
+    incremental: 增量档案名；给定时与该档案上一次的导出求差，只处理变化的书签。
+    dedup: 先做近似去重 (规范 URL + 标题 MinHash/LSH，默认关闭)，同一页面只保留一条合并了全部语境的代表信号。
+    index: 本地索引名；给定时把 (去重后的) 信号、词元与星群标签写入该索引，供查询端点使用。
+    corpus: 预先分好的词 (来自本地索引)，给定时跳过分词；不能与去重同时使用。
+    auto_k: 自动选择星群数量 (在分层样本上扫描候选 k，见 KnowledgeCrystallizer.select_k)，上界为 AUTO_K_MAX；
+    选定的 k 记为 元数据.结晶密度，扫描报告记入 元数据.星群数量选择。增量模式沿用档案中的星群数量，不能同时使用。
+    budget: 延迟预算 (秒，从进入本函数起算)；统计与只读统计账本的廉价分析是必达阶段，总会先行完成，
+    到期时仍未完成的其余阶段 (通常是聚类) 在 结果 中为 null，状态与原因记入 元数据.调度 (见 StageScheduler)。
+    增量模式下统计账本由增量对齐产出，廉价分析随之受预算约束。不给定时等待全部阶段完成。
+    progress / cancel: 异步任务的进度通道与取消标记 (见 StageReporter)；
+    廉价的统计类分析先行完成，其结果随进度事件先行交付；其余阶段随后按依赖关系并发执行，聚类最后完成。
+    星群成员、域名领地与语义星云在 结果 中只保留预览，完整列表放在 明细 中，由调用方取走：
+    服务端换成分页句柄 (见 main.publish_details)，命令行折回 结果 (见 inline_details)。
+    """
+    started = time.perf_counter()
+    _, crystallizer = _get_components()
+    report_stage = StageReporter(progress, cancel)
+    report_stage.checkpoint()
+
+    # 1. 信号校验
+    if not signal_list:
+        return {"成功": False, "信息": "未能在该物质中提取到任何有效信号。"}
+
+    # 2. 近似去重：后续所有分析只处理代表信号
+    duplicate_groups = dedup_report = None
+    if dedup and corpus is not None:
+        raise ValueError("预分词语料与去重不能同时使用")
+    if auto_k and incremental:
+        raise ValueError("增量模式沿用档案中的星群数量，不能与自动选择同时使用")
+    if dedup:
+        original = signal_list
+        signal_list, groups, dedup_report = SignalDeduplicator().deduplicate(original)
+        duplicate_groups = describe_groups(original, groups)
+        report_stage("去重", len(original), {"重复分组": duplicate_groups})
+
+    count = len(signal_list)
+    if count < 2:
+        return {"成功": False, "信息": "样本过少，无法进行聚类分析。"}
+
+    # 3. 动态调整密度 (自动选择时为候选上界)
+    n_clusters = max(2, min(AUTO_K_MAX if auto_k else 8, count // 10))
+
+    # 4. 声明分析阶段及其依赖，由调度器并发执行
+    #    统计账本 (增量模式下由账本一并完成分词、统计与星群分配) -> 廉价分析；分词 -> 语义分析与结晶
+    def report_done(name: str, value) -> None:
+        if name in DELIVERED_STAGES:
+            report_stage(name, count, {name: value[:PREVIEWS[name]] if name in PREVIEWS else value})
+        else:
+            report_stage(name, count)
+
+    remaining = None if budget is None else max(0.0, budget - (time.perf_counter() - started))
+    scheduler = StageScheduler(remaining, on_done=report_done, checkpoint=report_stage.checkpoint)
+    if incremental:
+        ledger = IncrementalLedger(profile_dir(incremental))
+        scheduler.add("增量对齐", lambda r: ledger.reconcile(signal_list, crystallizer, n_clusters, cluster_engine,
+                                                        preview=None, with_indices=bool(index)))
+        stats_stage = corpus_stage = crystal_stage = "增量对齐"
+        stats_of = lambda r: r["增量对齐"][1]
+        corpus_of = lambda r: r["增量对齐"][0]
+        crystals_of = lambda r: r["增量对齐"][2]
+    else:
+        scheduler.add("统计", lambda r: crystallizer.compute_statistics(signal_list), essential=True)
+        stats_stage, stats_of = "统计", lambda r: r["统计"]
+        if corpus is None:
+            scheduler.add("分词", lambda r: crystallizer.tokenize_corpus(signal_list))
+            corpus_stage, corpus_of = "分词", lambda r: r["分词"]
+        else:
+            corpus_stage, corpus_of = None, lambda r: corpus
+        crystal_stage, crystals_of = "星群结晶", lambda r: r["星群结晶"]
+    needs_corpus = (corpus_stage,) if corpus_stage else ()
+
+    # 5. 廉价分析：只读统计账本，先行交付 (非增量模式下与统计一起作为必达阶段，不受预算约束)
+    cheap = not incremental
+    scheduler.add("时间线", lambda r: crystallizer.analyze_timeline(signal_list, stats_of(r)), (stats_stage,), essential=cheap)
+    scheduler.add("域名领地", lambda r: crystallizer.analyze_domains(signal_list, top_n=None, stats=stats_of(r)),
+                  (stats_stage,), essential=cheap)
+    scheduler.add("活跃时段", lambda r: crystallizer.analyze_activity_hours(signal_list, stats_of(r)), (stats_stage,),
+                  essential=cheap)
+    scheduler.add("技能雷达", lambda r: crystallizer.analyze_skill_radar(signal_list, stats_of(r)), (stats_stage,), essential=cheap)
+
+    # 6. 语义分析 (分词只做一次，所有分析共享同一份语料)
+    scheduler.add("语义星云", lambda r: crystallizer.analyze_tags_cloud(signal_list, top_n=None, corpus=corpus_of(r)),
+                  needs_corpus)
+    scheduler.add("用户画像", lambda r: crystallizer.generate_persona(signal_list, corpus_of(r), stats_of(r)),
+                  tuple(dict.fromkeys(needs_corpus + (stats_stage,))))
+    scheduler.add("兴趣河流", lambda r: crystallizer.analyze_theme_river(signal_list, corpus_of(r), river_top_n,
+                                                                     river_granularity), needs_corpus)
+
+    # 7. 结晶 (最重的阶段；星群体积较大，只随最终结果交付)
+    if auto_k:
+        scheduler.add("星群结晶", lambda r: crystallizer.crystallize_auto(signal_list, corpus_of(r), cluster_engine, n_clusters,
+                                                                       preview=None, with_indices=bool(index)),
+                      needs_corpus)
+        crystals_of = lambda r: r["星群结晶"][0]
+    elif not incremental:
+        scheduler.add("星群结晶", lambda r: crystallizer.crystallize(signal_list, corpus_of(r), cluster_engine, n_clusters,
+                                                                  preview=None, with_indices=bool(index)), needs_corpus)
+
+    # 8. 本地索引 (可选)：逐条星群标签由各星群的成员下标还原
+    def build_index(r) -> None:
+        labels = [-1] * count
+        for crystal in crystals_of(r):
+            for i in crystal["indices"]:
+                labels[i] = crystal["cluster_id"]
+        current = corpus_of(r)
+        BookmarkIndex(index_path(index)).build(signal_list, current.title_tokens, current.tag_tokens, labels,
+                                               [strip_indices(crystal) for crystal in crystals_of(r)])
+
+    if index:
+        scheduler.add("索引", build_index, tuple(dict.fromkeys((crystal_stage,) + needs_corpus)))
+
+    results, unfinished = scheduler.run()
+
+    # 未完成的阶段在 结果 中记为 null，原因见 元数据.调度
+    all_domains = results.get("域名领地")
+    all_words = results.get("语义星云")
+    cluster_crystals = None
+    cluster_members = {}
+    if crystal_stage in results:
+        cluster_crystals = [strip_indices(crystal) for crystal in crystals_of(results)]
+        for crystal in cluster_crystals:
+            cluster_members[str(crystal["cluster_id"])] = crystal["nodes"]
+            crystal["nodes"] = crystal["nodes"][:CLUSTER_PREVIEW]
+
+    selection = results[crystal_stage][1] if auto_k and crystal_stage in results else None
+    metadata = {
+        "信号数量": count,
+        "结晶密度": selection["选定"] if selection else n_clusters
+    }
+    if selection:
+        metadata["星群数量选择"] = selection
+    if incremental and "增量对齐" in results:
+        metadata["增量"] = results["增量对齐"][3]
+    if dedup_report is not None:
+        metadata["去重"] = dedup_report
+    if "索引" in results:
+        metadata["索引"] = {"名称": index, "书签数量": count}
+    if budget is not None:
+        metadata["调度"] = {"预算": f"{budget:.2f}s", "未完成": unfinished}
+
+    payload = {
+        "成功": True,
+        "元数据": metadata,
+        "结果": {
+            "用户画像": results.get("用户画像"),
+            "技能雷达": results.get("技能雷达"),
+            "时间线": results.get("时间线"),
+            "星群结晶": cluster_crystals,
+            "域名领地": all_domains[:DOMAIN_PREVIEW] if all_domains is not None else None,
+            "活跃时段": results.get("活跃时段"),
+            "语义星云": all_words[:CLOUD_PREVIEW] if all_words is not None else None,
+            "兴趣河流": results.get("兴趣河流")
+        },
+        "明细": {
+            "clusters": cluster_members,
+            "domains": all_domains or [],
+            "cloud": all_words or [],
+        },
+    }
+    if duplicate_groups is not None:
+        payload["结果"]["重复分组"] = duplicate_groups
+    return payload
+
+
+def inline_details(payload: dict) -> dict:
+    """取出 明细，把完整的星群成员、域名领地与语义星云折回 结果 (命令行输出没有分页端点)"""
+    details = payload.pop("明细", None)
+    if details is None:
+        return payload
+    results = payload["结果"]
+    for crystal in results["星群结晶"] or []:  # 因延迟预算未完成时为 null
+        crystal["nodes"] = details["clusters"].get(str(crystal["cluster_id"]), crystal["nodes"])
+    if results["域名领地"] is not None:
+        results["域名领地"] = details["domains"]
+    if results["语义星云"] is not None:
+        results["语义星云"] = details["cloud"]
+    return payload
+
+
+def collect_exports(paths: List[str]) -> List[str]:
+    """命令行参数 -> 导出文件列表：目录递归收集可识别的书签导出 (按路径排序)，文件原样保留"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in sorted(os.walk(path)):
+                found.extend(os.path.join(root, n) for n in sorted(names) if accepts(n))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            raise FileNotFoundError(f"❌ [Error] 载体缺失: {path}")
+    return found
+
+
+def main():
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    import codec
+
+    parser = argparse.ArgumentParser(description="Athanor 命令行熔炼：单份导出或整个目录 (多份导出并行解析后合并分析)")
+    parser.add_argument("paths", nargs="+", help="书签导出文件或目录 (目录下的 .html / .html.gz / .html.zst)")
+    parser.add_argument("--out", default="-", help="结果 JSON 的输出路径，- 为标准输出")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="并行解析的进程数")
+    parser.add_argument("--tokenize-workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="大库分词的进程数 (0 或 1 表示在主进程串行分词)")
+    parser.add_argument("--max-mb", type=int, default=int(os.getenv("ATHANOR_MAX_UPLOAD_MB", "200")), help="单份导出的尺寸上限")
+    parser.add_argument("--river-top-n", type=int, default=5)
+    parser.add_argument("--river-granularity", choices=("month", "week"), default="month")
+    parser.add_argument("--cluster-engine", choices=("auto", "full", "minibatch"), default="auto")
+    parser.add_argument("--dedup", action="store_true", help="先做近似去重 (规范 URL + 标题 MinHash/LSH)")
+    parser.add_argument("--auto-k", action="store_true", help="自动选择星群数量 (分层抽样上扫描候选 k)")
+    parser.add_argument("--index", help="写入本地索引 (名称)，之后可通过服务端的 /index 端点查询")
+    args = parser.parse_args()
+
+    files = collect_exports(args.paths)
+    if not files:
+        parser.error("没有找到书签导出 (.html / .html.gz / .html.zst)")
+    max_bytes = args.max_mb * 1024 * 1024
+
+    start = time.perf_counter()
+    workers = min(args.workers, len(files))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            streams = list(pool.map(ingest_export, files, [None] * len(files), [max_bytes] * len(files)))
+    else:
+        streams = [ingest_export(path, None, max_bytes) for path in files]
+    for path, stream in zip(files, streams):
+        print(f"⚗️  [Athanor] {os.path.basename(path)}: {stream.signal_count} 条信号", file=sys.stderr)
+    print(f"📥 [Athanor] 解析完成 ({len(files)} 份, {workers} 个进程) | 耗时: {time.perf_counter() - start:.2f}s",
+          file=sys.stderr)
+
+    merge_report = None
+    if len(streams) > 1:
+        signals, merge_report = merge_exports([s.signals for s in streams])
+        merge_report["文件"] = [{"文件名": os.path.basename(p), "信号数量": s.signal_count} for p, s in zip(files, streams)]
+    else:
+        signals = streams[0].signals
+
+    init_worker({"tokenize_workers": args.tokenize_workers if args.tokenize_workers > 1 else 0})
+    payload = transmute_signals(
+        signals, river_top_n=args.river_top_n, river_granularity=args.river_granularity,
+        cluster_engine=args.cluster_engine, dedup=args.dedup, index=args.index, auto_k=args.auto_k,
+    )
+    if payload["成功"]:
+        inline_details(payload)
+        payload["元数据"].pop("性能", None)
+        if merge_report is not None:
+            payload["元数据"]["合并"] = merge_report
+        print(f"✨ [Athanor] 熔炼完成 | 信号数量: {payload['元数据']['信号数量']} "
+              f"| 总耗时: {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    blob = codec.dumps(payload)
+    if args.out == "-":
+        sys.stdout.buffer.write(blob + b"\n")
+    else:
+        with open(args.out, 'wb') as f:
+            f.write(blob)
+    return 0 if payload["成功"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
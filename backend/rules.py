@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, FrozenSet
+
+# 默认规则书与 analyzer.py 同目录，可通过 ATHANOR_RULES 环境变量替换
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+
+class KeywordAutomaton:
+    """
+    [炼金组件]: 多模式匹配器
+    将 {标签: [关键词]} 编译为一条前缀树正则：每个位置只沿公共前缀向下匹配，
+    一次扫描即可得到命中的全部标签，开销不随维度与关键词数量线性增长。
+
+    前缀树分支是贪婪的，因此每个位置捕获的是"最长"关键词；
+    以它为前缀的较短关键词的标签在编译期就已并入 (前缀闭包)，结果与逐词 `in` 判断一致。
+    """
+
+    def __init__(self, table: Dict[str, List[str]]):
+        self.labels: List[str] = list(table)
+
+        owners: Dict[str, set] = {}
+        for label, keywords in table.items():
+            for kw in keywords:
+                kw = kw.lower()
+                if kw:
+                    owners.setdefault(kw, set()).add(label)
+
+        # 前缀闭包：命中 "github" 时，"git" 所属的标签同样命中
+        self._closure: Dict[str, FrozenSet[str]] = {}
+        for kw in owners:
+            labels = set()
+            for i in range(1, len(kw) + 1):
+                labels |= owners.get(kw[:i], set())
+            self._closure[kw] = frozenset(labels)
+
+        self._pattern = re.compile(f"(?=({self._trie_regex(list(owners))}))") if owners else None
+
+    @staticmethod
+    def _trie_regex(keywords: List[str]) -> str:
+        """将关键词集合折叠为前缀树形式的正则 (例如 git|github|gpt -> g(?:it(?:hub)?|pt))"""
+        trie: Dict[str, Any] = {}
+        for kw in keywords:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[''] = True
+
+        def render(node: Dict[str, Any]) -> str:
+            terminal = '' in node
+            branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            if terminal:
+                return ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+            return body
+
+        return render(trie)
+
+    def scan(self, text: str) -> FrozenSet[str]:
+        """一次扫描 (已小写的) 文本，返回命中的标签集合"""
+        if self._pattern is None:
+            return frozenset()
+        hit: set = set()
+        total = len(self.labels)
+        for match in self._pattern.finditer(text):
+            hit |= self._closure[match.group(1)]
+            if len(hit) == total: # 全部标签已命中，提前结束扫描
+                break
+        return frozenset(hit)
+
+
+class RuleBook:
+    """
+    [炼金组件]: 规则书
+    技能雷达维度与画像规则均为数据驱动，启动时加载并编译一次。
+    """
+
+    def __init__(self, skill_radar: Dict[str, List[str]], persona: Dict[str, List[str]]):
+        self.skill_dimensions = skill_radar
+        self.persona_rules = persona
+        self.radar_matcher = KeywordAutomaton(skill_radar)
+        self.persona_matcher = KeywordAutomaton(persona)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RuleBook":
+        tables = {}
+        for section in ("skill_radar", "persona"):
+            table = data.get(section)
+            if not isinstance(table, dict) or not all(
+                isinstance(v, list) and all(isinstance(k, str) for k in v) for v in table.values()
+            ):
+                raise ValueError(f"规则书格式错误: '{section}' 必须是 {{名称: [关键词, ...]}}")
+            tables[section] = table
+        return cls(tables["skill_radar"], tables["persona"])
+
+
+@lru_cache(maxsize=8)
+def _load_rulebook(path: str) -> RuleBook:
+    with open(path, 'r', encoding='utf-8') as f:
+        return RuleBook.from_dict(json.load(f))
+
+
+def load_rulebook(path: Optional[str] = None) -> RuleBook:
+    """加载 (并缓存) 已编译的规则书；同一路径只编译一次"""
+    return _load_rulebook(os.path.abspath(path or os.getenv("ATHANOR_RULES", DEFAULT_RULES_PATH)))
+
+
+def rulebook_digest(path: Optional[str] = None) -> str:
+    """规则书内容摘要：规则变化会改变分析结果，供结果缓存作为键的一部分"""
+    with open(os.path.abspath(path or os.getenv("ATHANOR_RULES", DEFAULT_RULES_PATH)), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
@@ -0,0 +1,144 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextvars import ContextVar
+from typing import Callable, Dict, Any, List, Optional, Sequence
+
+from telemetry import profiled_thread
+
+# 单次分析内并发执行的阶段数上限 (线程)；设为 1 时退化为按依赖顺序串行执行。
+# 线程只在 numpy / sklearn 释放 GIL 的部分真正并行，纯 Python 的统计与分词并发执行并不会更快
+ANALYSIS_THREADS = int(os.getenv("ATHANOR_ANALYSIS_THREADS", str(min(4, os.cpu_count() or 1))))
+# 等待阶段完成时检查取消标记的间隔 (秒)
+POLL_INTERVAL = 0.2
+
+PENDING = "待定"
+SKIPPED = "跳过"
+
+
+class StageAbandoned(Exception):
+    """所在阶段已被调度器放弃 (超出时间预算)，在检查点处提前结束"""
+
+
+_abandoned: ContextVar[Optional[threading.Event]] = ContextVar("athanor_stage_abandoned", default=None)
+
+
+def _run_stage(func: Callable[[Dict[str, Any]], Any], results: Dict[str, Any]) -> Any:
+    """在阶段线程中执行一个阶段；剖析期间阶段线程登记到本次熔炼的采样剖析器"""
+    with profiled_thread():
+        return func(results)
+
+
+def checkpoint() -> None:
+    """长阶段在循环中调用：所在阶段已被调度器放弃时抛出 StageAbandoned，不再占用 CPU；不在调度器中时无操作"""
+    abandoned = _abandoned.get()
+    if abandoned is not None and abandoned.is_set():
+        raise StageAbandoned("阶段已超出时间预算")
+
+
+class StageScheduler:
+    """
+    [炼金组件]: 阶段调度器
+    按声明的依赖关系执行一组分析阶段：依赖都已完成的阶段立即投递到线程池，互不依赖的阶段并发执行。
+    必达阶段 (essential，如统计类分析) 先行执行，全部完成后才投递其余阶段：既保证廉价结果总能交付，
+    也避免纯 Python 的阶段在线程间争抢 GIL 而互相拖慢。
+    给定 budget (秒，从 run 开始起算) 时，必达阶段不受预算约束；其余阶段到期后不再等待：
+    仍在运行的记为 待定，尚未开始的记为 跳过，各自附带原因，已完成的结果照常返回。
+    线程无法被强行中止：待定阶段在下一个检查点 (checkpoint) 抛出 StageAbandoned 提前结束，
+    检查点之间的部分 (如一次 K-Means 拟合) 仍会跑完，其结果被丢弃。
+    阶段函数接收已完成阶段的结果字典；on_done 在调度线程中按完成顺序调用 (用于汇报进度)，
+    checkpoint 在等待期间周期性调用 (用于响应取消)，两者抛出的异常会中止调度。
+    每个阶段在投递时的上下文副本中运行，阶段记录 (telemetry.stage) 与采样剖析照常归入本次熔炼。
+    """
+
+    def __init__(self, budget: Optional[float] = None, max_workers: int = ANALYSIS_THREADS,
+                 on_done: Optional[Callable[[str, Any], None]] = None,
+                 checkpoint: Optional[Callable[[], None]] = None):
+        self.budget = budget
+        self.max_workers = max(1, max_workers)
+        self.on_done = on_done
+        self.checkpoint = checkpoint
+        self._stages: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._deps: Dict[str, Sequence[str]] = {}
+        self._essential: set = set()
+
+    def add(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Sequence[str] = (),
+            essential: bool = False) -> None:
+        """
+        声明一个阶段；依赖必须是先前声明过的阶段 (声明顺序即同时就绪时的投递顺序)。
+        essential: 必达阶段，不受预算约束，只能依赖必达阶段。
+        """
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"阶段 {name} 依赖未声明的阶段: {dep}")
+            if essential and dep not in self._essential:
+                raise ValueError(f"必达阶段 {name} 依赖非必达阶段: {dep}")
+        self._stages[name] = func
+        self._deps[name] = tuple(deps)
+        if essential:
+            self._essential.add(name)
+
+    def run(self):
+        """执行全部阶段，返回 (结果字典, 未完成阶段 {名称: {"状态", "原因"}})"""
+        deadline = None if self.budget is None else time.perf_counter() + self.budget
+        results: Dict[str, Any] = {}
+        running: Dict[Any, str] = {}
+        started: set = set()
+        abandoned = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="athanor-stage")
+
+        def expired() -> bool:
+            return deadline is not None and time.perf_counter() >= deadline
+
+        def essential_pending() -> bool:
+            return any(name not in results for name in self._essential)
+
+        def submit_ready() -> None:
+            for name, func in self._stages.items():
+                if name in started or not all(dep in results for dep in self._deps[name]):
+                    continue
+                if name not in self._essential and (essential_pending() or expired()):
+                    continue
+                started.add(name)
+                context = contextvars.copy_context()
+                context.run(_abandoned.set, abandoned)
+                running[pool.submit(context.run, _run_stage, func, dict(results))] = name
+
+        try:
+            submit_ready()
+            while running:
+                if self.checkpoint is not None:
+                    self.checkpoint()
+                timeout = POLL_INTERVAL if self.checkpoint is not None else None
+                if deadline is not None and not essential_pending():
+                    remaining = max(0.0, deadline - time.perf_counter())
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    if self.on_done is not None:
+                        self.on_done(name, results[name])
+                if not finished and expired() and not essential_pending():
+                    break
+                submit_ready()
+        finally:
+            # 放弃仍在运行的阶段：它们在下一个检查点结束，结果不再取回
+            abandoned.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return results, self._unfinished(results, running.values())
+
+    def _unfinished(self, results: Dict[str, Any], running) -> Dict[str, Dict[str, str]]:
+        unfinished: Dict[str, Dict[str, str]] = {}
+        for name in running:
+            unfinished[name] = {"状态": PENDING, "原因": "超出时间预算，已放弃 (在下一个检查点停止)"}
+        for name in self._stages:
+            if name in results or name in unfinished:
+                continue
+            blocked: List[str] = [dep for dep in self._deps[name] if dep not in results]
+            reason = f"依赖的阶段未完成: {', '.join(blocked)}" if blocked else "超出时间预算，未开始"
+            unfinished[name] = {"状态": SKIPPED, "原因": reason}
+        return unfinished
@@ -0,0 +1,9 @@
+import os
+
+# Athanor 的本地状态根目录 (词典缓存等)，可通过 ATHANOR_HOME 环境变量覆盖
+ATHANOR_HOME = os.getenv("ATHANOR_HOME", os.path.join(os.path.expanduser("~"), ".athanor"))
+
+
+def home_path(*parts: str) -> str:
+    """拼接本地状态目录下的路径 (不负责创建目录)"""
+    return os.path.join(ATHANOR_HOME, *parts)
@@ -0,0 +1,414 @@
+import calendar
+import time
+from collections.abc import Mapping
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Sequence, TYPE_CHECKING
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    # NumPy 只在构建与计算信号表时按需导入：解析器 (cleaner) 的命令行路径只用到纯 Python 的时间戳函数
+    import numpy as np
+
+# 缺失时间戳的哨兵值 (int64 最小值)
+NO_TIMESTAMP = -2 ** 63
+
+# datetime 可表示的 Unix 秒范围 (公元 1 年 ~ 9999 年)，超出时视为无效时间戳
+_EPOCH_BOUNDS = (-62135596800 + 86400, 253402300799 - 86400)
+
+# 本地时区偏移按 15 分钟分桶计算：时区切换总发生在整刻钟
+_OFFSET_BUCKET = 900
+
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_epoch(ts_str: Optional[str]) -> Optional[int]:
+    """
+    时间戳定标：ADD_DATE 原文 -> Unix 秒。
+    阈值定位于 10^12，兼容 Webkit (微秒) 与 Unix (秒)；无法解析时返回 None。
+    """
+    if not ts_str:
+        return None
+    try:
+        ts = int(ts_str)
+    except (ValueError, TypeError):
+        return None
+    if ts > 10**12:
+        ts //= 1_000_000
+    if not _EPOCH_BOUNDS[0] <= ts <= _EPOCH_BOUNDS[1]:
+        return None
+    return ts
+
+
+def format_epoch(epoch: Optional[int]) -> str:
+    """Unix 秒 -> 本地时间 'YYYY-MM-DD HH:MM:SS' (缺失时为空串)"""
+    if epoch is None or epoch == NO_TIMESTAMP:
+        return ""
+    try:
+        return datetime.fromtimestamp(int(epoch)).strftime(_TIMESTAMP_FORMAT)
+    except (ValueError, OverflowError, OSError):
+        return ""
+
+
+def extract_domain(url: str) -> str:
+    """URL -> 域名 (去掉 www. 前缀)；无法解析时为空串"""
+    try:
+        domain = urlparse(url).netloc
+    except ValueError:
+        return ""
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+def _local_offset(epoch: int) -> int:
+    """指定时刻的本地时区偏移 (秒)"""
+    return calendar.timegm(time.localtime(epoch)[:6]) - epoch
+
+
+class SignalRow(Mapping):
+    """
+    [炼金中间态]: 信号行视图
+    只持有 (表, 行号)，按需从列中取值；行为与旧版信号字典一致 (只读)。
+    """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "SignalTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        table, i = self._table, self._index
+        if key == "title":
+            return table.titles[i]
+        if key == "url":
+            return table.urls[i]
+        if key == "context":
+            return list(table.contexts[table.context_ids[i]])
+        if key == "timestamp":
+            return format_epoch(int(table.epochs[i]))
+        if key == "tags":
+            return list(table.tags[i])
+        if key == "contexts" and table.context_sets is not None:
+            return [list(table.contexts[c]) for c in table.context_sets[i]]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._table.fields)
+
+    def __len__(self) -> int:
+        return len(self._table.fields)
+
+    @property
+    def epoch(self) -> Optional[int]:
+        value = int(self._table.epochs[self._index])
+        return None if value == NO_TIMESTAMP else value
+
+    @property
+    def domain(self) -> str:
+        return self._table.domains[self._table.domain_ids[self._index]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._table.record(self._index)
+
+    def __repr__(self) -> str:
+        return f"SignalRow({self.to_dict()!r})"
+
+
+class SignalTable:
+    """
+    [炼金中间态]: 列式信号表
+    - 标题 / URL：字符串列
+    - 时间戳：int64 Unix 秒 (NumPy 数组，缺失为 NO_TIMESTAMP)
+    - 语境路径 / 域名：驻留 (interned) 为整数 id，相同文件夹与域名只存一份
+    - 标签：元组列 (无标签的行共享同一个空元组)
+    - 语境集合 (可选)：去重合并后每行的全部语境 id，代表信号的记录随之多出 contexts 字段
+    时间线、活跃时段、河流周期都在数组上向量化计算；只有在 API 边界才还原为信号字典。
+    """
+
+    def __init__(self, titles: List[str], urls: List[str], epochs: "np.ndarray",
+                 context_ids: "np.ndarray", contexts: List[Tuple[str, ...]],
+                 domain_ids: "np.ndarray", domains: List[str], tags: List[Tuple[str, ...]],
+                 context_sets: Optional[List[Tuple[int, ...]]] = None):
+        self.titles = titles
+        self.urls = urls
+        self.epochs = epochs
+        self.context_ids = context_ids
+        self.contexts = contexts
+        self.domain_ids = domain_ids
+        self.domains = domains
+        self.tags = tags
+        self.context_sets = context_sets
+        self._local_seconds: Optional["np.ndarray"] = None
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        base = ("title", "url", "context", "timestamp", "tags")
+        return base if self.context_sets is None else base + ("contexts",)
+
+    # --- 序列协议 (兼容旧版 List[Dict]) ---
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __getitem__(self, index: int) -> SignalRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return SignalRow(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield SignalRow(self, i)
+
+    @classmethod
+    def coerce(cls, signals) -> "SignalTable":
+        """信号字典列表 -> 信号表；已经是信号表时原样返回"""
+        return signals if isinstance(signals, cls) else cls.from_records(signals)
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "SignalTable":
+        builder = SignalTableBuilder()
+        for r in records:
+            if isinstance(r, SignalRow):
+                epoch = r.epoch
+            else:
+                ts = r.get('timestamp') or ""
+                try:
+                    epoch = int(time.mktime(time.strptime(ts, _TIMESTAMP_FORMAT))) if ts else None
+                except (ValueError, OverflowError):
+                    epoch = None
+            builder.append(r.get('title', ''), r.get('url', ''), r.get('context', ()), epoch, r.get('tags', ()))
+        return builder.build()
+
+    # --- 序列化 (API 边界) ---
+    def timestamp_strings(self) -> List[str]:
+        """全部时间戳的本地时间字符串 (向量化格式化，缺失为空串)"""
+        import numpy as np
+        valid = self.epochs != NO_TIMESTAMP
+        out = np.full(len(self), "", dtype=object)
+        if valid.any():
+            text = np.datetime_as_string(self.local_seconds()[valid].astype('datetime64[s]'), unit='s')
+            out[valid] = np.char.replace(text, 'T', ' ')
+        return out.tolist()
+
+    def record(self, index: int) -> Dict[str, Any]:
+        record = {
+            "title": self.titles[index],
+            "url": self.urls[index],
+            "context": list(self.contexts[self.context_ids[index]]),
+            "timestamp": format_epoch(int(self.epochs[index])),
+            "tags": list(self.tags[index]),
+        }
+        if self.context_sets is not None:
+            record["contexts"] = [list(self.contexts[c]) for c in self.context_sets[index]]
+        return record
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        timestamps = self.timestamp_strings()
+        contexts = [list(c) for c in self.contexts]
+        records = [
+            {
+                "title": title,
+                "url": url,
+                "context": list(contexts[cid]),
+                "timestamp": ts,
+                "tags": list(tags),
+            }
+            for title, url, cid, ts, tags in zip(self.titles, self.urls, self.context_ids.tolist(), timestamps, self.tags)
+        ]
+        if self.context_sets is not None:
+            for record, ids in zip(records, self.context_sets):
+                record["contexts"] = [list(contexts[c]) for c in ids]
+        return records
+
+    def merge(self, groups: Sequence[Sequence[int]]) -> "SignalTable":
+        """
+        按组合并行，每组产出一行 (组内第一个下标为代表)：
+        标题 / URL / 主语境取代表行；时间戳取组内最早的有效值；语境集合与标签取组内并集 (保持出现顺序)。
+        """
+        import numpy as np
+        reps = np.array([g[0] for g in groups], dtype=np.int64)
+        epochs = self.epochs[reps].copy()
+        context_ids = self.context_ids.tolist()
+        context_sets: List[Tuple[int, ...]] = []
+        tags: List[Tuple[str, ...]] = []
+        for row, group in enumerate(groups):
+            if len(group) == 1:
+                i = group[0]
+                own = self.context_sets[i] if self.context_sets is not None else (context_ids[i],)
+                context_sets.append(own)
+                tags.append(self.tags[i])
+                continue
+            member_epochs = self.epochs[list(group)]
+            member_epochs = member_epochs[member_epochs != NO_TIMESTAMP]
+            if len(member_epochs):
+                epochs[row] = member_epochs.min()
+            merged_contexts: Dict[int, None] = {}
+            merged_tags: Dict[str, None] = {}
+            for i in group:
+                own = self.context_sets[i] if self.context_sets is not None else (context_ids[i],)
+                merged_contexts.update(dict.fromkeys(own))
+                merged_tags.update(dict.fromkeys(self.tags[i]))
+            context_sets.append(tuple(merged_contexts))
+            tags.append(tuple(merged_tags))
+        return SignalTable(
+            titles=[self.titles[i] for i in reps.tolist()],
+            urls=[self.urls[i] for i in reps.tolist()],
+            epochs=epochs,
+            context_ids=self.context_ids[reps],
+            contexts=self.contexts,
+            domain_ids=self.domain_ids[reps],
+            domains=self.domains,
+            tags=tags,
+            context_sets=context_sets,
+        )
+
+    @classmethod
+    def concat(cls, tables: Sequence["SignalTable"]) -> "SignalTable":
+        """
+        按顺序拼接多张信号表 (多份导出)：语境路径与域名重新驻留为统一的 id，
+        id 映射在驻留表上完成 (每张表只遍历一次驻留表)，行数据按数组整体重映射。
+        """
+        import numpy as np
+        contexts: Dict[Tuple[str, ...], int] = {}
+        domains: Dict[str, int] = {}
+        titles: List[str] = []
+        urls: List[str] = []
+        tags: List[Tuple[str, ...]] = []
+        epochs, context_ids, domain_ids = [], [], []
+        with_sets = any(t.context_sets is not None for t in tables)
+        context_sets: List[Tuple[int, ...]] = []
+        for table in tables:
+            context_map = np.array([contexts.setdefault(c, len(contexts)) for c in table.contexts], dtype=np.int32)
+            domain_map = np.array([domains.setdefault(d, len(domains)) for d in table.domains], dtype=np.int32)
+            titles.extend(table.titles)
+            urls.extend(table.urls)
+            tags.extend(table.tags)
+            epochs.append(table.epochs)
+            context_ids.append(context_map[table.context_ids])
+            domain_ids.append(domain_map[table.domain_ids])
+            if with_sets:
+                if table.context_sets is None:
+                    context_sets.extend((int(c),) for c in context_ids[-1].tolist())
+                else:
+                    lookup = context_map.tolist()
+                    context_sets.extend(tuple(lookup[c] for c in ids) for ids in table.context_sets)
+        return cls(
+            titles=titles,
+            urls=urls,
+            epochs=np.concatenate(epochs) if epochs else np.empty(0, dtype=np.int64),
+            context_ids=np.concatenate(context_ids) if context_ids else np.empty(0, dtype=np.int32),
+            contexts=list(contexts),
+            domain_ids=np.concatenate(domain_ids) if domain_ids else np.empty(0, dtype=np.int32),
+            domains=list(domains),
+            tags=tags,
+            context_sets=context_sets if with_sets else None,
+        )
+
+    # --- 向量化的时间视图 ---
+    def local_seconds(self) -> "np.ndarray":
+        """
+        本地挂钟秒数 (Unix 秒 + 当时的 UTC 偏移)，与 datetime.fromtimestamp 的结果一致。
+        偏移只对出现过的 15 分钟时间桶逐个计算一次。缺失时间戳保持 NO_TIMESTAMP。
+        """
+        import numpy as np
+        if self._local_seconds is None:
+            local = self.epochs.copy()
+            valid = local != NO_TIMESTAMP
+            if valid.any():
+                buckets, inverse = np.unique(local[valid] // _OFFSET_BUCKET, return_inverse=True)
+                offsets = np.array([_local_offset(int(b) * _OFFSET_BUCKET) for b in buckets], dtype=np.int64)
+                local[valid] += offsets[inverse]
+            self._local_seconds = local
+        return self._local_seconds
+
+    def period_codes(self, granularity: str = "month") -> Tuple["np.ndarray", List[str]]:
+        """
+        每条信号所属周期的编号 (缺失时间戳为 -1) 及编号对应的标签。
+        month: 'YYYY-MM'；week: ISO 周 'YYYY-Www'；hour: 'HH'
+        """
+        import numpy as np
+        local = self.local_seconds()
+        valid = local != NO_TIMESTAMP
+        codes = np.full(len(self), -1, dtype=np.int64)
+        if not valid.any():
+            return codes, []
+        seconds = local[valid]
+
+        if granularity == "hour":
+            codes[valid] = (seconds // 3600) % 24
+            return codes, [f"{h:02d}" for h in range(24)]
+
+        days = seconds // 86400
+        if granularity == "month":
+            keys = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+            unique, inverse = np.unique(keys, return_inverse=True)
+            labels = [f"{1970 + m // 12:04d}-{m % 12 + 1:02d}" for m in unique.tolist()]
+        elif granularity == "week":
+            # ISO 周：以该周的星期四所在年份为周年 (1970-01-01 是星期四)
+            weekday = (days + 3) % 7
+            thursday = days - weekday + 3
+            year = thursday.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64)
+            jan1 = year.astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+            week = (thursday - jan1) // 7 + 1
+            unique, inverse = np.unique((year + 1970) * 100 + week, return_inverse=True)
+            labels = [f"{k // 100}-W{k % 100:02d}" for k in unique.tolist()]
+        else:
+            raise ValueError(f"未知的周期粒度: {granularity}")
+        codes[valid] = inverse
+        return codes, labels
+
+    def period_histogram(self, granularity: str = "month") -> Dict[str, int]:
+        """按周期计数 (bincount)，只包含出现过的周期"""
+        import numpy as np
+        codes, labels = self.period_codes(granularity)
+        counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+        return {label: int(n) for label, n in zip(labels, counts) if n}
+
+    def domain_histogram(self) -> Dict[str, int]:
+        """按域名计数 (bincount)，空域名不计"""
+        import numpy as np
+        counts = np.bincount(self.domain_ids, minlength=len(self.domains))
+        return {domain: int(n) for domain, n in zip(self.domains, counts) if n and domain}
+
+
+class SignalTableBuilder:
+    """
+    [炼金组件]: 信号表构建器
+    解析器逐条追加信号，语境路径与域名在追加时驻留为 id，结束时一次性转换为数组。
+    """
+
+    def __init__(self):
+        self.titles: List[str] = []
+        self.urls: List[str] = []
+        self.epochs: List[int] = []
+        self.context_ids: List[int] = []
+        self.domain_ids: List[int] = []
+        self.tags: List[Tuple[str, ...]] = []
+        self._contexts: Dict[Tuple[str, ...], int] = {}
+        self._domains: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def append(self, title: str, url: str, context: Sequence[str], epoch: Optional[int], tags: Sequence[str]) -> None:
+        self.titles.append(title)
+        self.urls.append(url)
+        self.epochs.append(NO_TIMESTAMP if epoch is None else epoch)
+        context = tuple(context)
+        self.context_ids.append(self._contexts.setdefault(context, len(self._contexts)))
+        domain = extract_domain(url)
+        self.domain_ids.append(self._domains.setdefault(domain, len(self._domains)))
+        self.tags.append(tuple(tags) if tags else ())
+
+    def build(self) -> SignalTable:
+        import numpy as np
+        return SignalTable(
+            titles=self.titles,
+            urls=self.urls,
+            epochs=np.array(self.epochs, dtype=np.int64),
+            context_ids=np.array(self.context_ids, dtype=np.int32),
+            contexts=list(self._contexts),
+            domain_ids=np.array(self.domain_ids, dtype=np.int32),
+            domains=list(self._domains),
+            tags=self.tags,
+        )
@@ -0,0 +1,188 @@
+import gzip
+import html
+import os
+import random
+import sys
+from typing import List, Dict, Any, Optional, Tuple
+
+# 主题词库：(领域, 站点, 中文词, 英文词)，站点与词汇覆盖规则书中的雷达维度与画像
+THEMES: List[Tuple[str, List[str], List[str], List[str]]] = [
+    ("编程", ["github.com", "stackoverflow.com", "juejin.cn", "docs.python.org"],
+     ["源码", "编程", "教程", "框架", "接口", "调试", "部署", "并发", "数据库", "算法"],
+     ["python", "rust", "api", "git", "docker", "kubernetes", "react", "typescript", "code", "dev"]),
+    ("人工智能", ["arxiv.org", "huggingface.co", "openai.com", "paperswithcode.com"],
+     ["机器学习", "深度学习", "模型", "训练", "推理", "数据集", "论文", "大模型", "向量", "微调"],
+     ["transformer", "gpt", "model", "learning", "deep", "diffusion", "embedding", "llm", "agent", "bot"]),
+    ("设计", ["figma.com", "dribbble.com", "www.behance.net", "www.notion.so"],
+     ["设计", "配色", "字体", "交互", "原型", "组件", "排版", "图标", "灵感", "规范"],
+     ["design", "ui", "ux", "typography", "prototype", "icon", "palette", "layout", "figma", "system"]),
+    ("影音", ["www.bilibili.com", "www.youtube.com", "movie.douban.com", "open.spotify.com"],
+     ["音乐", "电影", "纪录片", "番剧", "播客", "演唱会", "剪辑", "配乐", "专辑", "影评"],
+     ["music", "video", "movie", "podcast", "album", "playlist", "trailer", "live", "review", "film"]),
+    ("学术", ["scholar.google.com", "www.nature.com", "en.wikipedia.org", "mit.edu"],
+     ["论文", "研究", "综述", "课程", "讲义", "实验", "统计", "物理", "数学", "读书"],
+     ["paper", "research", "survey", "lecture", "science", "university", "wiki", "book", "theory", "study"]),
+    ("生活", ["www.jd.com", "www.taobao.com", "www.zhihu.com", "medium.com"],
+     ["美食", "旅行", "攻略", "菜谱", "租房", "健身", "理财", "咖啡", "摄影", "新闻"],
+     ["food", "travel", "guide", "recipe", "fitness", "finance", "coffee", "photo", "news", "blog"]),
+]
+
+# 浏览器导出常见的根文件夹 (解析器会把它们当作噪音剔除)
+ROOT_FOLDERS = ["书签栏", "Bookmarks Bar", "其他书签", "Other Bookmarks"]
+SUBFOLDER_WORDS = ["收藏", "待读", "归档", "精选", "工具", "参考", "Reading", "Tools", "Archive", "Later"]
+
+# 时间跨度：2012-01-01 至 2025-01-01 (Unix 秒)
+_TIME_RANGE = (1325376000, 1735689600)
+
+
+class ExportSynthesizer:
+    """
+    [炼金组件]: 合成书签导出
+    按给定规模生成 Netscape 书签 HTML，用于基准测试与本地演示。相同参数与种子的输出逐字节一致。
+
+    size:            链接数量 (书签条数，含重复)
+    max_depth:       文件夹最大嵌套深度
+    zh_ratio:        中文标题占比 (其余为英文，少量中英混排)
+    duplicate_rate:  重复收藏比例 (同一 URL 再次出现，标题/文件夹可能不同)
+    webkit_ratio:    ADD_DATE 以微秒 (Webkit 风格) 记录的比例，其余为 Unix 秒；另有少量缺失
+    malformed_rate:  畸形标记比例 (未闭合 A、缺失 </DL>、未加引号的属性、空标题、无效协议等)
+    tag_ratio:       携带 TAGS 属性的书签比例
+    """
+
+    def __init__(self, size: int = 1000, max_depth: int = 4, zh_ratio: float = 0.5, duplicate_rate: float = 0.05,
+                 webkit_ratio: float = 0.3, malformed_rate: float = 0.0, tag_ratio: float = 0.1, seed: int = 42):
+        self.size = size
+        self.max_depth = max_depth
+        self.zh_ratio = zh_ratio
+        self.duplicate_rate = duplicate_rate
+        self.webkit_ratio = webkit_ratio
+        self.malformed_rate = malformed_rate
+        self.tag_ratio = tag_ratio
+        self.seed = seed
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "size": self.size, "max_depth": self.max_depth, "zh_ratio": self.zh_ratio,
+            "duplicate_rate": self.duplicate_rate, "webkit_ratio": self.webkit_ratio,
+            "malformed_rate": self.malformed_rate, "tag_ratio": self.tag_ratio, "seed": self.seed,
+        }
+
+    def _title(self, rng: random.Random, theme) -> str:
+        _, _, zh, en = theme
+        roll = rng.random()
+        if roll < self.zh_ratio * 0.8:
+            words = rng.sample(zh, rng.randint(2, 4))
+            return "".join(words) if rng.random() < 0.5 else " ".join(words)
+        if roll < self.zh_ratio:
+            # 中英混排，例如 "Python 并发 教程"
+            return " ".join([rng.choice(en).capitalize(), *rng.sample(zh, 2)])
+        return " ".join(w.capitalize() if i == 0 else w for i, w in enumerate(rng.sample(en, rng.randint(2, 5))))
+
+    def _timestamp(self, rng: random.Random) -> Optional[str]:
+        roll = rng.random()
+        if roll < 0.02:
+            return None
+        ts = rng.randint(*_TIME_RANGE)
+        if roll < 0.02 + self.webkit_ratio:
+            return str(ts * 1_000_000 + rng.randint(0, 999_999))
+        return str(ts)
+
+    def _link(self, rng: random.Random, signal: Dict[str, Any], indent: str) -> str:
+        attrs = [f'HREF="{html.escape(signal["url"])}"']
+        if signal["timestamp"] is not None:
+            attrs.append(f'ADD_DATE="{signal["timestamp"]}"')
+        if signal["tags"]:
+            attrs.append(f'TAGS="{",".join(signal["tags"])}"')
+        title = html.escape(signal["title"], quote=False)
+
+        if rng.random() < self.malformed_rate:
+            kind = rng.randrange(5)
+            if kind == 0:  # 未闭合的 A
+                return f'{indent}<DT><A {" ".join(attrs)}>{title}'
+            if kind == 1:  # 未加引号的属性 + 小写标签
+                return f'{indent}<dt><a href={signal["url"]} add_date={signal["timestamp"] or 0}>{title}</a>'
+            if kind == 2:  # 空标题
+                return f'{indent}<DT><A {" ".join(attrs)}></A>'
+            if kind == 3:  # 无效协议 (应被过滤)
+                return f'{indent}<DT><A HREF="javascript:void(0)">{title}</A>'
+            return f'{indent}<DT><A {" ".join(attrs)} ICON="data:image/png;base64,iVBORw0KGgo=">{title}</A></DT><p>'
+        return f'{indent}<DT><A {" ".join(attrs)}>{title}</A>'
+
+    def generate(self) -> str:
+        rng = random.Random(self.seed)
+        lines = [
+            "<!DOCTYPE NETSCAPE-Bookmark-file-1>",
+            "<!-- This is an automatically generated file.",
+            "     It will be read and overwritten.",
+            "     DO NOT EDIT! -->",
+            '<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">',
+            "<TITLE>Bookmarks</TITLE>",
+            "<H1>Bookmarks</H1>",
+            "<DL><p>",
+            f'    <DT><H3 ADD_DATE="{_TIME_RANGE[0]}" PERSONAL_TOOLBAR_FOLDER="true">{rng.choice(ROOT_FOLDERS)}</H3>',
+            "    <DL><p>",
+        ]
+        depth = 1
+        theme = rng.choice(THEMES)
+        emitted: List[Dict[str, Any]] = []
+
+        for i in range(self.size):
+            # 文件夹结构：随机下潜 / 上浮，下潜时切换主题
+            roll = rng.random()
+            if roll < 0.04 and depth < self.max_depth:
+                theme = rng.choice(THEMES)
+                name = theme[0] if depth == 1 else f"{rng.choice(SUBFOLDER_WORDS)} {i % 100}"
+                indent = "    " * depth
+                lines.append(f'{indent}<DT><H3 ADD_DATE="{rng.randint(*_TIME_RANGE)}">{name}</H3>')
+                lines.append(f"{indent}<DL><p>")
+                depth += 1
+            elif roll < 0.07 and depth > 1:
+                depth -= 1
+                if rng.random() >= self.malformed_rate:  # 畸形：遗漏 </DL>
+                    lines.append("    " * depth + "</DL><p>")
+
+            if emitted and rng.random() < self.duplicate_rate:
+                original = rng.choice(emitted)
+                signal = dict(original)
+                if rng.random() < 0.5:
+                    signal["title"] = self._title(rng, theme)
+                signal["timestamp"] = self._timestamp(rng)
+            else:
+                site = rng.choice(theme[1])
+                slug = "-".join(rng.sample(theme[3], 2))
+                signal = {
+                    "title": self._title(rng, theme),
+                    "url": f"https://{site}/{slug}/{i}" + ("?utm_source=share" if rng.random() < 0.1 else ""),
+                    "timestamp": self._timestamp(rng),
+                    "tags": rng.sample(theme[3], 2) if rng.random() < self.tag_ratio else [],
+                }
+                emitted.append(signal)
+            lines.append(self._link(rng, signal, "    " * depth))
+
+        while depth > 0:
+            depth -= 1
+            lines.append("    " * depth + "</DL><p>")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> str:
+        """写出合成导出 (路径以 .gz 结尾时写出 gzip 压缩文件)"""
+        data = self.generate().encode('utf-8')
+        if path.endswith(".gz"):
+            data = gzip.compress(data, mtime=0)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+
+def main():
+    # 用法: python synthetic.py <链接数量> <输出路径> [畸形比例]
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    out = sys.argv[2] if len(sys.argv) > 2 else f"synthetic_{size}.html"
+    malformed = float(sys.argv[3]) if len(sys.argv) > 3 else float(os.getenv("ATHANOR_MALFORMED", "0"))
+    synth = ExportSynthesizer(size=size, malformed_rate=malformed)
+    synth.write(out)
+    print(f"🧪 [Synthesizer] 已生成 {size} 条书签 -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Tuple
+
+from settings import home_path
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，峰值内存增量记为 None
+    resource = None
+
+# 慢请求阈值 (毫秒)：大于 0 时对每次熔炼做低频采样，超过阈值才落盘剖析结果
+PROFILE_SLOW_MS = float(os.getenv("ATHANOR_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL = float(os.getenv("ATHANOR_PROFILE_INTERVAL_MS", "5")) / 1000
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """进程峰值常驻内存 (ru_maxrss 在 Linux 上以 KB 计，在 macOS 上以字节计)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageRecorder:
+    """
+    [炼金组件]: 阶段记录器
+    记录每个阶段的墙钟时间、CPU 时间 (当前线程)、进程峰值内存增量与输入/输出条数。
+    阶段可以嵌套，名称按层级以 "/" 连接 (例如 crystallize/fit_clusters/tfidf)。
+    嵌套栈按线程区分：调度器并发执行的阶段各自从顶层开始计名，互不串层。
+    """
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self._local = threading.local()
+
+    @property
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def stage(self, name: str, items: Optional[int] = None):
+        self._stack.append(name)
+        record: Dict[str, Any] = {"阶段": "/".join(self._stack), "输入": items, "输出": None}
+        rss_before = _peak_rss_bytes()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            record["墙钟ms"] = round((time.perf_counter() - wall_start) * 1000, 3)
+            record["CPUms"] = round((time.thread_time() - cpu_start) * 1000, 3)
+            rss_after = _peak_rss_bytes()
+            record["峰值内存增量KB"] = (rss_after - rss_before) // 1024 if rss_before is not None else None
+            self._stack.pop()
+            self.records.append(record)
+
+
+_current: ContextVar[Optional[StageRecorder]] = ContextVar("athanor_stage_recorder", default=None)
+
+
+@contextmanager
+def recording():
+    """在当前上下文中启用阶段记录 (每次熔炼一个记录器，并发请求互不干扰)"""
+    recorder = StageRecorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str, items: Optional[int] = None):
+    """记录一个阶段；当前上下文没有记录器时退化为空操作"""
+    recorder = _current.get()
+    if recorder is None:
+        yield {}
+        return
+    with recorder.stage(name, items) as record:
+        yield record
+
+
+def _count(value) -> Optional[int]:
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def instrumented(name: str):
+    """
+    方法装饰器：把一次调用记为一个阶段。
+    输入条数取第一个位置参数的长度 (通常是书签列表)，输出条数取返回值的长度。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if _current.get() is None:
+                return func(self, *args, **kwargs)
+            with stage(name, _count(args[0]) if args else None) as record:
+                result = func(self, *args, **kwargs)
+                record["输出"] = _count(result)
+                return result
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    """
+    [炼金组件]: 采样剖析器
+    后台线程按固定间隔抓取登记线程的调用栈 (sys._current_frames)，
+    聚合为 folded 格式 ("根;...;叶 次数")，可直接交给 flamegraph.pl / speedscope。
+    启动线程自动登记；剖析期间调度器的阶段线程经 profiled_thread 登记，各线程的调用栈合并计数。
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._targets: Counter = Counter()
+        self._targets_lock = threading.Lock()
+        self._token = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def attach(self) -> None:
+        """登记当前线程 (可嵌套，与 detach 成对调用)"""
+        with self._targets_lock:
+            self._targets[threading.get_ident()] += 1
+
+    def detach(self) -> None:
+        with self._targets_lock:
+            ident = threading.get_ident()
+            self._targets[ident] -= 1
+            if self._targets[ident] <= 0:
+                del self._targets[ident]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._targets_lock:
+                targets = list(self._targets)
+            frames = sys._current_frames()
+            for ident in targets:
+                frame = frames.get(ident)
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(self._frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.samples[tuple(reversed(stack))] += 1
+
+    def start(self) -> "SamplingProfiler":
+        """开始采样调用本方法的线程，并在当前上下文中登记为活动剖析器 (stop 须在同一上下文中调用)"""
+        self.attach()
+        self._token = _profiler.set(self)
+        self._thread = threading.Thread(target=self._run, name="athanor-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._token is not None:
+            _profiler.reset(self._token)
+            self._token = None
+        self.detach()
+
+    def folded(self) -> str:
+        return "\n".join(f"{';'.join(stack)} {n}" for stack, n in self.samples.most_common())
+
+    def dump(self, directory: Optional[str] = None) -> str:
+        """写出 folded 剖析文件，返回路径 (默认 ATHANOR_HOME/profiles)"""
+        directory = directory or home_path("profiles")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.folded())
+        return path
+
+
+_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar("athanor_sampling_profiler", default=None)
+
+
+@contextmanager
+def profiled_thread():
+    """把当前线程登记到本上下文的采样剖析器 (供阶段线程使用)；没有活动剖析器时为空操作"""
+    profiler = _profiler.get()
+    if profiler is None:
+        yield
+        return
+    profiler.attach()
+    try:
+        yield
+    finally:
+        profiler.detach()
+
+
+class Histogram:
+    """Prometheus 直方图：累计桶 + 总和 + 计数，按标签值分组"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[str, List[float]] = {}
+
+    def observe(self, label: str, value: float) -> None:
+        series = self._series.setdefault(label, [0.0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label, series in sorted(self._series.items()):
+            for bound, n in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{stage="{label}",le="{bound:g}"}} {n:g}')
+            lines.append(f'{self.name}_bucket{{stage="{label}",le="+Inf"}} {series[-1]:g}')
+            lines.append(f'{self.name}_sum{{stage="{label}"}} {series[-2]:g}')
+            lines.append(f'{self.name}_count{{stage="{label}"}} {series[-1]:g}')
+        return lines
+
+
+_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_BYTES_BUCKETS = tuple(float(2 ** p) for p in range(16, 34, 2))  # 64 KB … 4 GB
+_ITEMS_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+class MetricsRegistry:
+    """
+    [炼金组件]: 指标注册表 (主进程)
+    汇总各执行单元回传的阶段记录与缓存计数，按 Prometheus 文本格式导出。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wall = Histogram("athanor_stage_wall_seconds", "Wall-clock time per pipeline stage.", _SECONDS_BUCKETS)
+        self.cpu = Histogram("athanor_stage_cpu_seconds", "CPU time per pipeline stage (stage thread).", _SECONDS_BUCKETS)
+        self.memory = Histogram("athanor_stage_peak_memory_delta_bytes", "Growth of the process peak RSS during a stage.", _BYTES_BUCKETS)
+        self.items = Histogram("athanor_stage_input_items", "Input items per pipeline stage.", _ITEMS_BUCKETS)
+        self.cache_counts: Counter = Counter()
+        self.counters: Counter = Counter()
+
+    def observe(self, records: List[Dict[str, Any]], caches: Optional[Dict[str, Dict[str, int]]] = None) -> None:
+        with self._lock:
+            for record in records:
+                name = record["阶段"]
+                self.wall.observe(name, record["墙钟ms"] / 1000)
+                self.cpu.observe(name, record["CPUms"] / 1000)
+                if record.get("峰值内存增量KB") is not None:
+                    self.memory.observe(name, record["峰值内存增量KB"] * 1024)
+                if record.get("输入") is not None:
+                    self.items.observe(name, record["输入"])
+            for cache, counts in (caches or {}).items():
+                self.cache_counts[(cache, "hits")] += counts.get("hits", 0)
+                self.cache_counts[(cache, "misses")] += counts.get("misses", 0)
+
+    def count(self, name: str, labels: str = "", n: int = 1) -> None:
+        with self._lock:
+            self.counters[(name, labels)] += n
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        with self._lock:
+            lines: List[str] = []
+            for histogram in (self.wall, self.cpu, self.memory, self.items):
+                lines.extend(histogram.render())
+
+            cache_names = sorted({cache for cache, _ in self.cache_counts})
+            for kind in ("hits", "misses") if cache_names else ():
+                metric = f"athanor_cache_{kind}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for cache in cache_names:
+                    lines.append(f'{metric}{{cache="{cache}"}} {self.cache_counts[(cache, kind)]}')
+
+            previous = None
+            for (name, labels), value in sorted(self.counters.items()):
+                if name != previous:
+                    lines.append(f"# TYPE {name} counter")
+                    previous = name
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+            for name, value in sorted((gauges or {}).items()):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
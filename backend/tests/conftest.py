@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 测试使用独立的本地状态目录与单进程执行后端 (settings / main 在导入时读取环境变量)
+os.environ["ATHANOR_HOME"] = tempfile.mkdtemp(prefix="athanor-test-")
+os.environ.setdefault("ATHANOR_WORKERS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import ExportSynthesizer  # noqa: E402
+
+
+def synthesize(size: int = 1000, **options) -> bytes:
+    """合成一份书签导出 (相同参数的输出逐字节一致)"""
+    return ExportSynthesizer(size=size, **options).generate().encode('utf-8')
+
+
+@pytest.fixture(scope="session")
+def crystallizer():
+    """整个测试会话共享一个结晶器 (jieba 词典只加载一次)"""
+    from analyzer import KnowledgeCrystallizer
+    return KnowledgeCrystallizer()
@@ -0,0 +1,59 @@
+import gzip
+
+import pytest
+
+import bench
+from cleaner import AthanorPurifier
+from synthetic import ExportSynthesizer
+
+
+def test_generator_is_deterministic(tmp_path):
+    synth = ExportSynthesizer(size=400, seed=7)
+    assert synth.generate() == ExportSynthesizer(size=400, seed=7).generate()
+    assert synth.generate() != ExportSynthesizer(size=400, seed=8).generate()
+    synth.write(str(tmp_path / "a.html.gz")), synth.write(str(tmp_path / "b.html.gz"))
+    packed = (tmp_path / "a.html.gz").read_bytes()
+    assert packed == (tmp_path / "b.html.gz").read_bytes()
+    assert gzip.decompress(packed).decode("utf-8") == synth.generate()
+
+
+def test_generator_shape():
+    purifier = AthanorPurifier()
+    clean = purifier.smelt(ExportSynthesizer(size=1000, duplicate_rate=0.2, seed=7).generate().encode("utf-8"))
+    assert len(clean) == 1000
+    assert 0.1 < 1 - len({s["url"] for s in clean}) / len(clean) < 0.3
+    assert any(s["context"] for s in clean) and any(s["tags"] for s in clean)
+
+    malformed = purifier.smelt(ExportSynthesizer(size=1000, malformed_rate=0.2, seed=7).generate().encode("utf-8"))
+    assert 900 < len(malformed) < 1000  # 无效协议的链接被过滤
+
+
+def test_compare_flags_only_real_regressions():
+    def report(seconds, peak_kb):
+        return {"results": {"1000": {"case": {"seconds": seconds, "peak_kb": peak_kb}}}}
+
+    assert bench.compare(report(0.1, 10_000), report(0.2, 10_000), 0.15)[0]["time_ratio"] == 2.0
+    assert bench.compare(report(0.1, 10_000), report(0.1, 20_000), 0.15)[0]["memory_ratio"] == 2.0
+    assert bench.compare(report(0.001, 100), report(0.003, 300), 0.15) == []  # 低于噪音下限
+    assert bench.compare(report(0.1, 10_000), report(0.11, 10_000), 0.15) == []
+
+
+def test_suite_runs_selected_cases():
+    report = bench.run_suite([200], repeat=1, endpoint=False, only=["smelt_table", "compute_statistics"],
+                             synth_options={"seed": 1})
+    assert set(report["results"]["200"]) == {"smelt_table", "compute_statistics"}
+    assert report["meta"]["generator"] == {"seed": 1}
+
+
+def test_endpoint_case_gives_up_on_a_stuck_warm_up(monkeypatch):
+    import main
+
+    async def never_ready():
+        pass
+
+    monkeypatch.setattr(main, "warm_up_backend", never_ready)
+    monkeypatch.setitem(main.warm_up_state, "就绪", False)
+    monkeypatch.setattr(bench, "WARM_UP_TIMEOUT", 0.3)
+    with pytest.raises(RuntimeError):
+        bench._endpoint_case(b"")
+    assert bench._client is None
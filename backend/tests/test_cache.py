@@ -0,0 +1,50 @@
+from fastapi.testclient import TestClient
+
+import codec
+import main
+from cache import ResultCache
+from conftest import synthesize
+
+
+def blob_size(payload):
+    return len(codec.dumps(payload))
+
+
+def test_memory_layer_evicts_least_recently_used():
+    payload = {"结果": "x" * 100}
+    cache = ResultCache(max_bytes=blob_size(payload) * 2)
+    cache.put("a", payload), cache.put("b", payload)
+    assert cache.get("a") == payload
+    cache.put("c", payload)
+    assert cache.get("b") is None and cache.get("a") == payload and cache.get("c") == payload
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_layer_survives_restart(tmp_path):
+    payload = {"结果": "y" * 100}
+    cache = ResultCache(disk_dir=str(tmp_path), disk_max_bytes=blob_size(payload) * 2)
+    for key in ("a", "b", "c"):
+        cache.put(key, payload)
+    reopened = ResultCache(disk_dir=str(tmp_path))
+    assert reopened.get("a") is None
+    assert reopened.get("c") == payload and reopened.stats()["disk_hits"] == 1
+
+
+def test_key_covers_content_version_and_params():
+    key = ResultCache.make_key("digest", "v1", {"river_top_n": 5, "auto_k": False})
+    assert key == ResultCache.make_key("digest", "v1", {"auto_k": False, "river_top_n": 5})
+    assert key != ResultCache.make_key("other", "v1", {"river_top_n": 5, "auto_k": False})
+    assert key != ResultCache.make_key("digest", "v2", {"river_top_n": 5, "auto_k": False})
+    assert key != ResultCache.make_key("digest", "v1", {"river_top_n": 6, "auto_k": False})
+
+
+def test_transmute_reuses_cached_results():
+    raw = synthesize(300, seed=21)
+    upload = {"file": ("bookmarks.html", raw)}
+    with TestClient(main.app) as client:
+        assert not client.post("/transmute", files=upload).json()["元数据"]["缓存命中"]
+        assert client.post("/transmute", files=upload).json()["元数据"]["缓存命中"]
+        other = client.post("/transmute", params={"river_top_n": 3}, files=upload).json()
+        assert not other["元数据"]["缓存命中"]
+        assert client.delete("/cache").json()["已清除"]["memory"] > 0
+        assert not client.post("/transmute", files=upload).json()["元数据"]["缓存命中"]
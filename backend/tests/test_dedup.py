@@ -0,0 +1,52 @@
+import numpy as np
+
+import pipeline
+from conftest import synthesize
+from dedup import MinHasher, SignalDeduplicator, canonical_url
+from signals import SignalTableBuilder
+
+
+def table_of(rows):
+    builder = SignalTableBuilder()
+    for title, url in rows:
+        builder.append(title, url, (), None, ())
+    return builder.build()
+
+
+def test_canonical_url_strips_only_known_tracking_keys():
+    assert canonical_url("https://Example.com/a/?utm_source=x&fbclid=1&id=3") == canonical_url("https://example.com/a?id=3")
+    for key in ("from", "source", "ref", "ts", "timestamp", "si"):
+        assert canonical_url(f"https://example.com/a?{key}=1") != canonical_url("https://example.com/a"), key
+
+
+def test_edited_title_on_another_site_is_merged():
+    signals = table_of([
+        ("深入理解 Rust 所有权与借用机制 - 知乎", "https://zhuanlan.zhihu.com/p/1"),
+        ("深入理解 Rust 所有权与借用机制｜博客园", "https://www.cnblogs.com/x/p/2.html"),
+        ("Python 教程 第 3 章 - 菜鸟", "https://a.com/3"),
+        ("Python 教程 第 4 章 - 菜鸟", "https://a.com/4"),
+    ])
+    _, groups, report = SignalDeduplicator().deduplicate(signals)
+    assert groups == [[0, 1]]
+    assert report["近似归并"] == 1
+
+
+def test_generic_titles_are_not_merged():
+    signals = table_of([("Untitled document - Google Docs", f"https://docs.google.com/d/{i}") for i in range(10)])
+    _, groups, _ = SignalDeduplicator().deduplicate(signals)
+    assert groups == []
+
+
+def test_minhash_estimate_is_unbiased():
+    words = [f"w{i}" for i in range(60)]
+    documents = [words[:40], words[20:]]  # 真实 Jaccard = 20 / 60
+    estimates = []
+    for seed in range(20):
+        signature = MinHasher(num_perm=64, seed=seed).signatures(documents)
+        estimates.append((signature[0] == signature[1]).mean())
+    assert abs(np.mean(estimates) - 1 / 3) < 0.05
+
+
+def test_pipeline_does_not_dedup_by_default():
+    result = pipeline.transmute(synthesize(400, seed=5))
+    assert "去重" not in result["元数据"]
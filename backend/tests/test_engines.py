@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from analyzer import KnowledgeCrystallizer
+from cleaner import AthanorPurifier
+from conftest import synthesize
+
+
+@pytest.fixture(scope="module")
+def signals():
+    return AthanorPurifier().smelt_table(synthesize(3000, seed=2))
+
+
+def test_auto_engine_switches_at_threshold(signals):
+    crystallizer = KnowledgeCrystallizer(n_clusters=6, chunk_size=512, large_corpus_threshold=1000)
+    corpus = crystallizer.tokenize_corpus(signals)
+    model, valid, labels = crystallizer.fit_clusters(signals, corpus)
+    assert model.engine == "minibatch"
+    assert len(labels) == len(valid) and set(labels.tolist()) <= set(range(6))
+    small = crystallizer.fit_clusters(AthanorPurifier().smelt(synthesize(300)))
+    assert small[0].engine == "full"
+
+
+def test_hashed_idf_matches_tfidf(signals):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    crystallizer = KnowledgeCrystallizer(n_clusters=6, chunk_size=512)
+    corpus = crystallizer.tokenize_corpus(signals)
+    _, documents = crystallizer.select_documents(corpus)
+    model, _, _ = crystallizer.fit_clusters(signals, corpus, engine="minibatch")
+    tfidf = TfidfVectorizer(token_pattern=crystallizer.TOKEN_PATTERN).fit(documents)
+    terms = tfidf.get_feature_names_out()
+    columns = model.vectorizer.transform(list(terms)).indices
+    unique = [i for i, n in enumerate(np.bincount(columns)[columns]) if n == 1]  # 跳过哈希碰撞的列
+    assert len(unique) > len(terms) * 0.9
+    np.testing.assert_allclose(model.idf[columns[unique]], tfidf.idf_[unique])
+
+
+def test_minibatch_crystals_cover_every_document(signals):
+    crystallizer = KnowledgeCrystallizer(n_clusters=6, chunk_size=512)
+    corpus = crystallizer.tokenize_corpus(signals)
+    valid, _ = crystallizer.select_documents(corpus)
+    crystals = crystallizer.crystallize(signals, corpus, engine="minibatch", with_indices=True)
+    assert sorted(i for c in crystals for i in c["indices"]) == valid
+    words = {w.lower() for w in corpus.word_counts}
+    assert all(k in words for c in crystals for k in c["keywords"])
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+import pipeline
+from cleaner import AthanorPurifier
+from conftest import synthesize
+from incremental import IncrementalLedger, diff_signals, profile_dir, profile_lock
+
+
+def edited_export() -> bytes:
+    """在基准导出上删掉一部分链接、插入另一批新链接"""
+    lines = synthesize(1500, seed=1).decode('utf-8').splitlines()
+    links = [i for i, line in enumerate(lines) if "<A HREF" in line.upper()]
+    extra = [line for line in synthesize(300, seed=9).decode('utf-8').splitlines() if "<A HREF" in line.upper()][:60]
+    for i in sorted(links[5:200:4], reverse=True):
+        del lines[i]
+    lines[links[300]:links[300]] = extra
+    return "\n".join(lines).encode('utf-8')
+
+
+def test_diff_signals_pairs_exact_content_first():
+    previous = [("u1", "a", 1, ()), ("u1", "b", 2, ()), ("u2", "c", 3, ())]
+    current = [("u1", "b", 2, ()), ("u1", "a2", 1, ()), ("u3", "d", 4, ())]
+    matches, removed = diff_signals(previous, current)
+    assert matches == [1, 0, None]
+    assert removed == [2]
+
+
+def test_incremental_matches_full_pipeline():
+    baseline, edited = synthesize(1500, seed=1), edited_export()
+    first = pipeline.transmute(baseline, incremental="parity", dedup=False)
+    assert first["元数据"]["增量"]["模式"] == "initial"
+
+    for _ in range(2):  # 第二次是未变化的同一份导出
+        patched = pipeline.transmute(edited, incremental="parity", dedup=False)
+        full = pipeline.transmute(edited, dedup=False)
+        assert patched["元数据"]["增量"]["模式"] == "patch"
+        for key, value in full["结果"].items():
+            if key != "星群结晶":  # patch 模式沿用既有重心，星群划分本就不同于重新拟合
+                assert patched["结果"][key] == value, key
+
+
+def test_unchanged_export_writes_nothing():
+    raw = synthesize(600, seed=3)
+    pipeline.transmute(raw, incremental="still", dedup=False)
+    state_dir = profile_dir("still")
+    before = {name: os.stat(os.path.join(state_dir, name)).st_mtime_ns for name in ("state.sqlite3", "model.joblib")}
+    time.sleep(0.05)
+    again = pipeline.transmute(raw, incremental="still", dedup=False)
+    assert again["元数据"]["增量"]["重新分词"] == 0
+    after = {name: os.stat(os.path.join(state_dir, name)).st_mtime_ns for name in before}
+    assert after == before
+
+
+def test_reconcile_waits_for_profile_lock(crystallizer):
+    ledger = IncrementalLedger(profile_dir("locked"))
+    signals = AthanorPurifier().smelt_table(synthesize(200, seed=4))
+    done = threading.Event()
+
+    def reconcile():
+        ledger.reconcile(signals, crystallizer, 4)
+        done.set()
+
+    with profile_lock(ledger._lock_path):
+        worker = threading.Thread(target=reconcile)
+        worker.start()
+        assert not done.wait(0.5)
+    worker.join(60)
+    assert done.is_set()
@@ -0,0 +1,32 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import synthesize
+from index import parse_time_bound
+
+
+def local(year, month, day):
+    return int(time.mktime((year, month, day, 0, 0, 0, 0, 0, -1)))
+
+
+def test_time_bounds_cover_whole_periods():
+    assert parse_time_bound("2023") == local(2023, 1, 1)
+    assert parse_time_bound("2023", upper=True) == local(2024, 1, 1)
+    assert parse_time_bound("2023-12", upper=True) == local(2024, 1, 1)
+    assert parse_time_bound("2023-02-28", upper=True) == local(2023, 3, 1)
+
+
+@pytest.mark.parametrize("text", ["2023-13", "2023-00", "2023-02-30", "2023-04-31", "2023-1-1-1", "soon"])
+def test_out_of_range_dates_are_rejected(text):
+    with pytest.raises(ValueError):
+        parse_time_bound(text)
+
+
+def test_search_with_bad_date_returns_422():
+    with TestClient(main.app) as client:
+        client.post("/transmute", params={"index": "dates"}, files={"file": ("bookmarks.html", synthesize(200))})
+        assert client.get("/index/dates/bookmarks", params={"since": "2023-13"}).status_code == 422
+        assert client.get("/index/dates/bookmarks", params={"since": "2023-12"}).status_code == 200
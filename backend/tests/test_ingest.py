@@ -0,0 +1,82 @@
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cleaner import AthanorPurifier
+from conftest import synthesize
+from ingest import IngestError, SignalStream, read_export
+
+MB = 1024 * 1024
+
+
+def test_tiny_chunks_match_whole_file_parsing():
+    raw = synthesize(300, seed=12, malformed_rate=0.05)
+    purifier = AthanorPurifier()
+    stream = SignalStream(purifier, max_bytes=MB * 10)
+    for start in range(0, len(raw), 7):  # 分块会切断多字节字符与标签
+        stream.feed(raw[start:start + 7])
+    assert stream.close().to_records() == purifier.smelt_table(raw).to_records()
+
+
+def test_gzip_has_the_same_signals_and_digest():
+    raw = synthesize(300, seed=12)
+    purifier = AthanorPurifier()
+    plain = read_export(purifier, raw, MB * 10)
+    packed = read_export(purifier, gzip.compress(raw), MB * 10, "bookmarks.html.gz", chunk_size=1000)
+    assert packed.signals.to_records() == plain.signals.to_records()
+    assert packed.hexdigest() == plain.hexdigest()
+    assert packed.received_bytes < packed.decoded_bytes == len(raw)
+
+
+def test_size_limits_apply_before_and_after_decompression():
+    purifier = AthanorPurifier()
+    with pytest.raises(IngestError) as raw_error:
+        read_export(purifier, b"<DL>" * 1000, 1000)
+    bomb = gzip.compress(b" " * (5 * MB))
+    with pytest.raises(IngestError) as bomb_error:
+        read_export(purifier, bomb, MB)
+    assert raw_error.value.status_code == bomb_error.value.status_code == 413
+    with pytest.raises(IngestError) as corrupt:
+        read_export(purifier, bomb[:20] + b"garbage" * 10, MB)
+    assert corrupt.value.status_code == 400
+
+
+def test_gzip_members_and_truncation():
+    raw = synthesize(300, seed=12)
+    purifier = AthanorPurifier()
+    half = raw.rindex(b"\n", 0, len(raw) // 2) + 1
+    members = gzip.compress(raw[:half]) + gzip.compress(raw[half:])
+    merged = read_export(purifier, members, MB * 10, "bookmarks.html.gz", chunk_size=1000)
+    assert merged.signals.to_records() == read_export(purifier, raw, MB * 10).signals.to_records()
+
+    packed = gzip.compress(raw)
+    for broken in (packed[:-100], packed + b"trailing garbage"):
+        with pytest.raises(IngestError) as error:
+            read_export(purifier, broken, MB * 10)
+        assert error.value.status_code == 400
+
+
+def test_zstd_is_bounded_like_gzip():
+    zstandard = pytest.importorskip("zstandard")
+    raw = synthesize(300, seed=12)
+    purifier = AthanorPurifier()
+    packed = read_export(purifier, zstandard.ZstdCompressor().compress(raw), MB * 10, chunk_size=1000)
+    assert packed.signals.to_records() == read_export(purifier, raw, MB * 10).signals.to_records()
+
+    bomb = zstandard.ZstdCompressor().compress(b" " * (64 * MB))
+    stream = SignalStream(purifier, MB)
+    with pytest.raises(IngestError) as bomb_error:
+        stream.feed(bomb)
+    assert bomb_error.value.status_code == 413
+    assert stream.decoded_bytes < 2 * MB
+
+
+def test_compressed_upload_hits_the_cache_of_the_plain_one():
+    raw = synthesize(300, seed=13)
+    with TestClient(main.app) as client:
+        client.post("/transmute", files={"file": ("bookmarks.html", raw)})
+        packed = client.post("/transmute", files={"file": ("bookmarks.html.gz", gzip.compress(raw))})
+        assert packed.status_code == 200 and packed.json()["元数据"]["缓存命中"]
+        assert client.post("/transmute", files={"file": ("notes.txt", raw)}).status_code == 400
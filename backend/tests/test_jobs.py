@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+from fastapi.testclient import TestClient
+
+import codec
+import main
+from conftest import synthesize
+from jobs import DONE, RUNNING, JobRegistry
+
+
+def read_events(client, path):
+    """读取 SSE 流直到任务结束，返回 [(事件类型, 数据)]"""
+    events = []
+    with client.stream("GET", path) as response:
+        kind = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                kind = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((kind, codec.loads(line[len("data: "):].encode("utf-8"))))
+    return events
+
+
+def test_job_streams_progress_then_result():
+    raw = synthesize(500, seed=31)
+    with TestClient(main.app) as client:
+        submitted = client.post("/jobs", files={"file": ("bookmarks.html", raw)})
+        assert submitted.status_code == 202
+        body = submitted.json()
+
+        events = read_events(client, body["事件"])
+        kinds = [kind for kind, _ in events]
+        assert kinds[-1] == "done" and set(kinds[:-1]) == {"progress"}
+        stages = [data["阶段"] for _, data in events[:-1]]
+        assert stages[0] == "注入"
+        early = next(data["结果"] for _, data in events if "时间线" in data.get("结果", {}))
+        assert early["时间线"]
+
+        result = client.get(body["结果"]).json()
+        assert result["结果"]["时间线"] == early["时间线"]
+        assert set(result["结果"]) == set(client.post("/transmute", files={"file": ("bookmarks.html", raw)}).json()["结果"])
+
+        assert client.delete(f"/jobs/{body['任务']}").status_code == 200
+        assert client.get(f"/jobs/{body['任务']}").status_code == 404
+
+
+def test_registry_expires_only_finished_jobs():
+    async def scenario():
+        registry = JobRegistry(ttl=0, max_bytes=1 << 20)
+        finished = registry.create({}, None, threading.Event())
+        running = registry.create({}, None, threading.Event())
+        await running.publish({"阶段": "注入", "结果": {}})
+        await finished.finish(DONE, {"结果": {}})
+        await asyncio.sleep(0.01)
+        return registry, finished, running
+
+    registry, finished, running = asyncio.run(scenario())
+    assert registry.get(finished.id) is None
+    assert registry.get(running.id) is running and running.state == RUNNING
+    assert running.cancel() and running.cancel_event.is_set()
@@ -0,0 +1,37 @@
+import gzip
+import os
+import tempfile
+
+from fastapi.testclient import TestClient
+
+import main
+from conftest import synthesize
+
+
+def test_merge_reads_uploads_from_spooled_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    seen = []
+    ingest_export = main.pipeline.ingest_export
+
+    def spy(source, filename, max_bytes):
+        seen.append(source)
+        return ingest_export(source, filename, max_bytes)
+
+    monkeypatch.setattr(main.pipeline, "ingest_export", spy)
+    chrome, firefox = synthesize(300, seed=1), synthesize(300, seed=2)
+    with TestClient(main.app) as client:
+        merged = client.post("/transmute/merge", files=[("files", ("chrome.html", chrome)),
+                                                        ("files", ("firefox.html.gz", gzip.compress(firefox)))]).json()
+    assert [f["信号数量"] for f in merged["元数据"]["合并"]["文件"]] == [300, 300]
+    assert all(isinstance(source, str) and source.startswith(str(tmp_path)) for source in seen)
+    assert os.listdir(tmp_path) == []
+
+
+def test_oversized_upload_is_rejected(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 1024)
+    with TestClient(main.app) as client:
+        response = client.post("/transmute/merge", files=[("files", ("a.html", synthesize(300))),
+                                                          ("files", ("b.html", synthesize(300, seed=2)))])
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
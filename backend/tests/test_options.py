@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+
+import main
+from conftest import synthesize
+
+ANALYSIS = {"river_top_n", "river_granularity", "cluster_engine", "auto_k", "instrument", "profile"}
+UPLOAD = ANALYSIS | {"incremental", "dedup", "index"}
+
+
+def test_endpoints_share_the_same_options():
+    with TestClient(main.app) as client:
+        paths = client.get("/openapi.json").json()["paths"]
+    names = {path: {p["name"] for p in paths[path]["post"]["parameters"]} for path in
+             ("/transmute", "/transmute/stream", "/transmute/merge", "/jobs", "/index/{name}/transmute")}
+    for path in ("/transmute", "/transmute/stream", "/transmute/merge"):
+        assert UPLOAD | {"budget"} <= names[path], path
+    assert UPLOAD <= names["/jobs"]
+    assert ANALYSIS | {"budget"} <= names["/index/{name}/transmute"]
+
+
+def test_incremental_with_auto_k_is_rejected():
+    with TestClient(main.app) as client:
+        response = client.post("/transmute", params={"incremental": "a", "auto_k": True},
+                               files={"file": ("bookmarks.html", synthesize(50))})
+    assert response.status_code == 400
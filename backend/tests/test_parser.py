@@ -0,0 +1,65 @@
+import pytest
+
+from cleaner import AthanorPurifier, sniff_encoding
+from conftest import synthesize
+
+EXPORT = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<H1>Bookmarks</H1>
+<DL><p>
+    <DT><H3>书签栏</H3>
+    <DL><p>
+        <DT><H3>编程</H3>
+        <DL><p>
+            <DT><A HREF="https://github.com/a" ADD_DATE="1700000000" TAGS="rust, git">Rust &amp; Git</A>
+            <DT><H3>待读</H3>
+            <DL><p>
+                <DT><A HREF="https://example.com/later" ADD_DATE="1700000000000000">Later</A>
+            </DL><p>
+            <DT><A HREF="javascript:void(0)">书签小工具</A>
+            <DT><A HREF="https://example.com/open">未闭合
+        </DL><p>
+        <DT><A HREF="https://example.com/top"></A>
+    </DL><p>
+</DL><p>
+"""
+
+
+def test_stream_parser_tracks_folder_context():
+    signals = AthanorPurifier().smelt(EXPORT.encode("utf-8"))
+    by_url = {s["url"]: s for s in signals}
+    assert list(by_url) == ["https://github.com/a", "https://example.com/later",
+                            "https://example.com/open", "https://example.com/top"]
+    assert by_url["https://github.com/a"]["context"] == ["编程"]
+    assert by_url["https://github.com/a"]["title"] == "Rust & Git"
+    assert by_url["https://github.com/a"]["tags"] == ["rust", "git"]
+    assert by_url["https://example.com/later"]["context"] == ["编程", "待读"]
+    assert by_url["https://example.com/open"]["title"] == "未闭合"
+    assert by_url["https://example.com/top"]["context"] == []
+    assert by_url["https://example.com/top"]["title"] == "Untitled Signal"
+
+
+def test_webkit_and_unix_timestamps_agree():
+    signals = AthanorPurifier().smelt(EXPORT.encode("utf-8"))
+    assert signals[0]["timestamp"] == signals[1]["timestamp"] != ""
+
+
+def test_sniff_encoding():
+    assert sniff_encoding(b'\xef\xbb\xbf<html>') == "utf-8"
+    assert sniff_encoding(b'<META CONTENT="text/html; charset=GBK">') == "gbk"
+    assert sniff_encoding(b'<META CONTENT="text/html; charset=bogus">') == "utf-8"
+    gbk = EXPORT.replace("UTF-8", "GBK").encode("gbk")
+    assert AthanorPurifier().smelt(gbk)[1]["context"] == ["编程", "待读"]
+
+
+def test_table_matches_records():
+    raw = synthesize(500, seed=3, malformed_rate=0.05)
+    purifier = AthanorPurifier()
+    assert purifier.smelt_table(raw).to_records() == purifier.smelt(raw)
+
+
+def test_stream_matches_soup_engine():
+    pytest.importorskip("bs4")
+    report = AthanorPurifier().diff_engines(synthesize(500, seed=3))
+    assert report["stream_count"] == report["soup_count"]
+    assert not report["only_stream"] and not report["only_soup"] and not report["mismatches"]
@@ -0,0 +1,53 @@
+import json
+import sys
+
+from fastapi.testclient import TestClient
+
+import main
+import pipeline
+from conftest import synthesize
+
+
+def evict_partitions(result_id: str) -> None:
+    """模拟 LRU 只淘汰了明细分区、主条目仍在的情形"""
+    cache = main.result_cache
+    with cache._lock:
+        for key in [k for k in cache._entries if k.startswith(f"{result_id}.")]:
+            cache._size -= len(cache._entries.pop(key))
+
+
+def test_paging_survives_partition_eviction():
+    raw = synthesize(800, seed=11)
+    with TestClient(main.app) as client:
+        first = client.post("/transmute", files={"file": ("bookmarks.html", raw)}).json()
+        cached = client.post("/transmute", files={"file": ("bookmarks.html", raw)}).json()
+        assert cached["元数据"]["缓存命中"] and "明细" not in cached
+        assert cached["句柄"] == first["句柄"]
+
+        cloud = client.get(first["句柄"]["语义星云"]).json()
+        result_id = first["句柄"]["语义星云"].split("/")[2]
+        evict_partitions(result_id)
+
+        again = client.get(cached["句柄"]["语义星云"])
+        assert again.status_code == 200
+        assert again.json() == cloud
+        members = client.get(cached["结果"]["星群结晶"][0]["members"], params={"limit": 5})
+        assert members.status_code == 200 and members.json()["总数"] > 0
+
+
+def test_unknown_result_is_gone():
+    with TestClient(main.app) as client:
+        assert client.get("/results/missing/cloud").status_code == 404
+
+
+def test_cli_output_inlines_the_full_lists(monkeypatch, tmp_path):
+    export, out = tmp_path / "bookmarks.html", tmp_path / "result.json"
+    export.write_bytes(synthesize(800, seed=11))
+    monkeypatch.setattr(sys, "argv", ["pipeline", str(export), "--out", str(out), "--workers", "1",
+                                      "--tokenize-workers", "0"])
+    assert pipeline.main() == 0
+    payload = json.loads(out.read_text(encoding="utf-8"))
+    assert "明细" not in payload
+    results = payload["结果"]
+    assert len(results["语义星云"]) > pipeline.CLOUD_PREVIEW
+    assert max(len(crystal["nodes"]) for crystal in results["星群结晶"]) > pipeline.CLUSTER_PREVIEW
@@ -0,0 +1,43 @@
+import json
+import random
+
+import pytest
+
+from analyzer import KnowledgeCrystallizer
+from rules import KeywordAutomaton, RuleBook, load_rulebook
+
+
+def naive_scan(table, text):
+    return frozenset(label for label, keywords in table.items() if any(kw.lower() in text for kw in keywords))
+
+
+def test_prefix_closure():
+    matcher = KeywordAutomaton({"代码": ["git"], "社区": ["github"], "AI": ["gpt"]})
+    assert matcher.scan("github.com/openai") == {"代码", "社区"}
+    assert matcher.scan("chatgpt") == {"AI"}
+    assert matcher.scan("gi thub") == frozenset()
+
+
+def test_matches_substring_rules():
+    book = load_rulebook()
+    keywords = [kw.lower() for table in (book.skill_dimensions, book.persona_rules)
+                for words in table.values() for kw in words]
+    rng = random.Random(0)
+    for _ in range(300):
+        text = " ".join(rng.choice(keywords)[:rng.randint(2, 8)] for _ in range(rng.randint(1, 5)))
+        assert book.radar_matcher.scan(text) == naive_scan(book.skill_dimensions, text), text
+        assert book.persona_matcher.scan(text) == naive_scan(book.persona_rules, text), text
+
+
+def test_rulebook_is_data_driven(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"skill_radar": {"烹饪": ["recipe"]}, "persona": {"吃货": ["food"]}}))
+    crystallizer = KnowledgeCrystallizer(rules_path=str(path))
+    bookmarks = [{"title": "Best recipe", "url": "https://food.com/1", "timestamp": "", "tags": []}]
+    assert crystallizer.analyze_skill_radar(bookmarks) == [{"name": "烹饪", "value": 1, "max": 6}]
+    assert crystallizer.generate_persona(bookmarks)["tags"] == ["吃货"]
+
+
+def test_malformed_rulebook_is_rejected():
+    with pytest.raises(ValueError):
+        RuleBook.from_dict({"skill_radar": {"x": "not a list"}, "persona": {}})
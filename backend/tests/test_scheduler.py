@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pipeline
+from conftest import synthesize
+from scheduler import PENDING, SKIPPED, StageAbandoned, StageScheduler, checkpoint
+
+
+def test_essential_stages_ignore_the_budget():
+    scheduler = StageScheduler(budget=0.01)
+    scheduler.add("统计", lambda r: time.sleep(0.1) or 1, essential=True)
+    scheduler.add("时间线", lambda r: r["统计"] + 1, ("统计",), essential=True)
+    scheduler.add("分词", lambda r: 3)
+    results, unfinished = scheduler.run()
+    assert results == {"统计": 1, "时间线": 2}
+    assert unfinished["分词"]["状态"] == SKIPPED
+
+
+def test_other_stages_wait_for_essential_stages():
+    finished = {}
+    scheduler = StageScheduler(max_workers=4)
+    scheduler.add("统计", lambda r: time.sleep(0.05) or finished.setdefault("统计", time.perf_counter()),
+                  essential=True)
+    scheduler.add("分词", lambda r: finished.setdefault("分词开始", time.perf_counter()))
+    scheduler.run()
+    assert finished["分词开始"] >= finished["统计"]
+
+
+def test_abandoned_stage_stops_at_checkpoint():
+    stopped = threading.Event()
+
+    def endless(r):
+        try:
+            while True:
+                checkpoint()
+                time.sleep(0.01)
+        except StageAbandoned:
+            stopped.set()
+            raise
+
+    scheduler = StageScheduler(budget=0.1)
+    scheduler.add("星群结晶", endless)
+    results, unfinished = scheduler.run()
+    assert results == {} and unfinished["星群结晶"]["状态"] == PENDING
+    assert stopped.wait(1)
+
+
+def test_tight_budget_still_returns_statistics():
+    payload = pipeline.transmute(synthesize(3000, seed=8), budget=0.001)
+    result, schedule = payload["结果"], payload["元数据"]["调度"]
+    for name in ("时间线", "域名领地", "活跃时段", "技能雷达"):
+        assert result[name] is not None, name
+    assert result["星群结晶"] is None and "星群结晶" in schedule["未完成"]
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from sklearn.metrics import pairwise_distances, silhouette_score
+
+from analyzer import row_argmax, sampled_silhouette
+from cleaner import AthanorPurifier
+from conftest import synthesize
+
+
+def test_row_argmax_takes_first_peak_and_marks_empty_rows():
+    X = sp.csr_matrix(np.array([[0, 3, 3], [0, 0, 0], [1, 0, 2], [0, 0, 0], [5, 1, 0]], dtype=float))
+    assert row_argmax(X).tolist() == [1, -1, 2, -1, 0]
+
+
+def test_sampled_silhouette_matches_sklearn():
+    rng = np.random.default_rng(0)
+    X = rng.random((120, 5))
+    labels = rng.integers(0, 6, 120)
+    labels[0] = 7  # 单成员星群 + 空星群
+    assert sampled_silhouette(pairwise_distances(X), labels) == pytest.approx(silhouette_score(X, labels))
+    assert sampled_silhouette(pairwise_distances(X), np.zeros(120, dtype=int)) == -1.0
+
+
+def test_search_stops_before_the_deadline(crystallizer):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    signals = AthanorPurifier().smelt_table(synthesize(3000, seed=6))
+    _, documents = crystallizer.select_documents(crystallizer.tokenize_corpus(signals))
+    X = TfidfVectorizer(max_features=1000, token_pattern=crystallizer.TOKEN_PATTERN).fit_transform(documents)
+    _, _, tight = crystallizer.select_k(X[:1000], 16, 0.0, lambda fit_seconds: 0.0)
+    assert len(tight["候选"]) == 2 and tight["截断"]
+    _, _, loose = crystallizer.select_k(X[:1000], 16, 0.0, lambda fit_seconds: float("inf"))
+    assert [c["k"] for c in loose["候选"]] == list(range(2, 17)) and not loose["截断"]
+
+
+@pytest.mark.parametrize("size", [2_000, 20_000])
+def test_search_is_a_fraction_of_the_full_fit(crystallizer, size):
+    signals = AthanorPurifier().smelt_table(synthesize(size, seed=2))
+    corpus = crystallizer.tokenize_corpus(signals)
+    crystallizer.crystallize_auto(signals, corpus, engine="full", max_clusters=16)  # 预热
+    _, selection = crystallizer.crystallize_auto(signals, corpus, engine="full", max_clusters=16)
+    # 小库上两个候选的固定开销可能超出比例，此时不应再多扫描任何候选
+    assert selection["搜索占比"] <= 2 * crystallizer.k_search_fraction or len(selection["候选"]) == 2
@@ -0,0 +1,55 @@
+import time
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from analyzer import _week_key
+from cleaner import AthanorPurifier
+from conftest import synthesize
+from signals import NO_TIMESTAMP, SignalTable, SignalTableBuilder, format_epoch
+
+
+@pytest.fixture
+def dst_zone(monkeypatch):
+    """带夏令时的本地时区，检验按时间桶缓存的 UTC 偏移"""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_vectorized_views_match_per_row_formatting(dst_zone):
+    table = AthanorPurifier().smelt_table(synthesize(800, seed=14))
+    strings = [format_epoch(int(e)) for e in table.epochs]
+    assert table.timestamp_strings() == strings
+    valid = [s for s in strings if s]
+    assert table.period_histogram("month") == dict(sorted(Counter(s[:7] for s in valid).items()))
+    assert table.period_histogram("hour") == dict(sorted(Counter(s[11:13] for s in valid).items()))
+    assert table.period_histogram("week") == dict(sorted(Counter(_week_key(s) for s in valid).items()))
+
+
+def test_records_round_trip_and_interning():
+    table = AthanorPurifier().smelt_table(synthesize(500, seed=14))
+    records = table.to_records()
+    assert SignalTable.from_records(records).to_records() == records
+    assert [dict(row) for row in table] == records
+    assert table.epochs.dtype == np.int64
+    assert len(table.contexts) < len(table) and len(table.domains) < len(table)
+
+
+def test_concat_and_merge():
+    first, second = SignalTableBuilder(), SignalTableBuilder()
+    first.append("a", "https://x.com/1", ("编程",), 200, ("rust",))
+    second.append("b", "https://y.com/2", ("设计",), None, ())
+    second.append("a", "https://x.com/1", ("编程",), 100, ("git",))
+    table = SignalTable.concat([first.build(), second.build()])
+    assert table.contexts == [("编程",), ("设计",)] and table.domains == ["x.com", "y.com"]
+    assert table.context_ids.tolist() == [0, 1, 0]
+
+    merged = table.merge([[0, 2], [1]])
+    assert merged.titles == ["a", "b"]
+    assert merged.epochs.tolist() == [100, NO_TIMESTAMP]
+    assert merged.tags == [("rust", "git"), ()]
+    assert merged.record(0)["contexts"] == [["编程"]]
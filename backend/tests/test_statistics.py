@@ -0,0 +1,40 @@
+from collections import Counter
+
+from cleaner import AthanorPurifier
+from conftest import synthesize
+from signals import extract_domain
+
+
+def signals_of(size=600, seed=6):
+    purifier = AthanorPurifier()
+    raw = synthesize(size, seed=seed, malformed_rate=0.02)
+    return purifier.smelt(raw), purifier.smelt_table(raw)
+
+
+def test_fused_pass_matches_per_view_counting(crystallizer):
+    records, _ = signals_of()
+    stats = crystallizer.compute_statistics(records)
+    months = Counter(b["timestamp"][:7] for b in records if b["timestamp"])
+    hours = Counter(b["timestamp"][11:13] for b in records if b["timestamp"])
+    domains = Counter(d for d in map(extract_domain, (b["url"] for b in records)) if d)
+    assert stats.total == len(records)
+    assert crystallizer.analyze_timeline(records, stats=stats) == dict(sorted(months.items()))
+    assert crystallizer.analyze_activity_hours(records, stats=stats) == dict(sorted(hours.items()))
+    assert crystallizer.analyze_domains(records, top_n=None, stats=stats) == \
+        [{"name": d, "value": c} for d, c in domains.most_common()]
+
+
+def test_table_and_records_agree(crystallizer):
+    records, table = signals_of()
+    assert crystallizer.compute_statistics(table).to_dict() == crystallizer.compute_statistics(records).to_dict()
+    assert crystallizer.analyze_domains(table) == crystallizer.analyze_domains(records)
+    assert crystallizer.analyze_skill_radar(table) == crystallizer.analyze_skill_radar(records)
+
+
+def test_absorb_can_be_undone(crystallizer):
+    records, _ = signals_of(200)
+    stats = crystallizer.compute_statistics(records)
+    for b in records[150:]:
+        stats.absorb(b, weight=-1)
+    stats.prune()
+    assert stats.to_dict() == crystallizer.compute_statistics(records[:150]).to_dict()
@@ -0,0 +1,79 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import main
+from conftest import synthesize
+from telemetry import Histogram, SamplingProfiler, recording, stage
+
+
+def test_nested_stages_are_named_per_thread():
+    def tokenize(recorder):
+        with recorder.stage("tokenize"):
+            pass
+
+    with recording() as recorder:
+        with stage("crystallize", 10) as record:
+            with stage("tfidf"):
+                pass
+            worker = threading.Thread(target=tokenize, args=(recorder,))
+            worker.start(), worker.join()
+            record["输出"] = 2
+    names = [r["阶段"] for r in recorder.records]
+    assert names == ["crystallize/tfidf", "tokenize", "crystallize"]
+    assert recorder.records[-1]["输入"] == 10 and recorder.records[-1]["输出"] == 2
+    with stage("untracked") as record:
+        assert record == {}
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("h", "help", (0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe("s", value)
+    lines = histogram.render()
+    assert 'h_bucket{stage="s",le="0.1"} 1' in lines
+    assert 'h_bucket{stage="s",le="1"} 2' in lines
+    assert 'h_bucket{stage="s",le="+Inf"} 3' in lines
+    assert 'h_sum{stage="s"} 5.55' in lines
+
+
+def test_profiler_samples_the_calling_thread():
+    profiler = SamplingProfiler(interval=0.001).start()
+    sum(i * i for i in range(2_000_000))
+    profiler.stop()
+    assert "test_profiler_samples_the_calling_thread" in profiler.folded()
+
+
+def test_instrumented_request_feeds_metrics():
+    with TestClient(main.app) as client:
+        response = client.post("/transmute", params={"instrument": True},
+                               files={"file": ("bookmarks.html", synthesize(300, seed=41))}).json()
+        stages = {r["阶段"] for r in response["元数据"]["性能"]["阶段"]}
+        assert {"ingest", "crystallize", "timeline"} <= stages
+        metrics = client.get("/metrics").text
+    assert 'athanor_stage_wall_seconds_count{stage="crystallize"}' in metrics
+
+
+def test_profile_covers_stage_threads():
+    with TestClient(main.app) as client:
+        response = client.post("/transmute", params={"profile": True, "instrument": True},
+                               files={"file": ("bookmarks.html", synthesize(3000, seed=42))}).json()
+    with open(response["元数据"]["性能"]["剖析"], encoding="utf-8") as f:
+        folded = f.read()
+    assert "crystallize (analyzer.py" in folded
+    assert "_run_stage (scheduler.py" in folded
+
+
+def test_rejected_uploads_are_counted():
+    def rejected(client):
+        for line in client.get("/metrics").text.splitlines():
+            if line.startswith('athanor_ingest_rejected_total{status="400"}'):
+                return int(line.split()[-1])
+        return 0
+
+    with TestClient(main.app) as client:
+        before = rejected(client)
+        for _ in range(2):
+            response = client.post("/transmute", files={"file": ("bookmarks.html.gz", b"\x1f\x8b not gzip")})
+            assert response.status_code == 400
+        assert rejected(client) == before + 2
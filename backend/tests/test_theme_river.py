@@ -0,0 +1,39 @@
+from collections import Counter
+
+import pytest
+
+from analyzer import _week_key
+from cleaner import AthanorPurifier
+from conftest import synthesize
+
+
+def reference_river(records, corpus, period_key, top_n=5):
+    """逐条循环的参考实现：书签的某个标题词包含主题词即计入该周期"""
+    themes = [w for w, _ in corpus.top_words(top_n)]
+    counts = Counter()
+    periods = set()
+    for b, words in zip(records, corpus.title_tokens):
+        period = period_key(b["timestamp"])
+        if not period:
+            continue
+        periods.add(period)
+        for theme in themes:
+            if any(theme in w for w in words):
+                counts[period, theme] += 1
+    return [{"date": p, "name": t, "value": counts[p, t]} for p in sorted(periods) for t in themes]
+
+
+@pytest.mark.parametrize("granularity, period_key", [("month", lambda ts: ts[:7]), ("week", _week_key)])
+def test_matrix_river_matches_loop(crystallizer, granularity, period_key):
+    raw = synthesize(800, seed=9)
+    purifier = AthanorPurifier()
+    records, table = purifier.smelt(raw), purifier.smelt_table(raw)
+    corpus = crystallizer.tokenize_corpus(records)
+    expected = reference_river(records, corpus, period_key)
+    assert crystallizer.analyze_theme_river(records, corpus, granularity=granularity) == expected
+    assert crystallizer.analyze_theme_river(table, granularity=granularity) == expected
+
+
+def test_unknown_granularity(crystallizer):
+    with pytest.raises(ValueError):
+        crystallizer.analyze_theme_river([], granularity="decade")
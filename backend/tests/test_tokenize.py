@@ -0,0 +1,47 @@
+from analyzer import KnowledgeCrystallizer, TokenMemo
+from cleaner import AthanorPurifier
+from conftest import synthesize
+
+
+def test_token_memo_is_lru():
+    calls = []
+    memo = TokenMemo(lambda text: calls.append(text) or tuple(text), maxsize=2)
+    memo("ab"), memo("cd"), memo("ab"), memo("ef")
+    assert memo.lookup("cd") is None and memo.lookup("ab") == ("a", "b")
+    assert calls == ["ab", "cd", "ef"]
+    info = memo.cache_info()
+    assert (info.hits, info.currsize) == (2, 2)
+
+
+def test_corpus_matches_joined_segmentation(crystallizer):
+    signals = AthanorPurifier().smelt(synthesize(300, seed=4, tag_ratio=0.5))
+    corpus = crystallizer.tokenize_corpus(signals)
+    for bookmark, title_words, tag_words in zip(signals, corpus.title_tokens, corpus.tag_tokens):
+        joined = f"{bookmark['title']} {' '.join(bookmark['tags'])}"
+        assert title_words + tag_words == list(crystallizer._segment_text(joined))
+
+
+def test_repeated_request_hits_the_memo():
+    crystallizer = KnowledgeCrystallizer()
+    signals = AthanorPurifier().smelt_table(synthesize(300, seed=4))
+    first = crystallizer.tokenize_corpus(signals)
+    misses = crystallizer.token_cache_info().misses
+    second = crystallizer.tokenize_corpus(signals)
+    assert crystallizer.token_cache_info().misses == misses
+    assert second.title_tokens == first.title_tokens
+    assert second.word_counts == first.word_counts
+
+
+def test_batch_tokenization_matches_serial(crystallizer):
+    texts = list(AthanorPurifier().smelt_table(synthesize(1500, seed=23)).titles)
+    parallel = KnowledgeCrystallizer(tokenize_workers=2, tokenize_threshold=200)
+    try:
+        small = parallel.segment_batch(texts[:100])
+        assert parallel._segmenters is None  # 小批量不拉起分词进程
+        assert parallel.segment_batch(texts) == [crystallizer._segment_text(t) for t in texts]
+        assert parallel._segmenters is not None
+        assert small == parallel.segment_batch(texts[:100])
+        assert parallel.token_cache_info().currsize == len(set(texts))
+    finally:
+        if parallel._segmenters is not None:
+            parallel._segmenters.shutdown()
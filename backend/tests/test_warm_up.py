@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+import analyzer
+from settings import home_path
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_heavy_imports_are_deferred():
+    probe = "import sys, main, pipeline; print(sorted({'jieba', 'sklearn', 'bs4'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND, capture_output=True, text=True, check=True)
+    assert output.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_warm_up_persists_the_dictionary_cache(crystallizer):
+    timings = analyzer.warm_up(crystallizer)
+    assert {"jieba", "sklearn", "dummy_clustering"} <= set(timings)
+    assert any(name.startswith("jieba") for name in os.listdir(home_path("cache")))
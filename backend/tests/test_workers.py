@@ -0,0 +1,46 @@
+import gzip
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import pipeline
+from conftest import synthesize
+
+
+@pytest.fixture(scope="module")
+def pool_client():
+    """进程池模式 (两个 spawn worker) 的测试客户端，等待全部 worker 预热完成"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(main, "WORKER_COUNT", 2)
+        with TestClient(main.app) as client:
+            deadline = time.monotonic() + 120
+            while client.get("/health").status_code != 200:
+                assert time.monotonic() < deadline, "worker 预热超时"
+                time.sleep(0.2)
+            yield client
+
+
+def test_pool_results_match_in_process(pool_client):
+    raw = synthesize(600, seed=77)
+    response = pool_client.post("/transmute", files={"file": ("bookmarks.html", raw)}).json()
+    expected = pipeline.transmute(raw)["结果"]
+    for name in ("时间线", "活跃时段", "技能雷达", "用户画像"):
+        assert response["结果"][name] == expected[name], name
+    assert [c["topic"] for c in response["结果"]["星群结晶"]] == [c["topic"] for c in expected["星群结晶"]]
+
+
+def test_every_worker_reports_ready(pool_client):
+    furnaces = pool_client.get("/health").json()["预热"]["熔炉"]
+    assert len({f["pid"] for f in furnaces}) == 2
+    assert all(f["就绪"] and "jieba" in f["预热"] for f in furnaces)
+
+
+def test_uploads_are_parsed_in_workers(pool_client):
+    raw = synthesize(300, seed=78)
+    response = pool_client.post("/transmute/stream", params={"filename": "bookmarks.html.gz"},
+                                content=gzip.compress(raw))
+    assert response.status_code == 200 and response.json()["元数据"]["信号数量"] == 300
+    truncated = pool_client.post("/transmute/stream", content=gzip.compress(raw)[:-50])
+    assert truncated.status_code == 400
@@ -17,7 +17,14 @@ function renderListItems(container: HTMLUListElement, nodes: any[]) {
     });
 }
 
-export function renderClustersGrid(container: HTMLElement, clusters: any[]) {
+// 按 members 句柄分页拉取星群全部成员 (结果中的 nodes 只是前 10 个预览)
+async function fetchMembersPage(apiBase: string, url: string) {
+    const response = await fetch(`${apiBase}${url}`);
+    if (!response.ok) throw new Error(response.status === 404 ? '明细已过期，请重新熔炼' : `HTTP ${response.status}`);
+    return response.json();
+}
+
+export function renderClustersGrid(container: HTMLElement, clusters: any[], apiBase: string = '') {
     if (!container) return;
     container.innerHTML = '';
 
@@ -45,26 +52,61 @@ export function renderClustersGrid(container: HTMLElement, clusters: any[]) {
       card.appendChild(keywords);
       card.appendChild(list);
 
+      // 全部成员数：有分页句柄时以 size 为准，否则只有预览节点
+      const total = cluster.members ? cluster.size : cluster.nodes.length;
+
       // 如果有更多链接，添加展开按钮
-      if (cluster.nodes.length > 5) {
+      if (total > 5) {
         const expandBtn = document.createElement('button');
         expandBtn.className = 'expand-btn';
-        expandBtn.textContent = `查看全部 (${cluster.nodes.length})`;
+        expandBtn.textContent = `查看全部 (${total})`;
+
+        // 分页加载：展开时拉取第一页，之后由“加载更多”顺着 下一页 继续
+        const moreBtn = document.createElement('button');
+        moreBtn.className = 'expand-btn';
+        moreBtn.textContent = '加载更多';
+        moreBtn.style.display = 'none';
+        let nextPage: string | null = null;
+
+        const loadPage = async (url: string) => {
+          moreBtn.disabled = true;
+          try {
+            const page = await fetchMembersPage(apiBase, url);
+            renderListItems(list, page.条目);
+            moreBtn.textContent = '加载更多';
+            nextPage = page.下一页;
+          } catch (err: any) {
+            nextPage = null;
+            moreBtn.textContent = err.message;
+          } finally {
+            moreBtn.disabled = false;
+            moreBtn.style.display = nextPage ? '' : 'none';
+          }
+        };
+        moreBtn.onclick = () => { if (nextPage) loadPage(nextPage); };
+
         expandBtn.onclick = () => {
           list.innerHTML = ''; // 清空列表
           if (expandBtn.classList.contains('expanded')) {
             // 收起
             renderListItems(list, initialNodes);
-            expandBtn.textContent = `查看全部 (${cluster.nodes.length})`;
+            expandBtn.textContent = `查看全部 (${total})`;
             expandBtn.classList.remove('expanded');
+            nextPage = null;
+            moreBtn.style.display = 'none';
           } else {
             // 展开
-            renderListItems(list, cluster.nodes);
+            if (cluster.members) {
+              loadPage(cluster.members);
+            } else {
+              renderListItems(list, cluster.nodes);
+            }
             expandBtn.textContent = '收起';
             expandBtn.classList.add('expanded');
           }
         };
         card.appendChild(expandBtn);
+        card.appendChild(moreBtn);
       }
 
       container.appendChild(card);